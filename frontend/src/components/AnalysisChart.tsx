@@ -1,4 +1,5 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
+import axios from 'axios';
 import {
   Chart as ChartJS,
   CategoryScale,
@@ -10,6 +11,7 @@ import {
   ArcElement,
 } from 'chart.js';
 import { Bar, Pie } from 'react-chartjs-2';
+import { API_BASE_URL } from '../services/api';
 
 // Register Chart.js components
 ChartJS.register(
@@ -25,9 +27,121 @@ ChartJS.register(
 interface AnalysisChartProps {
   analysisType: string;
   results: Record<string, any>;
+  // Necesario para leer los registros guardados fuera de los resultados
+  analysisId?: number;
 }
 
-const AnalysisChart: React.FC<AnalysisChartProps> = ({ analysisType, results }) => {
+// Secuencias por página en los análisis con los registros en MinIO (record_columns)
+const RECORDS_PAGE_SIZE = 500;
+
+// Barras del GC de cada secuencia; firstIndex es el índice de la primera
+const GcContentBars: React.FC<{ gcContents: number[]; firstIndex?: number }> = ({ gcContents, firstIndex = 0 }) => {
+  const labels = gcContents.map((_, i) => `Seq ${firstIndex + i + 1}`);
+
+  const data = {
+    labels,
+    datasets: [
+      {
+        label: 'GC Content (%)',
+        data: gcContents,
+        backgroundColor: 'rgba(54, 162, 235, 0.5)',
+        borderColor: 'rgba(54, 162, 235, 1)',
+        borderWidth: 1,
+      },
+    ],
+  };
+
+  const options = {
+    responsive: true,
+    maintainAspectRatio: false,
+    plugins: {
+      legend: {
+        position: 'top' as const,
+      },
+      title: {
+        display: true,
+        text: 'GC Content por Secuencia',
+      },
+    },
+    scales: {
+      y: {
+        beginAtZero: true,
+        title: {
+          display: true,
+          text: 'GC Content (%)',
+        },
+      },
+    },
+  };
+
+  return (
+    <div style={{ height: '300px' }}>
+      <Bar data={data} options={options} />
+    </div>
+  );
+};
+
+// GC por secuencia de los análisis grandes: se pide página a página a
+// GET /api/analysis/{id}/records, que sólo lee de MinIO los bytes de la página
+const PagedGcContentChart: React.FC<{ analysisId: number; recordCount: number }> = ({ analysisId, recordCount }) => {
+  const [offset, setOffset] = useState(0);
+  const [gcContents, setGcContents] = useState<number[] | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    setGcContents(null);
+    setError(null);
+    axios
+      .get(`${API_BASE_URL}/api/analysis/${analysisId}/records`, {
+        params: { offset, limit: RECORDS_PAGE_SIZE },
+      })
+      .then((response) => {
+        if (!cancelled) setGcContents(response.data.columns.gc_content);
+      })
+      .catch(() => {
+        if (!cancelled) setError('No se pudieron cargar los registros del análisis');
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [analysisId, offset]);
+
+  const last = Math.min(offset + RECORDS_PAGE_SIZE, recordCount);
+
+  return (
+    <div>
+      {error ? (
+        <div className="chart-placeholder">{error}</div>
+      ) : gcContents === null ? (
+        <div className="chart-placeholder">Cargando registros...</div>
+      ) : (
+        <GcContentBars gcContents={gcContents} firstIndex={offset} />
+      )}
+      <div className="chart-pagination">
+        <button
+          type="button"
+          disabled={offset === 0}
+          onClick={() => setOffset(Math.max(0, offset - RECORDS_PAGE_SIZE))}
+        >
+          Anterior
+        </button>
+        <span>
+          Secuencias {offset + 1}-{last} de {recordCount}
+        </span>
+        <button
+          type="button"
+          disabled={last >= recordCount}
+          onClick={() => setOffset(offset + RECORDS_PAGE_SIZE)}
+        >
+          Siguiente
+        </button>
+      </div>
+    </div>
+  );
+};
+
+const AnalysisChart: React.FC<AnalysisChartProps> = ({ analysisType, results, analysisId }) => {
   if (!results) {
     return (
       <div className="chart-placeholder">
@@ -83,50 +197,10 @@ const AnalysisChart: React.FC<AnalysisChartProps> = ({ analysisType, results })
   // Chart for FASTA GC content analysis
   if (analysisType === 'fasta_gc_content') {
     if (results.individual_gc_contents && Array.isArray(results.individual_gc_contents)) {
-      const gcContents = results.individual_gc_contents;
-      const labels = Array.from({ length: gcContents.length }, (_, i) => `Seq ${i + 1}`);
-
-      const data = {
-        labels,
-        datasets: [
-          {
-            label: 'GC Content (%)',
-            data: gcContents,
-            backgroundColor: 'rgba(54, 162, 235, 0.5)',
-            borderColor: 'rgba(54, 162, 235, 1)',
-            borderWidth: 1,
-          },
-        ],
-      };
-
-      const options = {
-        responsive: true,
-        maintainAspectRatio: false,
-        plugins: {
-          legend: {
-            position: 'top' as const,
-          },
-          title: {
-            display: true,
-            text: 'GC Content por Secuencia',
-          },
-        },
-        scales: {
-          y: {
-            beginAtZero: true,
-            title: {
-              display: true,
-              text: 'GC Content (%)',
-            },
-          },
-        },
-      };
-
-      return (
-        <div style={{ height: '300px' }}>
-          <Bar data={data} options={options} />
-        </div>
-      );
+      return <GcContentBars gcContents={results.individual_gc_contents} />;
+    } else if (results.record_columns && analysisId !== undefined) {
+      // Más de SIDECAR_MIN_RECORDS secuencias: los valores están en MinIO
+      return <PagedGcContentChart analysisId={analysisId} recordCount={results.record_columns.record_count} />;
     } else if (results.average_gc_content !== undefined) {
       // Si solo tenemos el promedio
       const data = {
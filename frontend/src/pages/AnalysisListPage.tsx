@@ -162,6 +162,7 @@ const AnalysisListPage: React.FC = () => {
                         <AnalysisChart
                           analysisType={analysis.analysis_type}
                           results={analysis.results}
+                          analysisId={analysis.id}
                         />
                       </div>
                     </div>
@@ -9,4 +9,16 @@ celery_app = Celery(
 
 celery_app.conf.update(task_track_started=True)
 
+# Limpieza periódica (requiere celery beat, p. ej. worker -B)
+celery_app.conf.beat_schedule = {
+    'collect-abandoned-uploads': {
+        'task': 'app.tasks.collect_abandoned_uploads',
+        'schedule': 3600.0,
+    },
+    'collect-unreferenced-objects': {
+        'task': 'app.tasks.collect_unreferenced_objects',
+        'schedule': 24 * 3600.0,
+    },
+}
+
 celery_app.autodiscover_tasks(['app'])
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Miembros de archivos .zip y .tar (también .tar.gz/.tgz) subidos por lotes.
+
+Cada archivo regular del paquete se copia por bloques a un archivo temporal
+(en memoria hasta SPOOL_SIZE) para validarlo, calcular su hash y subirlo
+como cualquier otro archivo. Antes de copiar un miembro se comprueba que el
+lote lo espera (los demás se rechazan sin extraerlos) y que no se supera el
+número máximo de miembros; la copia se corta al superar el tamaño máximo de
+un miembro o el total extraído del lote, así que un paquete pequeño muy
+comprimido no puede llenar el disco.
+"""
+import tarfile
+import tempfile
+import zipfile
+
+from .streams import iter_chunks
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+# Bytes que se mantienen en memoria antes de pasar el temporal a disco
+SPOOL_SIZE = 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    """Paquete dañado, con un miembro inesperado o que supera los límites de extracción."""
+
+
+def is_archive(filename: str) -> bool:
+    """Indica si el nombre corresponde a un paquete .zip o .tar."""
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _copy_member(source, max_size: int, remaining: int):
+    target = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    size = 0
+    for chunk in iter_chunks(source):
+        size += len(chunk)
+        if size > max_size or size > remaining:
+            target.close()
+            if size > max_size:
+                raise ArchiveError(f"supera el tamaño máximo de {max_size // (1024 * 1024)}MB")
+            raise ArchiveError("el contenido extraído del lote supera el tamaño máximo")
+        target.write(chunk)
+    target.seek(0)
+    return target, size
+
+
+def _regular_members(archive):
+    """Pares (nombre, función que abre el miembro) de los archivos regulares."""
+    if isinstance(archive, zipfile.ZipFile):
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, lambda info=info: archive.open(info)
+    else:
+        for info in archive:
+            if info.isfile():
+                yield info.name, lambda info=info: archive.extractfile(info)
+
+
+def iter_members(fileobj, filename: str, max_size: int, accept=None, max_members: int = None,
+                 max_total_size: int = None):
+    """
+    Extrae uno a uno los archivos regulares de un paquete.
+
+    Args:
+        fileobj: Archivo del paquete (con seek)
+        filename: Nombre del paquete (decide entre zip y tar)
+        max_size: Tamaño máximo de cada miembro en bytes
+        accept: Función llamada con el nombre de cada miembro antes de
+            copiarlo; puede lanzar una excepción para rechazarlo
+        max_members: Número máximo de miembros (None sin límite)
+        max_total_size: Bytes que se pueden extraer en total (None sin límite)
+
+    Yields:
+        Tupla (ruta del miembro, archivo temporal, tamaño en bytes)
+
+    Raises:
+        ArchiveError: Si el paquete está dañado, tiene demasiados miembros o
+            un miembro (o el total extraído) es demasiado grande
+    """
+    remaining = float('inf') if max_total_size is None else max_total_size
+    count = 0
+    try:
+        if filename.lower().endswith('.zip'):
+            archive = zipfile.ZipFile(fileobj)
+        else:
+            archive = tarfile.open(fileobj=fileobj, mode='r:*')
+        with archive:
+            for name, open_member in _regular_members(archive):
+                count += 1
+                if max_members is not None and count > max_members:
+                    raise ArchiveError(f"tiene más de {max_members} archivos")
+                if accept is not None:
+                    accept(name)
+                with open_member() as member:
+                    copy, size = _copy_member(member, max_size, remaining)
+                remaining -= size
+                yield name, copy, size
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        raise ArchiveError(f"paquete no válido ({e})")
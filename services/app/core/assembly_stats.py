@@ -0,0 +1,91 @@
+"""
+Estadísticas de contigüidad de ensamblajes (N50/L50, N90, NG50, auN y GC por
+tamaño de contig) a partir de un FastaScanner.
+
+Todo se calcula sobre los arreglos de longitudes y G+C por contig que el
+motor FASTA ya acumula, con ordenaciones y sumas acumuladas de NumPy.
+"""
+import numpy as np
+
+from .fasta_engine import FastaScanner, COL_GC, COL_AT, COL_N
+from .length_stats import length_distribution, nx_statistics, length_histogram
+
+# Límites inferiores de los intervalos de tamaño de contig (en pb)
+LENGTH_BIN_EDGES = (0, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 1_000_000)
+
+
+def _bin_label(lower: int, upper) -> str:
+    if upper is None:
+        return f">={lower}"
+    return f"{lower}-{upper - 1}"
+
+
+def gc_by_length_bin(lengths: np.ndarray, gc_counts: np.ndarray, edges=LENGTH_BIN_EDGES) -> list:
+    """
+    Contigs, bases y contenido GC agrupados por intervalo de longitud.
+
+    Args:
+        lengths: Longitud de cada contig
+        gc_counts: Bases G+C de cada contig
+        edges: Límites inferiores de los intervalos (el último no tiene límite)
+
+    Returns:
+        Lista con un diccionario por intervalo no vacío
+    """
+    bins = np.digitize(lengths, edges[1:])
+    n_bins = len(edges)
+    contigs = np.bincount(bins, minlength=n_bins)
+    bases = np.bincount(bins, weights=lengths, minlength=n_bins)
+    gc = np.bincount(bins, weights=gc_counts, minlength=n_bins)
+
+    rows = []
+    for i in np.flatnonzero(contigs):
+        upper = edges[i + 1] if i + 1 < n_bins else None
+        rows.append({
+            "length_bin": _bin_label(edges[i], upper),
+            "contig_count": int(contigs[i]),
+            "total_length": int(bases[i]),
+            "gc_content": round(float(gc[i] / bases[i] * 100), 2) if bases[i] else 0.0,
+        })
+    return rows
+
+
+def assembly_stats(scanner: FastaScanner, genome_size: int = None) -> dict:
+    """
+    Estadísticas de contigüidad de un ensamblaje.
+
+    Args:
+        scanner: FastaScanner ya finalizado
+        genome_size: Tamaño esperado del genoma (opcional) para NG50/LG50
+
+    Returns:
+        Diccionario listo para guardarse como resultados JSON
+    """
+    lengths = scanner.lengths.view()
+    values, counts = length_distribution(lengths)
+    total_length = int(lengths.sum())
+
+    # auN: área bajo la curva Nx, sum(L^2) / sum(L)
+    squares = np.dot(values.astype(np.float64) ** 2, counts)
+    # GC global sobre las bases A/C/G/T (las N de los huecos no cuentan)
+    gc, at, n = (int(scanner.composition[c]) for c in (COL_GC, COL_AT, COL_N))
+
+    stats = {
+        "contig_count": int(lengths.size),
+        "total_length": total_length,
+        "largest_contig": int(values[-1]) if values.size else None,
+        "smallest_contig": int(values[0]) if values.size else None,
+        "mean_length": round(total_length / lengths.size, 2) if lengths.size else None,
+        "median_length": float(np.median(lengths)) if lengths.size else None,
+        **nx_statistics(values, counts, fractions=(0.5, 0.9)),
+        "auN": round(float(squares / total_length), 2) if total_length else None,
+        "gc_content": round(gc / (gc + at) * 100, 2) if gc + at else 0.0,
+        "n_count": n,
+        "n_per_100kb": round(n / total_length * 100_000, 2) if total_length else 0.0,
+        "gc_by_length_bin": gc_by_length_bin(lengths, scanner.gc_counts.view()),
+        "length_histogram": length_histogram(values, counts),
+    }
+    if genome_size:
+        stats["genome_size"] = genome_size
+        stats.update(nx_statistics(values, counts, fractions=(0.5,), genome_size=genome_size))
+    return stats
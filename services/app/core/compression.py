@@ -0,0 +1,138 @@
+"""
+Descompresión transparente de los objetos subidos (gzip, BGZF y zstd).
+
+El formato se detecta por los bytes mágicos del inicio del objeto, no por la
+extensión, y la descompresión se hace en streaming: los motores y los
+lectores de Biopython reciben un flujo binario con el contenido original.
+"""
+import gzip
+import io
+import zlib
+from typing import Optional
+
+from .streams import DEFAULT_CHUNK_SIZE
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Sufijos de archivo comprimido aceptados en las subidas
+COMPRESSED_EXTENSIONS = {'.gz', '.bgz', '.zst'}
+# Bytes (comprimidos y descomprimidos) que decompress_head usa como máximo
+HEAD_SIZE = 64 * 1024
+
+
+class _RawBody(io.RawIOBase):
+    """Adapta un flujo con read(n) (p. ej. StreamingBody de boto3) a RawIOBase."""
+
+    def __init__(self, body):
+        self._body = body
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._body.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._body.close()
+        super().close()
+
+
+def open_body(body) -> io.BufferedReader:
+    """
+    Envuelve el cuerpo de un objeto en un lector con búfer que admite peek().
+
+    Args:
+        body: Objeto con método read(n), p. ej. response['Body'] de boto3
+
+    Returns:
+        io.BufferedReader sobre el cuerpo
+    """
+    return io.BufferedReader(_RawBody(body), DEFAULT_CHUNK_SIZE)
+
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """
+    Detecta el formato de compresión a partir de los primeros bytes.
+
+    BGZF es gzip con varios miembros, así que se detecta como 'gzip'.
+
+    Returns:
+        'gzip', 'zstd' o None si el contenido no está comprimido
+    """
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return None
+
+
+def decompress(stream: io.BufferedReader, compression: Optional[str]):
+    """
+    Devuelve un flujo binario con el contenido descomprimido de stream.
+
+    Args:
+        stream: Lector devuelto por open_body
+        compression: Resultado de detect_compression
+
+    Raises:
+        ValueError: Si el archivo es zstd y el paquete zstandard no está instalado
+    """
+    if compression == 'gzip':
+        # GzipFile lee todos los miembros concatenados (BGZF incluido)
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("El archivo está comprimido con zstd y el paquete 'zstandard' no está instalado.")
+        reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader, DEFAULT_CHUNK_SIZE)
+    return stream
+
+
+def open_decompressed(body):
+    """
+    Abre el cuerpo de un objeto descomprimiéndolo si es gzip, BGZF o zstd.
+
+    Args:
+        body: Objeto con método read(n), p. ej. response['Body'] de boto3
+
+    Returns:
+        Flujo binario con el contenido sin comprimir
+    """
+    stream = open_body(body)
+    return decompress(stream, detect_compression(stream.peek(4)[:4]))
+
+
+def decompress_head(head: bytes) -> Optional[bytes]:
+    """
+    Descomprime el inicio del primer bloque de un archivo (para reconocer su
+    formato sin leerlo entero). Se limitan tanto la entrada como la salida a
+    HEAD_SIZE bytes: un bloque pequeño muy comprimido no puede expandirse en
+    memoria.
+
+    Returns:
+        Hasta HEAD_SIZE bytes del contenido sin comprimir (vacío si los datos
+        están dañados), o None si es zstd y zstandard no está instalado
+    """
+    head = head[:HEAD_SIZE]
+    compression = detect_compression(head[:4])
+    try:
+        if compression == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, HEAD_SIZE)
+        if compression == 'zstd':
+            if zstandard is None:
+                return None
+            return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(head)).read(HEAD_SIZE)
+    except Exception:
+        # zlib.error / zstandard.ZstdError: el inicio no es un flujo válido
+        return b''
+    return head
@@ -1,3 +1,6 @@
+from typing import Optional
+
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -13,6 +16,14 @@ class Settings(BaseSettings):
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_BUCKET_NAME: str
+    # Endpoint reachable by browsers, used to sign direct-upload URLs (defaults to MINIO_ENDPOINT)
+    MINIO_PUBLIC_ENDPOINT: Optional[str] = None
+    # Shared per-process S3 client: connection pool size, retry policy and timeouts (seconds)
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MAX_ATTEMPTS: int = 5
+    S3_RETRY_MODE: str = "standard"
+    S3_CONNECT_TIMEOUT_S: float = 5.0
+    S3_READ_TIMEOUT_S: float = 60.0
 
     # Redis configuration for Celery
     REDIS_URL: str
@@ -22,6 +33,78 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Parallel processing of large FASTA/FASTQ files (byte ranges across processes)
+    PARALLEL_SCAN_MIN_SIZE_MB: int = 512
+    PARALLEL_SCAN_WORKERS: int = 0  # 0 = number of CPUs
+
+    # Per-record arrays (GC and length of each sequence, the GenBank record table) above
+    # this many records are stored as .npy columns in MinIO instead of inside the
+    # Analysis results JSON
+    SIDECAR_MIN_RECORDS: int = 1000
+
+    # Minimum seconds between two PROGRESS updates published by a task
+    PROGRESS_UPDATE_INTERVAL_S: float = 2.0
+
+    # approximate=true mode: total bytes sampled and number of stratified byte ranges
+    APPROXIMATE_SAMPLE_MB: int = 64
+    APPROXIMATE_SAMPLE_RANGES: int = 64
+
+    # k-mer counting: in-memory table size before spilling sorted runs to disk
+    KMER_MEMORY_BUDGET_MB: int = 512
+
+    # MinHash sketches of analyzed FASTA files, used by /analysis/similar (the similarity
+    # index stores hash positions as uint16, so SKETCH_SIZE is at most 65535)
+    SKETCH_FASTA_ANALYSES: bool = True
+    SKETCH_K: int = 21
+    SKETCH_SIZE: int = 1000
+    # Maximum number of strains returned by /analysis/similar
+    SIMILAR_STRAINS_MAX_LIMIT: int = 100
+
+    # Maximum upload size. Uploads are validated, hashed and sent to MinIO part by part,
+    # so API memory per upload does not grow with the file size (see below)
+    MAX_UPLOAD_SIZE_MB: int = 50 * 1024
+
+    # Multipart uploads to MinIO: files of at least the threshold are sent in parts of
+    # UPLOAD_PART_SIZE_MB, UPLOAD_MAX_CONCURRENCY parts at a time. The upload stream has
+    # no seek(), so boto3 buffers the parts it sends: at most UPLOAD_MAX_CONCURRENCY parts
+    # per upload are kept in memory, i.e. about UPLOAD_PART_SIZE_MB * UPLOAD_MAX_CONCURRENCY
+    # (64 MB by default) per upload and UPLOAD_INGEST_CONCURRENCY times that per process.
+    # The threshold must not exceed the part size (the first read is threshold bytes).
+    # Presigned direct uploads use the same part size
+    UPLOAD_MULTIPART_THRESHOLD_MB: int = 16
+    UPLOAD_PART_SIZE_MB: int = 16
+    UPLOAD_MAX_CONCURRENCY: int = 4
+    # Uploads validated and sent to MinIO at the same time by each API process; the rest
+    # wait without blocking the event loop or the threadpool used by sync endpoints
+    UPLOAD_INGEST_CONCURRENCY: int = 8
+
+    # Batch uploads (/analysis/upload/batch): maximum files per batch, archive members included
+    BATCH_MAX_FILES: int = 500
+    # Maximum combined size of the archive members extracted from one batch (temporary disk)
+    BATCH_MAX_EXTRACTED_MB: int = 10 * 1024
+
+    # Direct-to-MinIO uploads and downloads: lifetime of presigned URLs, and whether
+    # /analysis/{id}/download redirects to a presigned URL by default
+    PRESIGNED_URL_EXPIRES_S: int = 3600
+    DOWNLOAD_PRESIGNED_REDIRECT: bool = False
+
+    # Resumable uploads: chunk size (MinIO multipart part, at least 5 MB) and hours without
+    # activity after which a session is abandoned and its parts are deleted
+    RESUMABLE_CHUNK_SIZE_MB: int = 8
+    RESUMABLE_UPLOAD_TTL_HOURS: int = 24
+
+    # Content-addressed uploads: analyses migrated per batch of the legacy-key migration
+    # job, and hours an object must go without references or re-uploads before cleanup
+    CONTENT_MIGRATION_BATCH_SIZE: int = 100
+    UNREFERENCED_OBJECT_GRACE_HOURS: int = 24
+
+    @field_validator("SKETCH_SIZE")
+    @classmethod
+    def check_sketch_size(cls, value: int) -> int:
+        if not 0 < value <= 65535:
+            raise ValueError("SKETCH_SIZE must be between 1 and 65535")
+        return value
+
     # model_config allows pydantic to load variables from a .env file for local development
     # In production (Docker), these will be passed directly as environment variables.
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -0,0 +1,399 @@
+"""
+Motor de análisis FASTA a nivel de bytes.
+
+Recorre el archivo por bloques con np.frombuffer, sin construir SeqRecord ni
+copiar cada secuencia a un str. Produce los mismos resultados que
+SeqIO.parse(..., "fasta") (los espacios, tabuladores y saltos de línea no
+cuentan como residuos; el texto anterior a la primera cabecera se ignora).
+"""
+import numpy as np
+
+_NEWLINE = ord('\n')
+_HEADER = ord('>')
+
+# Columnas de la matriz de conteos por registro
+COL_GC, COL_AT, COL_N, COL_WS = range(4)
+
+# Tabla de consulta: cada byte se convierte en un entero de 64 bits con cuatro
+# contadores empaquetados de 16 bits (G+C, A+T, N y espacios en blanco).
+# Sumar estos valores en un segmento suma los cuatro contadores a la vez,
+# siempre que el segmento tenga menos de 2**16 bytes.
+_FIELD_BITS = 16
+_FIELD_MASK = (1 << _FIELD_BITS) - 1
+_MAX_PACKED_SEGMENT = _FIELD_MASK
+
+
+def _build_packed_lut() -> np.ndarray:
+    lut = np.zeros(256, dtype=np.uint64)
+    for byte in b'GCgc':
+        lut[byte] = 1 << (COL_GC * _FIELD_BITS)
+    for byte in b'ATat':
+        lut[byte] = 1 << (COL_AT * _FIELD_BITS)
+    for byte in b'Nn':
+        lut[byte] = 1 << (COL_N * _FIELD_BITS)
+    # Bytes de control y espacio: no son residuos
+    lut[:33] = 1 << (COL_WS * _FIELD_BITS)
+    return lut
+
+
+_PACKED_LUT = _build_packed_lut()
+_FIELD_SHIFTS = np.array([c * _FIELD_BITS for c in range(4)], dtype=np.uint64)
+
+# Por debajo de este número de segmentos por bloque es más rápido contar cada
+# segmento con comparaciones que pasar todo el bloque por la tabla.
+_SPARSE_SEGMENT_LIMIT = 16
+
+
+class GrowableArray:
+    """
+    Arreglo de NumPy de tamaño dinámico (duplica su capacidad al llenarse).
+    """
+
+    def __init__(self, dtype=np.int64, capacity: int = 1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed > self._data.size:
+            new_capacity = max(needed, self._data.size * 2)
+            grown = np.empty(new_capacity, dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def append(self, value) -> None:
+        self._reserve(1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values: np.ndarray) -> None:
+        self._reserve(len(values))
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def view(self) -> np.ndarray:
+        """Devuelve una vista (sin copia) de los elementos válidos."""
+        return self._data[:self._size]
+
+
+def _count_segment(segment: np.ndarray) -> np.ndarray:
+    """Cuenta G+C, A+T, N y espacios de un segmento con comparaciones."""
+    folded = segment | 0x20  # minúsculas para letras ASCII
+    counts = np.empty(4, dtype=np.int64)
+    # 'c' (0x63) y 'g' (0x67) sólo difieren en el bit 0x04
+    counts[COL_GC] = np.count_nonzero((folded | 0x04) == 0x67)
+    counts[COL_AT] = np.count_nonzero(folded == 0x61) + np.count_nonzero(folded == 0x74)
+    counts[COL_N] = np.count_nonzero(folded == 0x6E)
+    counts[COL_WS] = np.count_nonzero(segment <= 0x20)
+    return counts
+
+
+def count_segments(data: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Cuenta la composición de varios segmentos [start, end) de un bloque.
+
+    Args:
+        data: Bloque de bytes como arreglo uint8
+        starts: Inicios de los segmentos (ordenados)
+        ends: Finales de los segmentos (exclusivos)
+
+    Returns:
+        Matriz int64 de forma (n_segmentos, 4) con columnas COL_GC, COL_AT,
+        COL_N y COL_WS
+    """
+    n_segments = len(starts)
+    if n_segments <= _SPARSE_SEGMENT_LIMIT:
+        counts = np.zeros((n_segments, 4), dtype=np.int64)
+        for i in range(n_segments):
+            if ends[i] > starts[i]:
+                counts[i] = _count_segment(data[starts[i]:ends[i]])
+        return counts
+
+    # Camino denso: una sola pasada por la tabla y una reducción por segmento.
+    packed = np.empty(data.size + 1, dtype=np.uint64)
+    _PACKED_LUT.take(data, out=packed[:-1], mode='clip')
+    packed[-1] = 0
+    bounds = np.empty(2 * n_segments, dtype=np.intp)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    sums = np.add.reduceat(packed, bounds)[0::2]
+    counts = ((sums[:, None] >> _FIELD_SHIFTS) & _FIELD_MASK).astype(np.int64)
+
+    lengths = ends - starts
+    counts[lengths == 0] = 0
+    # Los segmentos largos desbordarían los contadores de 16 bits
+    for i in np.flatnonzero(lengths >= _MAX_PACKED_SEGMENT):
+        counts[i] = _count_segment(data[starts[i]:ends[i]])
+    return counts
+
+
+class _FastaSegmenter:
+    """
+    Estado común a los analizadores FASTA por bloques.
+
+    Localiza las cabeceras ('>' al inicio de línea, aunque caiga justo en el
+    límite entre dos bloques) y los segmentos de secuencia entre ellas.
+    """
+
+    def __init__(self):
+        self.bytes_read = 0
+        self._has_record = False
+        self._in_header = False
+        self._at_line_start = True
+
+    def _split(self, data: np.ndarray):
+        """
+        Divide un bloque en segmentos de secuencia.
+
+        El segmento 0 continúa el registro abierto antes del bloque (o es texto
+        previo a la primera cabecera); el segmento i (i >= 1) pertenece al
+        registro abierto por la cabecera i-1. Si la última cabecera no termina
+        en este bloque, no tiene segmento propio.
+
+        Returns:
+            Tupla (n_cabeceras, inicios, finales) de los segmentos
+        """
+        size = data.size
+        self.bytes_read += size
+
+        headers = np.flatnonzero(data == _HEADER)
+        if headers.size:
+            prev_is_newline = np.empty(headers.size, dtype=bool)
+            prev_is_newline[1:] = data[headers[1:] - 1] == _NEWLINE
+            if headers[0] == 0:
+                prev_is_newline[0] = self._at_line_start
+            else:
+                prev_is_newline[0] = data[headers[0] - 1] == _NEWLINE
+            headers = headers[prev_is_newline]
+        self._at_line_start = bool(data[-1] == _NEWLINE)
+
+        if not headers.size and not self._in_header:
+            # Caso más común en ensamblajes: el bloque es todo secuencia
+            return 0, np.zeros(1, dtype=np.intp), np.full(1, size, dtype=np.intp)
+
+        newlines = np.flatnonzero(data == _NEWLINE)
+
+        # Inicio del primer segmento de secuencia del bloque
+        start = 0
+        if self._in_header:
+            if not newlines.size:
+                empty = np.zeros(0, dtype=np.intp)
+                return 0, empty, empty
+            start = newlines[0] + 1
+            self._in_header = False
+
+        # Fin de cada línea de cabecera (posición de su '\n'); la última puede
+        # continuar en el bloque siguiente
+        end_idx = np.searchsorted(newlines, headers)
+        unfinished = bool(headers.size) and end_idx[-1] == newlines.size
+        header_ends = newlines[end_idx[:-1] if unfinished else end_idx]
+        self._in_header = unfinished
+
+        seg_starts = np.empty(header_ends.size + 1, dtype=np.intp)
+        seg_starts[0] = start
+        seg_starts[1:] = header_ends + 1
+        seg_ends = np.empty(header_ends.size + 1, dtype=np.intp)
+        seg_ends[:-1] = headers[:header_ends.size]
+        seg_ends[-1] = headers[-1] if unfinished else size
+        return headers.size, seg_starts, seg_ends
+
+
+class FastaScanner(_FastaSegmenter):
+    """
+    Analizador incremental de FASTA sobre bloques de bytes.
+
+    Acumula por registro el número de residuos y de G+C en arreglos de NumPy,
+    y los totales de composición (G+C, A+T, N) de todo el archivo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lengths = GrowableArray(np.int64)
+        self.gc_counts = GrowableArray(np.int64)
+        self.composition = np.zeros(3, dtype=np.int64)  # G+C, A+T, N
+        # Registro abierto: G+C, A+T, N y longitud (misma disposición que
+        # la salida de count_segments tras convertir espacios en longitud)
+        self._current = np.zeros(4, dtype=np.int64)
+
+    @property
+    def sequence_count(self) -> int:
+        return len(self.lengths) + (1 if self._has_record else 0)
+
+    def _close_records(self, records: np.ndarray) -> None:
+        self.lengths.extend(records[:, COL_WS])
+        self.gc_counts.extend(records[:, COL_GC])
+        self.composition += records[:, :COL_WS].sum(axis=0)
+
+    def feed(self, chunk: bytes) -> None:
+        """Procesa el siguiente bloque de bytes del archivo."""
+        if not chunk:
+            return
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        n_headers, seg_starts, seg_ends = self._split(data)
+        if not seg_starts.size:
+            return
+
+        counts = count_segments(data, seg_starts, seg_ends)
+        # La columna de espacios pasa a ser la longitud en residuos
+        counts[:, COL_WS] = (seg_ends - seg_starts) - counts[:, COL_WS]
+
+        # El primer segmento continúa el registro abierto (si lo hay)
+        if self._has_record:
+            self._current += counts[0]
+        if not n_headers:
+            return
+
+        if self._has_record:
+            self._close_records(self._current[None, :])
+        self._close_records(counts[1:n_headers])
+        if len(counts) > n_headers:
+            self._current = counts[n_headers].copy()
+        else:
+            self._current = np.zeros(4, dtype=np.int64)
+        self._has_record = True
+
+    def finish(self) -> None:
+        """Cierra el último registro. Debe llamarse al agotar el flujo."""
+        if self._has_record:
+            self._close_records(self._current[None, :])
+            self._current = np.zeros(4, dtype=np.int64)
+            self._has_record = False
+        self._in_header = False
+
+    def merge(self, other: "FastaScanner") -> None:
+        """Añade los registros de otro analizador ya finalizado (p. ej. de otro rango)."""
+        self.lengths.extend(other.lengths.view())
+        self.gc_counts.extend(other.gc_counts.view())
+        self.composition += other.composition
+        self.bytes_read += other.bytes_read
+
+    def gc_percentages(self) -> np.ndarray:
+        """Porcentaje de G+C de cada registro (0.0 si el registro está vacío)."""
+        lengths = self.lengths.view()
+        gc = self.gc_counts.view()
+        percentages = np.zeros(lengths.size, dtype=np.float64)
+        nonempty = lengths > 0
+        percentages[nonempty] = (gc[nonempty] / lengths[nonempty]) * 100
+        return percentages
+
+
+class FastaCounter(_FastaSegmenter):
+    """
+    Contador rápido de registros FASTA sobre bytes crudos.
+
+    Sólo cuenta cabeceras, bytes y residuos (bytes de secuencia que no son
+    espacios ni saltos de línea); nunca decodifica el contenido a texto.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sequence_count = 0
+        self.total_residues = 0
+
+    def feed(self, chunk: bytes) -> None:
+        """Procesa el siguiente bloque de bytes del archivo."""
+        if not chunk:
+            return
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        n_headers, seg_starts, seg_ends = self._split(data)
+        if not seg_starts.size:
+            return
+
+        # Los espacios son escasos (~1 por línea): basta con sus posiciones
+        whitespace = np.flatnonzero(data <= 0x20)
+        seg_whitespace = np.searchsorted(whitespace, seg_ends) - np.searchsorted(whitespace, seg_starts)
+        residues = (seg_ends - seg_starts) - seg_whitespace
+        if not self._has_record:
+            # Texto anterior a la primera cabecera
+            residues = residues[1:]
+        self.total_residues += int(residues.sum())
+        self.sequence_count += n_headers
+        if n_headers:
+            self._has_record = True
+
+    def finish(self) -> None:
+        """Reinicia el estado entre archivos (no hay registros pendientes)."""
+        self._has_record = False
+        self._in_header = False
+
+    def merge(self, other: "FastaCounter") -> None:
+        """Suma los conteos de otro contador (p. ej. de otro rango)."""
+        self.sequence_count += other.sequence_count
+        self.total_residues += other.total_residues
+        self.bytes_read += other.bytes_read
+
+
+def count_fasta(chunks) -> FastaCounter:
+    """
+    Cuenta registros, bytes y residuos de un FASTA a partir de bloques de bytes.
+
+    Args:
+        chunks: Iterable de bloques de bytes (p. ej. streams.iter_chunks(body))
+
+    Returns:
+        FastaCounter con sequence_count, bytes_read y total_residues
+    """
+    counter = FastaCounter()
+    for chunk in chunks:
+        counter.feed(chunk)
+    counter.finish()
+    return counter
+
+
+def scan_fasta(chunks) -> FastaScanner:
+    """
+    Analiza un FASTA completo a partir de un iterable de bloques de bytes.
+
+    Args:
+        chunks: Iterable de bloques de bytes (p. ej. streams.iter_chunks(body))
+
+    Returns:
+        FastaScanner ya finalizado
+    """
+    scanner = FastaScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    scanner.finish()
+    return scanner
+
+
+def _round2(values: np.ndarray) -> list:
+    """
+    Equivalente vectorizado de [round(v, 2) for v in values].
+
+    np.rint coincide con round() salvo en valores casi equidistantes entre
+    dos centésimas; ésos se redondean con round() para obtener el mismo float.
+    """
+    scaled = values * 100
+    rounded = np.rint(scaled) / 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded.tolist()
+
+
+def gc_content_results(scanner: FastaScanner, individual: bool = True) -> dict:
+    """
+    Resultados de contenido GC con el mismo formato que la tarea original.
+
+    Args:
+        scanner: FastaScanner ya finalizado
+        individual: Incluir la lista individual_gc_contents
+
+    Returns:
+        Diccionario con sequence_count, average_gc_content e
+        individual_gc_contents
+    """
+    percentages = scanner.gc_percentages()
+    avg_gc_content = np.mean(percentages) if percentages.size else 0.0
+    results = {
+        "sequence_count": int(percentages.size),
+        # round() sobre np.float64 redondea como NumPy, igual que la tarea original
+        "average_gc_content": round(avg_gc_content, 2),
+    }
+    if individual:
+        results["individual_gc_contents"] = _round2(percentages)
+    return results
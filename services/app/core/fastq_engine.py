@@ -0,0 +1,189 @@
+"""
+Motor de estadísticas FASTQ sobre bytes crudos.
+
+Lee registros de 4 líneas directamente de los bloques de bytes, sin construir
+SeqRecord ni listas de enteros de calidad por lectura. Las calidades de cada
+bloque se convierten de una sola vez con np.frombuffer y se reducen por
+lectura con np.add.reduceat.
+"""
+import math
+
+import numpy as np
+
+from .quality_profile import PositionProfile
+
+_NEWLINE = ord('\n')
+_CR = ord('\r')
+_AT = ord('@')
+_PLUS = ord('+')
+
+# Codificación Phred+33 (Sanger / Illumina 1.8+), la que usa SeqIO "fastq"
+PHRED_OFFSET = 33
+
+
+class FastqScanner:
+    """
+    Analizador incremental de FASTQ (4 líneas por registro) sobre bloques.
+
+    Acumula número de lecturas, suma/mínimo/máximo de longitudes, el número
+    de lecturas de cada longitud y la suma de las calidades medias por lectura.
+    """
+
+    def __init__(self, quality_offset: int = PHRED_OFFSET, positional: bool = False):
+        self.quality_offset = quality_offset
+        # Perfil de calidad y composición por posición (sólo si se pide)
+        self.position_profile = PositionProfile(quality_offset) if positional else None
+        self.sequence_count = 0
+        self.total_length = 0
+        self.min_length = None
+        self.max_length = None
+        self.quality_reads = 0
+        self.bytes_read = 0
+        # length_counts[n] = número de lecturas de longitud n
+        self.length_counts = np.zeros(0, dtype=np.int64)
+        # Suma de calidades medias de cada bloque (se combinan con math.fsum)
+        self._quality_mean_sums = []
+        # Bytes de un registro incompleto al final del bloque anterior
+        self._carry = b''
+
+    def feed(self, chunk: bytes) -> None:
+        """Procesa el siguiente bloque de bytes del archivo."""
+        if not chunk:
+            return
+        self.bytes_read += len(chunk)
+        buffer = self._carry + chunk if self._carry else chunk
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        newlines = np.flatnonzero(data == _NEWLINE)
+        n_lines = (newlines.size // 4) * 4
+        if not n_lines:
+            self._carry = buffer
+            return
+        end = newlines[n_lines - 1] + 1
+        self._process_block(data[:end], newlines[:n_lines])
+        self._carry = buffer[end:]
+
+    def finish(self) -> None:
+        """Procesa el último registro pendiente. Debe llamarse al agotar el flujo."""
+        carry, self._carry = self._carry, b''
+        if not carry.strip():
+            return
+        if not carry.endswith(b'\n'):
+            carry += b'\n'
+        if carry.count(b'\n') == 3:
+            # Lectura vacía al final: la línea de calidad vacía no tiene '\n'
+            carry += b'\n'
+        data = np.frombuffer(carry, dtype=np.uint8)
+        newlines = np.flatnonzero(data == _NEWLINE)
+        if newlines.size != 4:
+            raise ValueError("El archivo FASTQ termina con un registro incompleto.")
+        self._process_block(data, newlines)
+
+    def _process_block(self, data: np.ndarray, newlines: np.ndarray) -> None:
+        """Procesa un bloque que contiene sólo registros completos."""
+        line_starts = np.empty(newlines.size, dtype=np.intp)
+        line_starts[0] = 0
+        line_starts[1:] = newlines[:-1] + 1
+        line_ends = newlines.copy()
+        # Finales de línea Windows: el '\r' no forma parte de la línea
+        has_cr = (line_ends > line_starts) & (data[line_ends - 1] == _CR)
+        line_ends[has_cr] -= 1
+
+        if not (np.all(data[line_starts[0::4]] == _AT) and np.all(data[line_starts[2::4]] == _PLUS)):
+            raise ValueError("El archivo FASTQ no sigue el formato de 4 líneas por registro (@, secuencia, +, calidad).")
+
+        seq_lengths = line_ends[1::4] - line_starts[1::4]
+        qual_starts = line_starts[3::4]
+        qual_lengths = line_ends[3::4] - qual_starts
+        if np.any(seq_lengths != qual_lengths):
+            raise ValueError("Las longitudes de secuencia y calidad difieren en el archivo FASTQ.")
+
+        # Suma de los bytes de calidad de cada lectura; restar offset * longitud
+        # equivale a sumar (np.frombuffer(...) - offset) byte a byte.
+        bounds = np.empty(2 * qual_starts.size, dtype=np.intp)
+        bounds[0::2] = qual_starts
+        bounds[1::2] = qual_starts + qual_lengths
+        byte_sums = np.add.reduceat(data, bounds, dtype=np.int64)[0::2]
+        has_quality = qual_lengths > 0
+        quality_sums = byte_sums[has_quality] - self.quality_offset * qual_lengths[has_quality]
+        mean_qualities = quality_sums / qual_lengths[has_quality]
+
+        self.sequence_count += seq_lengths.size
+        self.total_length += int(seq_lengths.sum())
+        block_min = int(seq_lengths.min())
+        block_max = int(seq_lengths.max())
+        self.min_length = block_min if self.min_length is None else min(self.min_length, block_min)
+        self.max_length = block_max if self.max_length is None else max(self.max_length, block_max)
+        self.quality_reads += mean_qualities.size
+        self._quality_mean_sums.append(float(mean_qualities.sum()))
+        self._add_length_counts(np.bincount(seq_lengths))
+        if self.position_profile is not None:
+            self.position_profile.add_reads(data, line_starts[1::4], qual_starts, seq_lengths)
+
+    def _add_length_counts(self, counts: np.ndarray) -> None:
+        if counts.size > self.length_counts.size:
+            grown = np.zeros(counts.size, dtype=np.int64)
+            grown[:self.length_counts.size] = self.length_counts
+            self.length_counts = grown
+        self.length_counts[:counts.size] += counts
+
+    def merge(self, other: "FastqScanner") -> None:
+        """Combina las estadísticas de otro analizador ya finalizado."""
+        self.sequence_count += other.sequence_count
+        self.total_length += other.total_length
+        if other.min_length is not None:
+            self.min_length = other.min_length if self.min_length is None else min(self.min_length, other.min_length)
+            self.max_length = other.max_length if self.max_length is None else max(self.max_length, other.max_length)
+        self.quality_reads += other.quality_reads
+        self.bytes_read += other.bytes_read
+        self._quality_mean_sums.extend(other._quality_mean_sums)
+        self._add_length_counts(other.length_counts)
+        if self.position_profile is not None and other.position_profile is not None:
+            self.position_profile.merge(other.position_profile)
+
+    @property
+    def overall_avg_quality(self) -> float:
+        """Media de las calidades medias por lectura (0 si no hay calidades)."""
+        if not self.quality_reads:
+            return 0
+        return math.fsum(self._quality_mean_sums) / self.quality_reads
+
+
+def scan_fastq(chunks, quality_offset: int = PHRED_OFFSET, positional: bool = False) -> FastqScanner:
+    """
+    Analiza un FASTQ completo a partir de un iterable de bloques de bytes.
+
+    Args:
+        chunks: Iterable de bloques de bytes (p. ej. streams.iter_chunks(body))
+        quality_offset: Desplazamiento ASCII de las calidades
+        positional: Acumular también el perfil por posición de lectura
+
+    Returns:
+        FastqScanner ya finalizado
+    """
+    scanner = FastqScanner(quality_offset, positional)
+    for chunk in chunks:
+        scanner.feed(chunk)
+    scanner.finish()
+    return scanner
+
+
+def fastq_stats_results(scanner: FastqScanner) -> dict:
+    """
+    Estadísticas FASTQ con el mismo formato que la tarea original.
+
+    Returns:
+        Diccionario con sequence_count, avg_sequence_length, min_length,
+        max_length y overall_avg_quality
+    """
+    # La tarea original redondeaba valores np.float64 (redondeo de NumPy)
+    avg_length = np.float64(scanner.total_length / scanner.sequence_count)
+    overall_avg_quality = scanner.overall_avg_quality
+    if scanner.quality_reads:
+        overall_avg_quality = np.float64(overall_avg_quality)
+    return {
+        "sequence_count": scanner.sequence_count,
+        "avg_sequence_length": round(avg_length, 2),
+        "min_length": scanner.min_length,
+        "max_length": scanner.max_length,
+        "overall_avg_quality": round(overall_avg_quality, 2),
+    }
@@ -0,0 +1,70 @@
+"""
+Estadísticas GenBank en streaming.
+
+Recorre los registros de uno en uno con SeqIO.parse, de modo que la memoria
+queda acotada por el registro más grande y no por el archivo completo. Los
+totales cubren todos los registros y la tabla por registro se acumula en
+columnas (listas de valores), más compactas que un diccionario por registro;
+los ensamblajes con miles de contigs la guardan como columnas por registro
+en MinIO (core/sidecar.py) en lugar de dentro de los resultados.
+"""
+from Bio import SeqIO
+
+# Columnas de la tabla por registro
+RECORD_COLUMNS = ("record_id", "sequence_length", "feature_count", "molecule_type", "topology")
+
+
+def summarize_genbank(text_stream):
+    """
+    Resume todos los registros de un archivo GenBank.
+
+    Args:
+        text_stream: Flujo de texto con el contenido GenBank
+
+    Returns:
+        Tupla (resumen, columnas): el resumen tiene los datos del primer
+        registro (mismas claves que la versión anterior) y los totales; las
+        columnas, {nombre: lista de valores} con una entrada por registro
+        (ver RECORD_COLUMNS)
+    """
+    columns = {name: [] for name in RECORD_COLUMNS}
+    sequence_count = 0
+    main_record = None
+    total_length = 0
+    total_features = 0
+
+    for record in SeqIO.parse(text_stream, "genbank"):
+        sequence_length = len(record.seq)
+        feature_count = len(record.features)
+        if main_record is None:
+            main_record = {
+                "main_record_id": record.id,
+                "description": record.description,
+            }
+        columns["record_id"].append(record.id)
+        columns["sequence_length"].append(sequence_length)
+        columns["feature_count"].append(feature_count)
+        columns["molecule_type"].append(record.annotations.get('molecule_type', 'N/A'))
+        columns["topology"].append(record.annotations.get('topology', 'N/A'))
+        sequence_count += 1
+        total_length += sequence_length
+        total_features += feature_count
+        # Se descarta la referencia al registro antes de leer el siguiente
+        del record
+
+    if main_record is None:
+        return {"sequence_count": 0}, columns
+
+    summary = {
+        "sequence_count": sequence_count,
+        **main_record,
+        **{name: columns[name][0] for name in RECORD_COLUMNS if name != "record_id"},
+        "total_length": total_length,
+        "total_features": total_features,
+    }
+    return summary, columns
+
+
+def record_summaries(columns: dict) -> list:
+    """Tabla por registro como lista de diccionarios (uno por registro)."""
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
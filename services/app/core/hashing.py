@@ -0,0 +1,39 @@
+"""
+Hash de contenido de los archivos subidos, calculado mientras se transmiten.
+"""
+import hashlib
+
+from .streams import DEFAULT_CHUNK_SIZE
+
+
+class HashingReader:
+    """
+    Flujo con read(n) que actualiza un SHA-256 con los bytes que entrega.
+
+    En las subidas se pasa a upload_fileobj en lugar del archivo para que
+    boto3 lo suba y se calcule su hash en la misma lectura (ver
+    stage_upload); como el hash sólo se conoce al terminar, el objeto se
+    sube bajo una clave provisional. No tiene seek(), así que s3transfer lo
+    lee en orden y reintenta las partes desde su copia en memoria sin volver
+    a leerlo. También hashea objetos mientras se descargan de MinIO.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._hash = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self._hash.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def drain(self) -> None:
+        """Lee (y hashea) lo que quede del flujo; no hace nada si ya se agotó."""
+        while self.read(DEFAULT_CHUNK_SIZE):
+            pass
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
@@ -0,0 +1,378 @@
+"""
+Espectro de k-meros (histograma de abundancias) para FASTA y FASTQ.
+
+La secuencia se codifica con 2 bits por base (A=0, C=1, G=2, T=3; cualquier
+otro byte invalida las ventanas que lo contienen). Los k-meros (k <= 31)
+caben en un uint64 y se calculan con desplazamientos vectorizados; se cuenta
+el k-mero canónico (el menor entre el k-mero y su complemento inverso).
+
+Los conteos se guardan en arreglos ordenados (claves, conteos). Cuando la
+tabla supera el presupuesto de memoria se vuelca a disco y al final las
+tablas volcadas se combinan por rangos de claves, leyéndolas con mmap.
+"""
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from .fasta_engine import _FastaSegmenter
+from .fastq_engine import FastqScanner, PHRED_OFFSET
+
+MAX_K = 31
+DEFAULT_K = 21
+# Las abundancias mayores se acumulan en el último intervalo del histograma
+MAX_ABUNDANCE = 10_000
+# Número mínimo de k-meros acumulados antes de ordenarlos y sumarlos a la tabla
+_BATCH_SIZE = 1 << 22
+# Bytes por entrada de la tabla: clave uint64 + conteo int64
+_ENTRY_BYTES = 16
+
+_INVALID = 4
+_CODE_LUT = np.full(256, _INVALID, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    _CODE_LUT[_base] = _code
+    _CODE_LUT[_base | 0x20] = _code
+
+
+def _combine(left: np.ndarray, left_width: int, right: np.ndarray, right_width: int, reverse: bool) -> np.ndarray:
+    """
+    Une ventanas de left_width bases con las de right_width bases que empiezan
+    justo después. En sentido directo la izquierda ocupa los bits altos; en el
+    complemento inverso, los bajos.
+    """
+    n = right.size - left_width
+    if reverse:
+        return left[:n] | (right[left_width:left_width + n] << np.uint64(2 * left_width))
+    return (left[:n] << np.uint64(2 * right_width)) | right[left_width:left_width + n]
+
+
+def canonical_kmers(codes: np.ndarray, k: int) -> np.ndarray:
+    """
+    Calcula los k-meros canónicos de todas las ventanas válidas de codes.
+
+    Las ventanas se construyen por duplicación (2, 4, 8, ... bases), con
+    O(log k) pasadas vectorizadas en lugar de k.
+
+    Args:
+        codes: Bases codificadas (0-3) con _INVALID donde no hay A/C/G/T
+        k: Longitud de los k-meros (1..31)
+
+    Returns:
+        Arreglo uint64 con un k-mero canónico por ventana válida
+    """
+    if codes.size < k:
+        return np.zeros(0, dtype=np.uint64)
+    invalid = codes == _INVALID
+    forward_power = np.where(invalid, 0, codes).astype(np.uint64)
+    reverse_power = np.uint64(3) - forward_power
+    forward = reverse = None
+    width = 0
+    power = 1
+    remaining = k
+    while remaining:
+        if remaining & 1:
+            if forward is None:
+                forward, reverse = forward_power, reverse_power
+            else:
+                forward = _combine(forward, width, forward_power, power, reverse=False)
+                reverse = _combine(reverse, width, reverse_power, power, reverse=True)
+            width += power
+        remaining >>= 1
+        if remaining:
+            forward_power = _combine(forward_power, power, forward_power, power, reverse=False)
+            reverse_power = _combine(reverse_power, power, reverse_power, power, reverse=True)
+            power *= 2
+
+    # Ventanas sin bases inválidas
+    bad = np.concatenate(([0], np.cumsum(invalid)))
+    valid = bad[k:] == bad[:-k]
+    return np.minimum(forward, reverse)[valid]
+
+
+def _sum_sorted(keys: np.ndarray, counts: np.ndarray):
+    """Ordena claves y suma los conteos de las claves repetidas."""
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    counts = counts[order]
+    if not keys.size:
+        return keys, counts
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+class KmerStream(ABC):
+    """
+    Base de los consumidores de k-meros: convierte segmentos de secuencia de
+    cada bloque en k-meros canónicos y los pasa a _add().
+    """
+
+    def __init__(self, k: int = DEFAULT_K):
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k debe estar entre 1 y {MAX_K}.")
+        self.k = k
+        self.total_kmers = 0
+        self._tail = np.zeros(0, dtype=np.uint8)
+
+    def add_segments(self, data: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                     continue_first: bool, open_last: bool) -> None:
+        """
+        Cuenta los k-meros de los segmentos de secuencia de un bloque.
+
+        Los espacios y saltos de línea dentro de un segmento se ignoran; entre
+        segmentos distintos no se forman k-meros, porque el byte en ends[i]
+        (inicio de cabecera o salto de línea, nunca una base) se conserva como
+        separador inválido.
+
+        Args:
+            data: Bloque de bytes como arreglo uint8
+            starts: Inicio de cada segmento de secuencia (ordenados)
+            ends: Fin (exclusivo) de cada segmento
+            continue_first: El primer segmento continúa la secuencia del bloque anterior
+            open_last: El último segmento continúa en el bloque siguiente
+        """
+        marks = np.bincount(starts, minlength=data.size + 1) - np.bincount(ends, minlength=data.size + 1)
+        keep = (np.cumsum(marks[:-1]) > 0) & (data > 0x20)
+        keep[ends[ends < data.size]] = True
+        codes = _CODE_LUT[data[keep]]
+        if continue_first and self._tail.size:
+            codes = np.concatenate((self._tail, codes))
+
+        # Últimas k-1 bases del segmento abierto, para los k-meros que cruzan
+        # bloques (si incluyen un separador, las ventanas que lo cruzan se descartan)
+        if open_last and self.k > 1:
+            self._tail = codes[-(self.k - 1):].copy()
+        else:
+            self._tail = np.zeros(0, dtype=np.uint8)
+        kmers = canonical_kmers(codes, self.k)
+        if kmers.size:
+            self.total_kmers += kmers.size
+            self._add(kmers)
+
+    @abstractmethod
+    def _add(self, kmers: np.ndarray) -> None:
+        """Recibe los k-meros canónicos (uint64) de un bloque."""
+
+
+class KmerCounter(KmerStream):
+    """
+    Contador de k-meros canónicos con presupuesto de memoria y volcado a disco.
+    """
+
+    def __init__(self, k: int = DEFAULT_K, memory_budget_bytes: int = 512 * 1024 * 1024):
+        super().__init__(k)
+        self.memory_budget_bytes = memory_budget_bytes
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._batch = []
+        self._batch_size = 0
+        self._spill_dir = None
+        self._spilled = []
+
+    def _add(self, kmers: np.ndarray) -> None:
+        self._batch.append(kmers)
+        self._batch_size += kmers.size
+        # El lote crece con la tabla: cada mezcla cuesta O(tabla + lote)
+        if self._batch_size >= max(_BATCH_SIZE, self._keys.size):
+            self._flush_batch()
+
+    def _flush_batch(self) -> None:
+        if not self._batch:
+            return
+        keys, counts = np.unique(np.concatenate(self._batch), return_counts=True)
+        self._batch = []
+        self._batch_size = 0
+        # Mezcla con la tabla ordenada: suma las claves existentes e inserta las nuevas
+        positions = np.searchsorted(self._keys, keys)
+        found = positions < self._keys.size
+        found[found] = self._keys[positions[found]] == keys[found]
+        self._counts[positions[found]] += counts[found]
+        new = ~found
+        n_new = int(new.sum())
+        if n_new:
+            size = self._keys.size + n_new
+            inserted = positions[new] + np.arange(n_new)
+            existing = np.ones(size, dtype=bool)
+            existing[inserted] = False
+            merged_keys = np.empty(size, dtype=np.uint64)
+            merged_counts = np.empty(size, dtype=np.int64)
+            merged_keys[existing] = self._keys
+            merged_counts[existing] = self._counts
+            merged_keys[inserted] = keys[new]
+            merged_counts[inserted] = counts[new]
+            self._keys, self._counts = merged_keys, merged_counts
+        if self._keys.size * _ENTRY_BYTES > self.memory_budget_bytes:
+            self._spill()
+
+    def _spill(self) -> None:
+        """Vuelca la tabla ordenada a disco y libera la memoria."""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="kmers-")
+        prefix = os.path.join(self._spill_dir, f"run{len(self._spilled)}")
+        np.save(prefix + "-keys.npy", self._keys)
+        np.save(prefix + "-counts.npy", self._counts)
+        self._spilled.append(prefix)
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int64)
+
+    def abundance_histogram(self) -> np.ndarray:
+        """
+        Número de k-meros distintos con cada abundancia.
+
+        Returns:
+            Arreglo h de tamaño MAX_ABUNDANCE + 1 donde h[m] es el número de
+            k-meros vistos m veces (h[MAX_ABUNDANCE] agrupa los >= MAX_ABUNDANCE)
+        """
+        self._flush_batch()
+        histogram = np.zeros(MAX_ABUNDANCE + 1, dtype=np.int64)
+        if not self._spilled:
+            histogram += np.bincount(np.minimum(self._counts, MAX_ABUNDANCE), minlength=MAX_ABUNDANCE + 1)
+            return histogram
+
+        try:
+            if self._keys.size:
+                self._spill()
+            runs = [
+                (np.load(prefix + "-keys.npy", mmap_mode='r'), np.load(prefix + "-counts.npy", mmap_mode='r'))
+                for prefix in self._spilled
+            ]
+            # Rangos de claves de tamaño similar a partir de una muestra de cada tabla
+            total_entries = sum(keys.size for keys, _ in runs)
+            n_ranges = max(1, -(-total_entries * _ENTRY_BYTES // self.memory_budget_bytes)) * 2
+            sample = np.sort(np.concatenate([np.asarray(keys[::max(1, keys.size // 1024)]) for keys, _ in runs]))
+            bounds = np.unique(sample[np.linspace(0, sample.size - 1, n_ranges + 1).astype(np.intp)[1:-1]])
+
+            lower = [0] * len(runs)
+            for bound in list(bounds) + [None]:
+                part_keys, part_counts = [], []
+                for i, (keys, counts) in enumerate(runs):
+                    upper = keys.size if bound is None else int(np.searchsorted(keys, bound))
+                    part_keys.append(np.asarray(keys[lower[i]:upper]))
+                    part_counts.append(np.asarray(counts[lower[i]:upper]))
+                    lower[i] = upper
+                _, merged = _sum_sorted(np.concatenate(part_keys), np.concatenate(part_counts))
+                histogram += np.bincount(np.minimum(merged, MAX_ABUNDANCE), minlength=MAX_ABUNDANCE + 1)
+            return histogram
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Elimina los archivos volcados a disco."""
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+            self._spilled = []
+
+
+class FastaKmerScanner(_FastaSegmenter):
+    """Extrae las secuencias de un FASTA por bloques y pasa sus k-meros a counter."""
+
+    def __init__(self, counter: KmerStream):
+        super().__init__()
+        self.counter = counter
+        self.sequence_count = 0
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        had_record = self._has_record
+        n_headers, seg_starts, seg_ends = self._split(data)
+        self.sequence_count += n_headers
+        if n_headers:
+            self._has_record = True
+        if not had_record and seg_starts.size:
+            # El segmento 0 es texto anterior a la primera cabecera
+            seg_starts, seg_ends = seg_starts[1:], seg_ends[1:]
+        if not seg_starts.size:
+            return
+        # Si la última cabecera no terminó, el último segmento ya está cerrado
+        self.counter.add_segments(
+            data, seg_starts, seg_ends, continue_first=had_record, open_last=not self._in_header
+        )
+
+    def finish(self) -> None:
+        self._has_record = False
+        self._in_header = False
+
+
+class FastqKmerScanner(FastqScanner):
+    """FastqScanner que además pasa los k-meros de cada lectura a counter."""
+
+    def __init__(self, counter: KmerStream, quality_offset: int = PHRED_OFFSET):
+        super().__init__(quality_offset)
+        self.counter = counter
+
+    def _process_block(self, data: np.ndarray, newlines: np.ndarray) -> None:
+        super()._process_block(data, newlines)
+        seq_starts = newlines[0::4] + 1
+        seq_ends = newlines[1::4].copy()
+        has_cr = (seq_ends > seq_starts) & (data[seq_ends - 1] == ord('\r'))
+        seq_ends[has_cr] -= 1
+        self.counter.add_segments(data, seq_starts, seq_ends, continue_first=False, open_last=False)
+
+
+def estimate_genome_size(histogram: np.ndarray) -> dict:
+    """
+    Estimación del tamaño del genoma a partir del histograma de abundancias.
+
+    Se descarta la caída inicial de k-meros de baja abundancia (errores de
+    secuenciación) hasta el primer mínimo y se toma el pico de cobertura
+    posterior; el tamaño es el número de k-meros sólidos dividido por la
+    cobertura del pico.
+
+    Returns:
+        Diccionario con peak_coverage y estimated_genome_size (None si el
+        histograma no tiene pico de cobertura, p. ej. en un ensamblaje)
+    """
+    counts = histogram[:MAX_ABUNDANCE]
+    valley = 1
+    while valley + 1 < counts.size and counts[valley + 1] < counts[valley]:
+        valley += 1
+    if valley + 1 >= counts.size or not counts[valley:].any():
+        return {"peak_coverage": None, "estimated_genome_size": None}
+    peak = valley + int(np.argmax(counts[valley:]))
+    if peak == valley:
+        return {"peak_coverage": None, "estimated_genome_size": None}
+    solid_kmers = int(np.dot(np.arange(valley, counts.size), counts[valley:]))
+    return {"peak_coverage": peak, "estimated_genome_size": int(round(solid_kmers / peak))}
+
+
+def kmer_spectrum(chunks, file_format: str, k: int = DEFAULT_K, memory_budget_bytes: int = 512 * 1024 * 1024,
+                  progress=None) -> dict:
+    """
+    Calcula el espectro de k-meros de un FASTA o FASTQ leído por bloques.
+
+    Args:
+        chunks: Iterable de bloques de bytes
+        file_format: 'fasta' o 'fastq'
+        k: Longitud de los k-meros (1..31)
+        memory_budget_bytes: Tamaño máximo de la tabla en memoria antes de volcarla
+        progress: ProgressReporter del flujo (opcional), para contar registros
+
+    Returns:
+        Diccionario con k, total_kmers, distinct_kmers, el histograma como
+        pares [abundancia, k-meros distintos] y la estimación del genoma
+    """
+    counter = KmerCounter(k, memory_budget_bytes)
+    scanner = FastaKmerScanner(counter) if file_format == 'fasta' else FastqKmerScanner(counter)
+    if progress is not None:
+        progress.count_records = lambda: scanner.sequence_count
+    try:
+        for chunk in chunks:
+            scanner.feed(chunk)
+        scanner.finish()
+        histogram = counter.abundance_histogram()
+    finally:
+        counter.close()
+
+    abundances = np.flatnonzero(histogram)
+    return {
+        "k": k,
+        "sequence_count": scanner.sequence_count,
+        "total_kmers": counter.total_kmers,
+        "distinct_kmers": int(histogram.sum()),
+        "histogram": np.column_stack((abundances, histogram[abundances])).tolist(),
+        **estimate_genome_size(histogram),
+    }
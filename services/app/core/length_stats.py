@@ -0,0 +1,115 @@
+"""
+Estadísticas de longitudes de secuencias (Nx/Lx e histogramas) con NumPy.
+
+Las funciones trabajan sobre una distribución ponderada (longitudes únicas y
+número de secuencias de cada longitud), de modo que sirven tanto para los
+contigs de un FASTA como para los conteos por longitud de un FASTQ.
+"""
+import numpy as np
+
+# Número de intervalos por defecto de los histogramas de longitudes
+DEFAULT_HISTOGRAM_BINS = 50
+
+
+def length_distribution(lengths: np.ndarray):
+    """
+    Agrupa un arreglo de longitudes en longitudes únicas y sus frecuencias.
+
+    Returns:
+        Tupla (longitudes, conteos) con las longitudes en orden creciente
+    """
+    return np.unique(lengths, return_counts=True)
+
+
+def counts_distribution(length_counts: np.ndarray):
+    """
+    Convierte un arreglo de conteos indexado por longitud en una distribución.
+
+    Returns:
+        Tupla (longitudes, conteos) sin las longitudes que no aparecen
+    """
+    values = np.flatnonzero(length_counts)
+    return values, length_counts[values]
+
+
+def nx_statistics(values: np.ndarray, counts: np.ndarray, fractions=(0.5,), genome_size: int = None) -> dict:
+    """
+    Calcula Nx y Lx a partir de una distribución de longitudes.
+
+    Nx es la longitud de la secuencia más corta del menor conjunto de
+    secuencias (las más largas primero) que suma al menos x% de las bases;
+    Lx es el número de secuencias de ese conjunto. Con genome_size se
+    calculan NGx/LGx, tomando como total el tamaño esperado del genoma.
+
+    Args:
+        values: Longitudes únicas en orden creciente
+        counts: Número de secuencias con cada longitud
+        fractions: Fracciones a calcular (0.5 -> N50/L50)
+        genome_size: Tamaño esperado del genoma para NGx/LGx
+
+    Returns:
+        Diccionario {"N50": ..., "L50": ...} (None si no se alcanza la fracción)
+    """
+    values = np.asarray(values, dtype=np.int64)[::-1]
+    counts = np.asarray(counts, dtype=np.int64)[::-1]
+    cum_bases = np.cumsum(values * counts)
+    cum_counts = np.cumsum(counts)
+    assembled = int(cum_bases[-1]) if cum_bases.size else 0
+    total = genome_size if genome_size else assembled
+    n_key, l_key = ("NG", "LG") if genome_size else ("N", "L")
+
+    stats = {}
+    for fraction in fractions:
+        percent = int(round(fraction * 100))
+        label = str(percent)
+        # Bases necesarias (entero, redondeado hacia arriba) para alcanzar el x%
+        target = -(-total * percent // 100)
+        if not total or target > assembled:
+            stats[n_key + label] = None
+            stats[l_key + label] = None
+            continue
+        i = int(np.searchsorted(cum_bases, target, side='left'))
+        bases_before = int(cum_bases[i - 1]) if i else 0
+        counts_before = int(cum_counts[i - 1]) if i else 0
+        stats[n_key + label] = int(values[i])
+        stats[l_key + label] = counts_before + int(-(-(target - bases_before) // values[i]))
+    return stats
+
+
+def length_histogram(values: np.ndarray, counts: np.ndarray, n_bins: int = DEFAULT_HISTOGRAM_BINS) -> dict:
+    """
+    Histograma de longitudes con intervalos enteros de igual anchura.
+
+    Args:
+        values: Longitudes únicas en orden creciente
+        counts: Número de secuencias con cada longitud
+        n_bins: Número máximo de intervalos
+
+    Returns:
+        Diccionario con bin_edges (n+1 bordes; el último es exclusivo) y counts
+    """
+    if not len(values):
+        return {"bin_edges": [], "counts": []}
+    edges = np.unique(np.linspace(values[0], values[-1] + 1, n_bins + 1).astype(np.int64))
+    histogram, _ = np.histogram(values, bins=edges, weights=counts)
+    return {"bin_edges": edges.tolist(), "counts": histogram.astype(np.int64).tolist()}
+
+
+def length_summary(values: np.ndarray, counts: np.ndarray, n_bins: int = DEFAULT_HISTOGRAM_BINS) -> dict:
+    """
+    Resumen de longitudes: totales, mínimo, máximo, media, N50/L50 e histograma.
+
+    Returns:
+        Diccionario listo para guardarse como resultados JSON
+    """
+    sequence_count = int(np.sum(counts))
+    total_length = int(np.dot(values, counts)) if sequence_count else 0
+    return {
+        "sequence_count": sequence_count,
+        "total_length": total_length,
+        "min_length": int(values[0]) if sequence_count else None,
+        "max_length": int(values[-1]) if sequence_count else None,
+        "mean_length": round(total_length / sequence_count, 2) if sequence_count else None,
+        **nx_statistics(values, counts),
+        "length_histogram": length_histogram(values, counts, n_bins),
+    }
@@ -0,0 +1,97 @@
+"""
+Sketches MinHash bottom-s (estilo Mash) de archivos FASTA.
+
+Cada k-mero canónico (ver kmers.py) se transforma con una función de mezcla
+de 64 bits y el sketch conserva los s valores hash distintos más pequeños.
+Comparar dos sketches estima el índice de Jaccard de sus conjuntos de
+k-meros, y de él la distancia de Mash y la identidad media de nucleótidos
+(ANI) aproximada.
+"""
+import math
+
+import numpy as np
+
+from .kmers import KmerStream, FastaKmerScanner, DEFAULT_K
+
+DEFAULT_SKETCH_SIZE = 1000
+
+
+def hash_kmers(kmers: np.ndarray) -> np.ndarray:
+    """
+    Mezcla de 64 bits (finalizador de splitmix64) de k-meros codificados.
+
+    Returns:
+        Arreglo uint64 con valores hash distribuidos uniformemente
+    """
+    z = kmers.astype(np.uint64, copy=True)
+    z ^= z >> np.uint64(30)
+    z *= np.uint64(0xBF58476D1CE4E5B9)
+    z ^= z >> np.uint64(27)
+    z *= np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return z
+
+
+class MinHashSketcher(KmerStream):
+    """
+    Conserva los sketch_size hashes distintos más pequeños de los k-meros.
+    """
+
+    def __init__(self, k: int = DEFAULT_K, sketch_size: int = DEFAULT_SKETCH_SIZE):
+        super().__init__(k)
+        self.sketch_size = sketch_size
+        self._hashes = np.zeros(0, dtype=np.uint64)
+
+    def _add(self, kmers: np.ndarray) -> None:
+        hashes = hash_kmers(kmers)
+        if self._hashes.size == self.sketch_size:
+            # Con el sketch lleno sólo interesan los hashes menores que el máximo actual
+            hashes = hashes[hashes < self._hashes[-1]]
+            if not hashes.size:
+                return
+        self._hashes = np.unique(np.concatenate((self._hashes, hashes)))[:self.sketch_size]
+
+    def hashes(self) -> np.ndarray:
+        """Hashes del sketch en orden creciente."""
+        return self._hashes
+
+
+def sketch_fasta(chunks, k: int = DEFAULT_K, sketch_size: int = DEFAULT_SKETCH_SIZE) -> MinHashSketcher:
+    """
+    Calcula el sketch MinHash de un FASTA leído por bloques.
+
+    Args:
+        chunks: Iterable de bloques de bytes
+        k: Longitud de los k-meros (1..31)
+        sketch_size: Número de hashes que conserva el sketch
+
+    Returns:
+        MinHashSketcher finalizado (hashes() y total_kmers)
+    """
+    sketcher = MinHashSketcher(k, sketch_size)
+    scanner = FastaKmerScanner(sketcher)
+    for chunk in chunks:
+        scanner.feed(chunk)
+    scanner.finish()
+    return sketcher
+
+
+def jaccard_estimate(a: np.ndarray, b: np.ndarray, sketch_size: int) -> float:
+    """
+    Estimación de Jaccard de Mash entre dos sketches ordenados: fracción de
+    los sketch_size hashes más pequeños de la unión presentes en ambos.
+    """
+    union = np.union1d(a, b)[:sketch_size]
+    if not union.size:
+        return 0.0
+    shared = np.intersect1d(np.intersect1d(a, b, assume_unique=True), union, assume_unique=True)
+    return shared.size / union.size
+
+
+def mash_distance(jaccard: float, k: int) -> float:
+    """
+    Distancia de Mash: D = -1/k * ln(2J / (1 + J)); 1.0 si no comparten hashes.
+    """
+    if jaccard <= 0:
+        return 1.0
+    return min(1.0, -math.log(2 * jaccard / (1 + jaccard)) / k)
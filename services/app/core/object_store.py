@@ -0,0 +1,68 @@
+"""
+Claves de MinIO direccionadas por contenido para los archivos subidos.
+
+Cada archivo se guarda una sola vez bajo objects/sha256/ab/abcdef..., con
+el SHA-256 de su contenido. El archivo se valida, se hashea y se sube en
+una sola lectura bajo una clave provisional (staging/{uuid}); con el hash ya
+calculado se copia en MinIO a su clave definitiva, o se descarta si ese
+contenido ya estaba guardado. El nombre original del archivo va en los
+resultados de cada Analysis, no en la clave.
+"""
+import uuid
+
+# Prefijo de las claves direccionadas por contenido
+CONTENT_PREFIX = "objects/sha256"
+# Prefijo de las claves antiguas (uploads/{uuid}-{nombre})
+LEGACY_UPLOAD_PREFIX = "uploads"
+# Prefijo de las claves provisionales de las subidas aún sin hash
+STAGING_PREFIX = "staging"
+# Prefijo de las columnas por registro de los resultados (results/{uuid}/...)
+RESULTS_PREFIX = "results"
+
+
+def content_object_key(content_hash: str) -> str:
+    """Clave del objeto con ese SHA-256 (hexadecimal)."""
+    return f"{CONTENT_PREFIX}/{content_hash[:2]}/{content_hash}"
+
+
+def staging_object_key() -> str:
+    """Clave provisional nueva para subir un archivo antes de conocer su hash."""
+    return f"{STAGING_PREFIX}/{uuid.uuid4()}"
+
+
+def results_prefix() -> str:
+    """Prefijo nuevo para las columnas por registro (core/sidecar.py) de un análisis."""
+    return f"{RESULTS_PREFIX}/{uuid.uuid4()}"
+
+
+def iter_objects(s3_client, bucket: str, prefix: str, page_size: int = 1000):
+    """
+    Recorre los objetos bajo un prefijo, página a página con ContinuationToken.
+
+    Yields:
+        Elementos de Contents de list_objects_v2 (Key, LastModified...)
+    """
+    kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': page_size}
+    while True:
+        response = s3_client.list_objects_v2(**kwargs)
+        yield from response.get('Contents', [])
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def parse_file_url(file_url: str):
+    """
+    Separa el bucket y la clave de un file_url
+    (http://minio:9000/genolab-bucket/objects/sha256/ab/abcdef...).
+
+    Returns:
+        Tupla (bucket, clave)
+
+    Raises:
+        ValueError: Si la URL no tiene bucket y clave
+    """
+    url_parts = file_url.split('/')
+    if len(url_parts) < 5:  # [protocolo, '', host, bucket, clave...]
+        raise ValueError(f"Formato de URL de archivo inválido: {file_url}")
+    return url_parts[3], '/'.join(url_parts[4:])
@@ -0,0 +1,266 @@
+"""
+Procesamiento paralelo de archivos FASTA/FASTQ grandes por rangos de bytes.
+
+El objeto se divide en rangos que se leen con GET de S3 con cabecera Range.
+Cada rango se realinea al siguiente inicio de registro y se procesa con el
+motor correspondiente en un proceso aparte; los resultados parciales se
+combinan en orden con el método merge() de cada motor.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+from .streams import iter_chunks, DEFAULT_CHUNK_SIZE
+from .fasta_engine import FastaCounter, FastaScanner
+from .fastq_engine import FastqScanner
+
+# Tamaño mínimo de cada rango: por debajo no compensa el coste del proceso
+MIN_RANGE_SIZE = 64 * 1024 * 1024
+
+
+def find_fasta_boundary(buffer: bytes, pos: int, eof: bool):
+    """
+    Busca el primer inicio de registro FASTA ('>' tras un salto de línea) en
+    buffer[pos:]. buffer[pos - 1] debe ser el byte anterior a pos.
+
+    Returns:
+        Tupla (encontrado, posición). Si no se encontró y faltan datos,
+        posición indica desde dónde conservar el búfer para seguir buscando.
+        Al final del archivo sin más registros devuelve (True, len(buffer)).
+    """
+    newline = buffer.find(b'\n>', max(pos - 1, 0))
+    if newline >= 0:
+        return True, newline + 1
+    if eof:
+        return True, len(buffer)
+    return False, max(len(buffer) - 1, 0)
+
+
+def find_fastq_boundary(buffer: bytes, pos: int, eof: bool):
+    """
+    Busca el primer inicio de registro FASTQ en buffer[pos:].
+
+    Una línea que empieza por '@' puede ser también una línea de calidad, así
+    que la candidata sólo se acepta si la tercera línea empieza por '+' y la
+    secuencia y la calidad tienen la misma longitud.
+
+    Returns:
+        Tupla (encontrado, posición) con la misma semántica que
+        find_fasta_boundary.
+    """
+    search = max(pos - 1, 0)
+    while True:
+        newline = buffer.find(b'\n@', search)
+        if newline < 0:
+            if eof:
+                return True, len(buffer)
+            return False, max(len(buffer) - 1, 0)
+        candidate = newline + 1
+
+        line_ends = []
+        line_start = candidate
+        for _ in range(4):
+            line_end = buffer.find(b'\n', line_start)
+            if line_end < 0:
+                break
+            line_ends.append(line_end)
+            line_start = line_end + 1
+        if len(line_ends) < 4:
+            if not eof:
+                return False, newline
+            if len(line_ends) < 3:
+                return True, len(buffer)
+            line_ends.append(len(buffer))  # último registro sin '\n' final
+
+        sequence = buffer[line_ends[0] + 1:line_ends[1]].rstrip(b'\r')
+        separator = buffer[line_ends[1] + 1:line_ends[1] + 2]
+        quality = buffer[line_ends[2] + 1:line_ends[3]].rstrip(b'\r')
+        if separator == b'+' and len(sequence) == len(quality):
+            return True, candidate
+        search = candidate
+
+
+# Motores disponibles: clase del analizador y buscador de límites de registro
+ENGINES = {
+    "fasta_count": (FastaCounter, find_fasta_boundary),
+    "fasta_gc_content": (FastaScanner, find_fasta_boundary),
+    "fastq_stats": (FastqScanner, find_fastq_boundary),
+    "fastq_quality_profile": (partial(FastqScanner, positional=True), find_fastq_boundary),
+}
+
+
+def iter_range_chunks(chunks, body_offset: int, start: int, end: int, find_boundary):
+    """
+    Recorta un flujo de bloques a los registros que empiezan en [start, end).
+
+    Args:
+        chunks: Bloques de bytes leídos desde body_offset
+        body_offset: Posición absoluta del primer byte de chunks (start - 1
+            si start > 0, para disponer del byte anterior)
+        start: Inicio del rango asignado
+        end: Fin del rango asignado
+        find_boundary: Buscador de inicios de registro del formato
+
+    Yields:
+        Bloques de bytes desde el primer registro con inicio >= start hasta
+        el primer registro con inicio >= end (excluido)
+    """
+    chunks = iter(chunks)
+    buffer = b''
+    offset = body_offset
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        chunk = next(chunks, b'')
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+
+    # 1. Alinear el inicio al primer registro que empieza en start o después
+    if start > 0:
+        while True:
+            found, position = find_boundary(buffer, start - offset, eof)
+            if found:
+                break
+            buffer = buffer[position:]
+            offset += position
+            read_more()
+        if offset + position >= end:
+            return  # ningún registro empieza dentro del rango
+        buffer = buffer[position:]
+        offset += position
+
+    # 2. Emitir hasta el primer registro que empieza en end o después
+    while True:
+        rel_end = end - offset
+        if len(buffer) >= rel_end:
+            found, position = find_boundary(buffer, rel_end, eof)
+            if found:
+                if position:
+                    yield buffer[:position]
+                return
+            # Lo anterior a la candidata pertenece al último registro del rango
+            emit = position
+        elif eof:
+            if buffer:
+                yield buffer
+            return
+        else:
+            # Todavía no se llegó a end: todo el búfer pertenece al rango
+            emit = len(buffer)
+        if emit > 0:
+            yield buffer[:emit]
+            buffer = buffer[emit:]
+            offset += emit
+        read_more()
+
+
+def plan_ranges(size: int, workers: int, min_range_size: int = MIN_RANGE_SIZE):
+    """
+    Divide [0, size) en rangos contiguos de tamaño similar.
+
+    Returns:
+        Lista de tuplas (inicio, fin)
+    """
+    n_ranges = max(1, min(workers, size // min_range_size))
+    step = -(-size // n_ranges)
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def scan_stream(kind: str, chunks, progress=None):
+    """
+    Ejecuta el motor `kind` sobre un flujo secuencial de bloques.
+
+    Con progress (el ProgressReporter del flujo) el progreso publicado
+    incluye los registros procesados por el motor.
+    """
+    engine_class, _ = ENGINES[kind]
+    engine = engine_class()
+    if progress is not None:
+        progress.count_records = lambda: engine.sequence_count
+    for chunk in chunks:
+        engine.feed(chunk)
+    engine.finish()
+    return engine
+
+
+def scan_range(kind: str, bucket: str, object_key: str, start: int, end: int, client_factory):
+    """
+    Procesa los registros que empiezan en [start, end) de un objeto de S3.
+
+    Se ejecuta en un proceso hijo: crea su propio cliente con client_factory
+    (los clientes de boto3 no se deben compartir entre procesos).
+    """
+    engine_class, find_boundary = ENGINES[kind]
+    s3_client = client_factory()
+    body_offset = max(start - 1, 0)
+    response = s3_client.get_object(Bucket=bucket, Key=object_key, Range=f"bytes={body_offset}-")
+    body = response['Body']
+    try:
+        engine = engine_class()
+        for chunk in iter_range_chunks(iter_chunks(body, DEFAULT_CHUNK_SIZE), body_offset, start, end, find_boundary):
+            engine.feed(chunk)
+        engine.finish()
+    finally:
+        # Se deja de leer al llegar al final del rango
+        body.close()
+    return engine
+
+
+def can_spawn_processes() -> bool:
+    """
+    Indica si el proceso actual puede crear procesos hijos. Los procesos
+    daemon (p. ej. algunos pools de Celery) no pueden; en ellos los rangos
+    con hilos apenas acelerarían (los motores están limitados por el GIL), así
+    que se usa la lectura secuencial.
+    """
+    return not multiprocessing.current_process().daemon
+
+
+def parallel_scan(kind: str, bucket: str, object_key: str, size: int, client_factory, workers: int = 0,
+                  progress=None):
+    """
+    Procesa un objeto grande dividiéndolo en rangos de bytes en paralelo.
+    Sólo se debe llamar si can_spawn_processes() es cierto.
+
+    Args:
+        kind: Clave de ENGINES ('fasta_count', 'fasta_gc_content', 'fastq_stats')
+        bucket: Bucket de MinIO/S3
+        object_key: Clave del objeto
+        size: Tamaño del objeto en bytes
+        client_factory: Función importable que devuelve un cliente S3
+        workers: Número de procesos (0 = número de CPUs)
+        progress: ProgressReporter al que sumar los bytes de cada rango terminado
+
+    Returns:
+        Motor con los resultados combinados de todos los rangos
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = plan_ranges(size, workers)
+    args = [(kind, bucket, object_key, start, end, client_factory) for start, end in ranges]
+
+    def run(executor):
+        futures = {executor.submit(scan_range, *arg): i for i, arg in enumerate(args)}
+        partials = [None] * len(args)
+        records = 0
+        if progress is not None:
+            progress.count_records = lambda: records
+        for future in as_completed(futures):
+            i = futures[future]
+            partials[i] = future.result()
+            if progress is not None:
+                records += partials[i].sequence_count
+                start, end = ranges[i]
+                progress.add_bytes(end - start)
+        return partials
+
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        partials = run(executor)
+
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result
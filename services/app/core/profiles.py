@@ -0,0 +1,89 @@
+"""
+Perfiles de un archivo FASTA/FASTQ: todos los conjuntos de métricas de una
+sola pasada por el archivo.
+
+Cada conjunto de métricas se guarda como un Analysis propio, con el mismo
+tipo y formato de resultados que la tarea individual equivalente.
+"""
+from .fasta_engine import FastaScanner, gc_content_results
+from .fastq_engine import FastqScanner, fastq_stats_results
+from .length_stats import length_distribution, counts_distribution, length_summary
+from .assembly_stats import assembly_stats
+
+# Conjunto de métricas -> tipo de análisis con el que se guarda
+FASTA_PROFILE_METRICS = {
+    "count": "fasta_count",
+    "gc_content": "fasta_gc_content",
+    "lengths": "fasta_length_stats",
+    "assembly": "assembly_stats",
+}
+
+FASTQ_PROFILE_METRICS = {
+    "stats": "fastq_stats",
+    "lengths": "fastq_length_stats",
+    "quality_profile": "fastq_quality_profile",
+}
+
+
+def parse_metrics(metrics: str, available: dict) -> list:
+    """
+    Convierte una lista separada por comas en conjuntos de métricas válidos.
+
+    Args:
+        metrics: Texto como "count,gc_content" (vacío = todos)
+        available: FASTA_PROFILE_METRICS o FASTQ_PROFILE_METRICS
+
+    Raises:
+        ValueError: Si algún conjunto de métricas no existe
+    """
+    requested = [m.strip() for m in metrics.split(',') if m.strip()] if metrics else []
+    if not requested:
+        return list(available)
+    unknown = [m for m in requested if m not in available]
+    if unknown:
+        raise ValueError(
+            f"Métricas no válidas: {', '.join(unknown)}. Métricas disponibles: {', '.join(available)}"
+        )
+    return list(dict.fromkeys(requested))
+
+
+def fasta_profile_results(scanner: FastaScanner, metrics: list) -> dict:
+    """
+    Resultados de cada conjunto de métricas FASTA a partir de un único análisis.
+
+    Returns:
+        Diccionario {conjunto de métricas: resultados}
+    """
+    results = {}
+    if "count" in metrics:
+        results["count"] = {
+            "sequence_count": scanner.sequence_count,
+            "total_bytes": scanner.bytes_read,
+            "total_residues": int(scanner.lengths.view().sum()),
+        }
+    if "gc_content" in metrics:
+        results["gc_content"] = gc_content_results(scanner)
+    if "lengths" in metrics:
+        results["lengths"] = length_summary(*length_distribution(scanner.lengths.view()))
+    if "assembly" in metrics:
+        results["assembly"] = assembly_stats(scanner)
+    return results
+
+
+def fastq_profile_results(scanner: FastqScanner, metrics: list) -> dict:
+    """
+    Resultados de cada conjunto de métricas FASTQ a partir de un único análisis.
+
+    Returns:
+        Diccionario {conjunto de métricas: resultados}
+    """
+    results = {}
+    if "stats" in metrics:
+        results["stats"] = fastq_stats_results(scanner)
+    if "lengths" in metrics:
+        results["lengths"] = length_summary(*counts_distribution(scanner.length_counts))
+    if "quality_profile" in metrics:
+        if scanner.position_profile is None:
+            raise ValueError("El perfil por posición requiere analizar el FASTQ con positional=True.")
+        results["quality_profile"] = scanner.position_profile.results()
+    return results
@@ -0,0 +1,100 @@
+"""
+Progreso de las tareas medido en bytes leídos del objeto.
+
+ProgressStream envuelve el cuerpo de un objeto de MinIO/S3 y suma los bytes
+que entrega; ProgressReporter compara ese total con ContentLength y publica
+el estado (porcentaje, registros por segundo y tiempo restante estimado) como
+mucho una vez por intervalo. En el bucle de lectura sólo se suma un entero y
+se consulta el reloj una vez por bloque.
+"""
+import logging
+import time
+
+
+class ProgressReporter:
+    """
+    Acumula bytes procesados y publica el progreso limitado por tiempo.
+    """
+
+    def __init__(self, publish, total_bytes: int = None, interval: float = 2.0, clock=time.monotonic):
+        """
+        Args:
+            publish: Función que recibe el diccionario de progreso (p. ej.
+                publica un estado PROGRESS de Celery)
+            total_bytes: Bytes totales del objeto (ContentLength); None si se
+                desconoce
+            interval: Segundos mínimos entre dos publicaciones
+            clock: Reloj monótono (sustituible en pruebas)
+        """
+        self.publish = publish
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.bytes_done = 0
+        # Función que devuelve los registros procesados (la asigna el motor)
+        self.count_records = None
+        self._clock = clock
+        self._start = clock()
+        self._next = self._start  # la primera lectura publica de inmediato
+
+    def add_bytes(self, size: int) -> None:
+        """Suma bytes leídos y publica si ha pasado el intervalo."""
+        self.bytes_done += size
+        if self._clock() >= self._next:
+            self.report()
+
+    def state(self) -> dict:
+        """
+        Estado actual del progreso.
+
+        Returns:
+            Diccionario con status, progress (0-100), bytes_processed,
+            total_bytes, elapsed_seconds, bytes_per_second,
+            records_processed, records_per_second y eta_seconds
+        """
+        elapsed = self._clock() - self._start
+        bytes_per_second = self.bytes_done / elapsed if elapsed > 0 else None
+        records = self.count_records() if self.count_records is not None else None
+
+        progress = None
+        eta = None
+        if self.total_bytes:
+            progress = round(min(self.bytes_done / self.total_bytes, 1.0) * 100, 1)
+            if bytes_per_second:
+                eta = round(max(self.total_bytes - self.bytes_done, 0) / bytes_per_second, 1)
+        return {
+            "status": "Procesando...",
+            "progress": progress,
+            "bytes_processed": self.bytes_done,
+            "total_bytes": self.total_bytes,
+            "elapsed_seconds": round(elapsed, 1),
+            "bytes_per_second": round(bytes_per_second) if bytes_per_second else None,
+            "records_processed": records,
+            "records_per_second": round(records / elapsed, 1) if records is not None and elapsed > 0 else None,
+            "eta_seconds": eta,
+        }
+
+    def report(self) -> None:
+        """Publica el estado actual (un fallo al publicar no detiene el análisis)."""
+        self._next = self._clock() + self.interval
+        try:
+            self.publish(self.state())
+        except Exception as e:
+            logging.warning(f"No se pudo publicar el progreso de la tarea: {e}")
+
+
+class ProgressStream:
+    """
+    Flujo con read(n) que cuenta los bytes que entrega en un ProgressReporter.
+    """
+
+    def __init__(self, body, reporter: ProgressReporter):
+        self._body = body
+        self.reporter = reporter
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._body.read(size)
+        self.reporter.add_bytes(len(data))
+        return data
+
+    def close(self) -> None:
+        self._body.close()
@@ -0,0 +1,173 @@
+"""
+Perfil de calidad por posición de lectura (estilo FastQC) para FASTQ.
+
+Las calidades de cada bloque de lecturas se acumulan en una matriz de conteos
+(posición, calidad) de forma (filas, 94) con np.bincount sobre índices
+planos, sin bucles de Python por lectura. La composición de bases por
+posición se acumula igual en una matriz (filas, 5).
+
+Cada fila cubre bin_width posiciones: 1 mientras las lecturas no superan
+MAX_TRACKED_POSITIONS bases y, con lecturas más largas, la siguiente
+potencia de dos que deja la matriz en MAX_TRACKED_POSITIONS filas (las filas
+ya acumuladas se suman por parejas). Así np.bincount nunca cuenta más de
+MAX_TRACKED_POSITIONS * 94 casillas por bloque, aunque haya lecturas de
+cientos de kb.
+"""
+import numpy as np
+
+# Calidades Phred representables en ASCII imprimible: 0..93
+N_QUALITIES = 94
+
+BASES = "ACGTN"
+# Byte de secuencia -> índice de base (A, C, G, T; cualquier otro cuenta como N)
+_BASE_LUT = np.full(256, 4, dtype=np.intp)
+for _index, _base in enumerate(b"ACGT"):
+    _BASE_LUT[_base] = _index
+    _BASE_LUT[_base | 0x20] = _index
+
+# Número máximo de filas del resultado: las lecturas largas se agrupan en
+# intervalos de posiciones para que el JSON no crezca con la longitud
+MAX_PROFILE_BINS = 200
+
+# Filas máximas de las matrices de conteos (posiciones o intervalos de posiciones)
+MAX_TRACKED_POSITIONS = 2048
+
+_PERCENTILES = (("q10", 0.10), ("q25", 0.25), ("median", 0.50), ("q75", 0.75), ("q90", 0.90))
+
+
+def _coarsen(matrix: np.ndarray, factor: int) -> np.ndarray:
+    """Suma cada grupo de factor filas consecutivas."""
+    if factor == 1 or not matrix.shape[0]:
+        return matrix
+    return np.add.reduceat(matrix, np.arange(0, matrix.shape[0], factor), axis=0)
+
+
+def _grow_rows(matrix: np.ndarray, rows: int) -> np.ndarray:
+    if rows <= matrix.shape[0]:
+        return matrix
+    grown = np.zeros((rows, matrix.shape[1]), dtype=matrix.dtype)
+    grown[:matrix.shape[0]] = matrix
+    return grown
+
+
+class PositionProfile:
+    """
+    Acumulador de calidades y composición de bases por posición de lectura.
+    """
+
+    def __init__(self, quality_offset: int, max_rows: int = MAX_TRACKED_POSITIONS):
+        self.quality_offset = quality_offset
+        self.max_rows = max_rows
+        # Posiciones por fila (potencia de dos) y lectura más larga vista
+        self.bin_width = 1
+        self.max_len = 0
+        self.quality_counts = np.zeros((0, N_QUALITIES), dtype=np.int64)
+        self.base_counts = np.zeros((0, len(BASES)), dtype=np.int64)
+
+    def _widen(self, bin_width: int) -> None:
+        """Pasa a bin_width posiciones por fila sumando las filas ya acumuladas."""
+        if bin_width <= self.bin_width:
+            return
+        factor = bin_width // self.bin_width
+        self.quality_counts = _coarsen(self.quality_counts, factor)
+        self.base_counts = _coarsen(self.base_counts, factor)
+        self.bin_width = bin_width
+
+    def _fit(self, max_len: int) -> None:
+        """Ajusta la anchura de fila y el número de filas a una lectura de max_len bases."""
+        self.max_len = max(self.max_len, max_len)
+        bin_width = self.bin_width
+        while -(-self.max_len // bin_width) > self.max_rows:
+            bin_width *= 2
+        self._widen(bin_width)
+        rows = -(-self.max_len // self.bin_width)
+        self.quality_counts = _grow_rows(self.quality_counts, rows)
+        self.base_counts = _grow_rows(self.base_counts, rows)
+
+    def add_reads(self, data: np.ndarray, seq_starts: np.ndarray, qual_starts: np.ndarray, lengths: np.ndarray) -> None:
+        """
+        Acumula un lote de lecturas completas de un bloque.
+
+        Args:
+            data: Bloque de bytes como arreglo uint8
+            seq_starts: Inicio de la secuencia de cada lectura en data
+            qual_starts: Inicio de la calidad de cada lectura en data
+            lengths: Longitud de cada lectura
+        """
+        total = int(lengths.sum())
+        if not total:
+            return
+        max_len = int(lengths.max())
+        self._fit(max_len)
+        rows = -(-max_len // self.bin_width)
+
+        # Posición de cada byte dentro de su lectura: 0..len-1 para cada lectura
+        read_offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(total, dtype=np.intp) - np.repeat(read_offsets, lengths)
+        # Fila de cada posición (bin_width es potencia de dos)
+        bins = positions >> (self.bin_width.bit_length() - 1)
+
+        qualities = data[np.repeat(qual_starts, lengths) + positions].astype(np.intp) - self.quality_offset
+        np.clip(qualities, 0, N_QUALITIES - 1, out=qualities)
+        flat = bins * N_QUALITIES + qualities
+        self.quality_counts[:rows] += np.bincount(flat, minlength=rows * N_QUALITIES).reshape(rows, N_QUALITIES)
+
+        bases = _BASE_LUT[data[np.repeat(seq_starts, lengths) + positions]]
+        flat = bins * len(BASES) + bases
+        self.base_counts[:rows] += np.bincount(flat, minlength=rows * len(BASES)).reshape(rows, len(BASES))
+
+    def merge(self, other: "PositionProfile") -> None:
+        """Suma los conteos de otro perfil (p. ej. de otro rango del archivo)."""
+        self._widen(other.bin_width)
+        self._fit(other.max_len)
+        factor = self.bin_width // other.bin_width
+        quality_counts = _coarsen(other.quality_counts, factor)
+        base_counts = _coarsen(other.base_counts, factor)
+        self.quality_counts[:quality_counts.shape[0]] += quality_counts
+        self.base_counts[:base_counts.shape[0]] += base_counts
+
+    def results(self, max_bins: int = MAX_PROFILE_BINS) -> dict:
+        """
+        Estadísticas por posición en formato columnar.
+
+        Las posiciones se agrupan en intervalos de igual anchura cuando la
+        lectura más larga supera max_bins posiciones; la anchura es un
+        múltiplo de la de las filas acumuladas (bin_width).
+
+        Returns:
+            Diccionario con listas paralelas: position_start, position_end
+            (base 1, inclusivos), base_count (bases observadas en el
+            intervalo), mean, q10, q25, median, q75, q90 y base_composition
+            (porcentaje de cada base por intervalo)
+        """
+        max_len = self.max_len
+        if not max_len:
+            return {"max_read_length": 0, "bin_width": 1, "position_start": [], "position_end": []}
+        rows = self.quality_counts.shape[0]
+        rows_per_bin = -(-rows // max_bins)
+        width = rows_per_bin * self.bin_width
+        quality_counts = _coarsen(self.quality_counts, rows_per_bin)
+        base_counts = _coarsen(self.base_counts, rows_per_bin)
+        starts = np.arange(quality_counts.shape[0]) * width
+
+        totals = quality_counts.sum(axis=1)
+        safe_totals = np.maximum(totals, 1)
+        cumulative = np.cumsum(quality_counts, axis=1)
+        means = (quality_counts @ np.arange(N_QUALITIES)) / safe_totals
+
+        profile = {
+            "max_read_length": max_len,
+            "bin_width": int(width),
+            "position_start": (starts + 1).tolist(),
+            "position_end": np.minimum(starts + width, max_len).tolist(),
+            "base_count": totals.tolist(),
+            "mean": np.round(means, 2).tolist(),
+        }
+        for name, fraction in _PERCENTILES:
+            # Primera calidad cuyo conteo acumulado alcanza la fracción pedida
+            profile[name] = (cumulative < (fraction * totals)[:, None]).sum(axis=1).tolist()
+        base_totals = np.maximum(base_counts.sum(axis=1), 1)
+        profile["base_composition"] = {
+            base: np.round(base_counts[:, i] / base_totals * 100, 2).tolist() for i, base in enumerate(BASES)
+        }
+        return profile
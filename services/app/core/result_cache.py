@@ -0,0 +1,54 @@
+"""
+Caché de resultados de análisis por contenido del archivo.
+
+Una entrada se identifica por el SHA-256 del archivo subido, el tipo de
+análisis, la versión del motor y los parámetros del análisis. Al cambiar la
+salida de un motor se incrementa su versión en ENGINE_VERSIONS, lo que
+invalida las entradas anteriores sin borrarlas.
+"""
+import json
+from typing import Optional
+
+# Versión de la salida de cada análisis cacheable
+ENGINE_VERSIONS = {
+    "fasta_count": "1",
+    "fasta_gc_content": "1",
+    "fastq_stats": "1",
+    "genbank_stats": "2",
+    "gff_stats": "1",
+    "assembly_stats": "1",
+    "kmer_spectrum": "1",
+}
+
+# Parámetros que forman la clave de la caché de cada análisis, con su valor por
+# defecto (los mismos con los que las tareas guardan sus resultados)
+CACHE_KEY_PARAMETERS = {
+    "gff_stats": {"deep_validation": False},
+    "assembly_stats": {"genome_size": None},
+    "kmer_spectrum": {"file_format": None, "k": 21},
+}
+
+# Claves de los resultados que dependen de la subida y no del contenido
+_UPLOAD_KEYS = ("filename",)
+
+
+def cache_parameters(**parameters) -> str:
+    """Parámetros del análisis como JSON canónico (claves ordenadas)."""
+    return json.dumps(parameters, sort_keys=True, separators=(",", ":"))
+
+
+def cacheable_results(results: dict) -> dict:
+    """Resultados sin las claves propias de cada subida (p. ej. filename)."""
+    return {key: value for key, value in results.items() if key not in _UPLOAD_KEYS}
+
+
+def result_cache_key(analysis_type: str, parameters: dict) -> Optional[str]:
+    """
+    Parámetros de la clave de la caché de un análisis pedido con parameters
+    (ver CACHE_KEY_PARAMETERS); None si sus resultados no se guardan en la
+    caché (análisis aproximados).
+    """
+    if parameters.get("approximate"):
+        return None
+    defaults = CACHE_KEY_PARAMETERS.get(analysis_type, {})
+    return cache_parameters(**{name: parameters.get(name, value) for name, value in defaults.items()})
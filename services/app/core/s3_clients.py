@@ -0,0 +1,94 @@
+"""
+Clientes S3 compartidos por todo el proceso (API y workers de Celery).
+
+Crear un cliente de boto3 cuesta milisegundos y cada uno tiene su propio
+pool de conexiones, así que crear uno por petición o por tarea impide
+reutilizar las conexiones keep-alive con MinIO. Los clientes de boto3 son
+seguros entre hilos: se crea uno por proceso en el primer uso (bajo un
+cerrojo) y se reutiliza. Tras un fork (workers prefork de Celery, procesos
+de parallel_scan) el hijo descarta los clientes heredados, cuyos sockets
+comparte con el padre, y crea los suyos.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from .config import settings
+
+_lock = threading.Lock()
+_clients = {}
+_pid = os.getpid()
+
+
+def _reset_after_fork() -> None:
+    """Olvida los clientes heredados del proceso padre."""
+    global _lock, _pid
+    _lock = threading.Lock()
+    _clients.clear()
+    _pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def client_config(**overrides) -> Config:
+    """
+    Configuración de botocore (pool, reintentos y timeouts) tomada de Settings.
+
+    El pool admite al menos UPLOAD_MAX_CONCURRENCY conexiones para que las
+    partes de una subida multiparte no esperen por una conexión libre.
+    """
+    return Config(
+        max_pool_connections=max(settings.S3_MAX_POOL_CONNECTIONS, settings.UPLOAD_MAX_CONCURRENCY),
+        retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": settings.S3_RETRY_MODE},
+        connect_timeout=settings.S3_CONNECT_TIMEOUT_S,
+        read_timeout=settings.S3_READ_TIMEOUT_S,
+        tcp_keepalive=True,
+        **overrides
+    )
+
+
+def _build_client(name: str):
+    if name == "presign":
+        # Las URLs firmadas las usa el navegador: la firma incluye el host público
+        endpoint_url = settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT
+        config = client_config(signature_version='s3v4')
+    else:
+        endpoint_url = settings.MINIO_ENDPOINT
+        config = client_config()
+    # Una sesión propia: la sesión por defecto de boto3 no es segura entre hilos
+    session = boto3.session.Session()
+    return session.client(
+        's3',
+        endpoint_url=endpoint_url,
+        aws_access_key_id=settings.MINIO_ACCESS_KEY,
+        aws_secret_access_key=settings.MINIO_SECRET_KEY,
+        region_name='us-east-1',  # Puede ser cualquier región, MinIO no la usa
+        config=config
+    )
+
+
+def _shared_client(name: str):
+    if os.getpid() != _pid:
+        # Respaldo para plataformas sin register_at_fork
+        _reset_after_fork()
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = _build_client(name)
+    return client
+
+
+def shared_s3_client():
+    """Cliente S3 del proceso, creado en el primer uso."""
+    return _shared_client("default")
+
+
+def shared_presign_client():
+    """Cliente S3 del proceso para firmar URLs con el endpoint público de MinIO."""
+    return _shared_client("presign")
@@ -0,0 +1,246 @@
+"""
+Estimaciones aproximadas de FASTA/FASTQ muy grandes a partir de una muestra.
+
+Los objetos sin comprimir se muestrean por rangos de bytes estratificados:
+el archivo se divide en estratos de igual tamaño y de cada uno se lee un
+rango en una posición aleatoria, realineado a inicios de registro (un
+registro entra en la muestra si empieza dentro del rango, así que la
+inclusión no depende de su longitud). Los objetos comprimidos no admiten
+lecturas por rango y se muestrea un prefijo del flujo descomprimido.
+
+Cada rango (o tramo del prefijo) es un conglomerado: las medias se estiman
+con estimadores de razón y su intervalo de confianza con la varianza entre
+conglomerados.
+"""
+import math
+import random
+
+from .streams import iter_chunks, DEFAULT_CHUNK_SIZE
+from .parallel import ENGINES, iter_range_chunks
+
+# z de un intervalo de confianza del 95 %
+Z_95 = 1.96
+# Un rango FASTA deja de leerse tras este múltiplo de su tamaño; el registro
+# abierto se cierra truncado (los genomas tienen registros de cientos de MB)
+FASTA_RANGE_READ_FACTOR = 4
+
+
+def _fastq_totals(scanner) -> dict:
+    return {
+        "bytes": scanner.bytes_read,
+        "sequences": scanner.sequence_count,
+        "length": scanner.total_length,
+        "quality_reads": scanner.quality_reads,
+        "quality_sum": scanner.overall_avg_quality * scanner.quality_reads,
+    }
+
+
+def _fasta_gc_totals(scanner) -> dict:
+    return {
+        "bytes": scanner.bytes_read,
+        "sequences": scanner.sequence_count,
+        "gc_sum": float(scanner.gc_percentages().sum()),
+    }
+
+
+# Motor -> (totales acumulados del motor, medias a estimar como
+# (nombre, numerador, denominador), los registros se pueden truncar)
+SAMPLED_ENGINES = {
+    "fastq_stats": (
+        _fastq_totals,
+        (("avg_sequence_length", "length", "sequences"), ("overall_avg_quality", "quality_sum", "quality_reads")),
+        False,
+    ),
+    "fasta_gc_content": (
+        _fasta_gc_totals,
+        (("average_gc_content", "gc_sum", "sequences"),),
+        True,
+    ),
+}
+
+
+def _ratio_estimate(numerators: list, denominators: list, sampling_fraction: float):
+    """
+    Estimador de razón sum(y)/sum(x) con su intervalo de confianza del 95 %.
+
+    Returns:
+        Tupla (valor, [límite inferior, límite superior]); el intervalo es
+        None con menos de dos conglomerados
+    """
+    total_x = sum(denominators)
+    if not total_x:
+        return None, None
+    ratio = sum(numerators) / total_x
+    m = len(denominators)
+    if m < 2:
+        return ratio, None
+    mean_x = total_x / m
+    residuals = math.fsum((y - ratio * x) ** 2 for y, x in zip(numerators, denominators))
+    variance = (1 - min(sampling_fraction, 1.0)) * residuals / (m - 1) / (m * mean_x ** 2)
+    margin = Z_95 * math.sqrt(variance)
+    return ratio, [ratio - margin, ratio + margin]
+
+
+class SampleEstimate:
+    """
+    Acumula los totales de cada conglomerado muestreado y calcula estimaciones.
+    """
+
+    def __init__(self, kind: str, population_bytes: int = None):
+        """
+        Args:
+            kind: Clave de SAMPLED_ENGINES
+            population_bytes: Tamaño del archivo (None si se desconoce, p. ej.
+                en un prefijo de un objeto comprimido)
+        """
+        self.kind = kind
+        self.population_bytes = population_bytes
+        self.clusters = []
+
+    def add(self, totals: dict) -> None:
+        self.clusters.append(totals)
+
+    def _column(self, key: str) -> list:
+        return [cluster[key] for cluster in self.clusters]
+
+    def results(self, digits: int = 2) -> dict:
+        """
+        Estimaciones actuales con intervalos de confianza del 95 %.
+
+        Returns:
+            Diccionario con sampled_bytes, sample_fraction, clusters y
+            estimates {nombre: {"value": ..., "ci95": [inf, sup]}}
+        """
+        _, ratios, _ = SAMPLED_ENGINES[self.kind]
+        sampled_bytes = sum(self._column("bytes"))
+        fraction = sampled_bytes / self.population_bytes if self.population_bytes else 0.0
+
+        def rounded(value, interval):
+            return {
+                "value": round(value, digits) if value is not None else None,
+                "ci95": [round(limit, digits) for limit in interval] if interval else None,
+            }
+
+        estimates = {}
+        for name, numerator, denominator in ratios:
+            estimates[name] = rounded(*_ratio_estimate(self._column(numerator), self._column(denominator), fraction))
+        if self.population_bytes:
+            # Registros por byte de la muestra, extrapolado al tamaño del archivo
+            ratio, interval = _ratio_estimate(self._column("sequences"), self._column("bytes"), fraction)
+            if ratio is not None:
+                estimates["sequence_count"] = rounded(
+                    ratio * self.population_bytes,
+                    [max(0.0, limit * self.population_bytes) for limit in interval] if interval else None,
+                )
+        return {
+            "sampled_bytes": sampled_bytes,
+            "sample_fraction": round(min(fraction, 1.0), 6),
+            "clusters": len(self.clusters),
+            "estimates": estimates,
+        }
+
+
+def plan_sample_ranges(size: int, n_ranges: int, range_size: int, rng: random.Random = None) -> list:
+    """
+    Elige un rango de range_size bytes en una posición aleatoria de cada uno
+    de n_ranges estratos de igual tamaño.
+
+    Returns:
+        Lista de tuplas (inicio, fin) en orden creciente
+    """
+    rng = rng or random.Random()
+    stratum = size / n_ranges
+    ranges = []
+    for i in range(n_ranges):
+        low = int(i * stratum)
+        high = int((i + 1) * stratum)
+        start = low + rng.randrange(max(1, high - low - range_size + 1))
+        ranges.append((start, min(start + range_size, high)))
+    return ranges
+
+
+def scan_sample_range(kind: str, s3_client, bucket: str, object_key: str, start: int, end: int):
+    """
+    Procesa los registros que empiezan en [start, end) de un objeto de S3.
+
+    A diferencia de parallel.scan_range, en FASTA se deja de leer tras
+    FASTA_RANGE_READ_FACTOR veces el tamaño del rango y el último registro
+    se cuenta truncado.
+    """
+    engine_class, find_boundary = ENGINES[kind]
+    _, _, truncatable = SAMPLED_ENGINES[kind]
+    read_limit = (end - start) * FASTA_RANGE_READ_FACTOR if truncatable else None
+    body_offset = max(start - 1, 0)
+    response = s3_client.get_object(Bucket=bucket, Key=object_key, Range=f"bytes={body_offset}-")
+    body = response['Body']
+    try:
+        engine = engine_class()
+        for chunk in iter_range_chunks(iter_chunks(body, DEFAULT_CHUNK_SIZE), body_offset, start, end, find_boundary):
+            if read_limit is not None and engine.bytes_read + len(chunk) > read_limit:
+                engine.feed(chunk[:max(read_limit - engine.bytes_read, 0)])
+                break
+            engine.feed(chunk)
+        engine.finish()
+    finally:
+        body.close()
+    return engine
+
+
+def sample_ranges(kind: str, s3_client, bucket: str, object_key: str, size: int,
+                  sample_bytes: int, n_ranges: int, rng: random.Random = None):
+    """
+    Muestrea un objeto sin comprimir por rangos estratificados.
+
+    Yields:
+        Tupla (motor con los registros del rango, SampleEstimate acumulado)
+        tras procesar cada rango
+    """
+    estimate = SampleEstimate(kind, size)
+    totals, _, _ = SAMPLED_ENGINES[kind]
+    range_size = max(1, sample_bytes // n_ranges)
+    for start, end in plan_sample_ranges(size, n_ranges, range_size, rng):
+        engine = scan_sample_range(kind, s3_client, bucket, object_key, start, end)
+        estimate.add(totals(engine))
+        yield engine, estimate
+
+
+def sample_prefix(kind: str, chunks, sample_bytes: int, n_clusters: int):
+    """
+    Muestrea el principio de un flujo (p. ej. descomprimido) de hasta
+    sample_bytes, dividido en n_clusters conglomerados (cada uno termina en
+    un límite de bloque de chunks).
+
+    Si el flujo termina antes, el resultado es exacto: se finaliza el motor y
+    el tamaño leído pasa a ser el de la población. Si no, el registro abierto
+    al cortar se descarta.
+
+    Yields:
+        Tupla (motor acumulado, SampleEstimate acumulado) tras cada conglomerado
+    """
+    engine_class, _ = ENGINES[kind]
+    totals, _, _ = SAMPLED_ENGINES[kind]
+    engine = engine_class()
+    estimate = SampleEstimate(kind)
+    previous = totals(engine)
+    cluster_bytes = sample_bytes / n_clusters
+
+    def add_cluster():
+        nonlocal previous
+        current = totals(engine)
+        estimate.add({key: current[key] - previous[key] for key in current})
+        previous = current
+
+    truncated = False
+    for chunk in chunks:
+        engine.feed(chunk)
+        if engine.bytes_read >= sample_bytes:
+            truncated = True
+            break
+        if engine.bytes_read - previous["bytes"] >= cluster_bytes:
+            add_cluster()
+            yield engine, estimate
+    if not truncated:
+        engine.finish()
+        estimate.population_bytes = engine.bytes_read
+    add_cluster()
+    yield engine, estimate
@@ -0,0 +1,99 @@
+"""
+Columnas por registro de un análisis (GC y longitud de cada secuencia, la
+tabla de registros GenBank) guardadas en MinIO como archivos .npy, fuera del
+JSON de resultados.
+
+Cada columna es un .npy sin comprimir con el tipo entero más pequeño que
+admite sus valores (los porcentajes se guardan en centésimas como uint16) o,
+las de texto, con cadenas UTF-8 de ancho fijo (el del valor más largo), así
+que una página de registros se lee con un único GET con Range a partir
+del desplazamiento de datos guardado en el puntero, sin descargar el archivo.
+El Analysis sólo guarda el puntero (record_columns) junto al resumen.
+"""
+import io
+
+import numpy as np
+
+# Máximo de registros por página del endpoint de registros
+MAX_PAGE_SIZE = 10_000
+
+
+def encode_column(values: np.ndarray, scale: int = None):
+    """
+    Convierte una columna a .npy con el tipo entero más compacto (o, si es
+    de texto, con cadenas de ancho fijo).
+
+    Args:
+        values: Valores de la columna
+        scale: Factor de punto fijo (100 = centésimas); None para enteros y texto
+
+    Returns:
+        Tupla (bytes del .npy, dtype, desplazamiento de los datos)
+    """
+    if np.asarray(values).dtype.kind == 'U':
+        return _encoded(np.char.encode(np.asarray(values), 'utf-8'))
+    if scale:
+        values = np.rint(np.asarray(values, dtype=np.float64) * scale)
+    values = np.asarray(values, dtype=np.int64)
+    maximum = int(values.max()) if values.size else 0
+    minimum = int(values.min()) if values.size else 0
+    dtype = np.result_type(np.min_scalar_type(maximum), np.min_scalar_type(minimum))
+    return _encoded(values.astype(dtype.newbyteorder('<')))
+
+
+def _encoded(values: np.ndarray):
+    buffer = io.BytesIO()
+    np.save(buffer, values, allow_pickle=False)
+    data = buffer.getvalue()
+    return data, values.dtype.str, len(data) - values.nbytes
+
+
+def write_record_columns(s3_client, bucket: str, prefix: str, columns: dict) -> dict:
+    """
+    Sube cada columna como {prefix}/{nombre}.npy.
+
+    Args:
+        s3_client: Cliente S3
+        bucket: Bucket de MinIO
+        prefix: Prefijo de las claves de los objetos
+        columns: Diccionario {nombre: (valores, scale)}; todas las columnas
+            deben tener el mismo número de registros
+
+    Returns:
+        Puntero para guardar en los resultados del Analysis
+    """
+    pointer = {"format": "npy", "bucket": bucket, "record_count": None, "columns": {}}
+    for name, (values, scale) in columns.items():
+        data, dtype, data_offset = encode_column(values, scale)
+        key = f"{prefix}/{name}.npy"
+        s3_client.put_object(Bucket=bucket, Key=key, Body=data, ContentType='application/octet-stream')
+        pointer["record_count"] = len(values)
+        pointer["columns"][name] = {"key": key, "dtype": dtype, "data_offset": data_offset, "scale": scale}
+    return pointer
+
+
+def read_record_columns(s3_client, pointer: dict, offset: int, limit: int) -> dict:
+    """
+    Lee los registros [offset, offset + limit) de cada columna con GET por rangos.
+
+    Returns:
+        Diccionario {nombre: lista de valores}
+    """
+    stop = min(offset + limit, pointer["record_count"])
+    page = {}
+    for name, column in pointer["columns"].items():
+        if stop <= offset:
+            page[name] = []
+            continue
+        dtype = np.dtype(column["dtype"])
+        first = column["data_offset"] + offset * dtype.itemsize
+        last = column["data_offset"] + stop * dtype.itemsize - 1
+        response = s3_client.get_object(Bucket=pointer["bucket"], Key=column["key"], Range=f"bytes={first}-{last}")
+        values = np.frombuffer(response['Body'].read(), dtype=dtype)
+        if dtype.kind == 'S':
+            page[name] = [value.decode('utf-8') for value in values.tolist()]
+        elif column["scale"]:
+            page[name] = (values / column["scale"]).tolist()
+        else:
+            page[name] = values.tolist()
+    return page
@@ -0,0 +1,185 @@
+"""
+Índice en memoria de sketches MinHash para buscar las cepas más parecidas.
+
+Los sketches se guardan como un índice invertido: claves hash ordenadas con
+la fila (sketch) y la posición del hash dentro de su sketch. Una consulta
+busca sus s hashes con searchsorted y calcula la estimación de Jaccard de
+Mash de todas las filas que comparten alguno a la vez, con operaciones
+vectorizadas; las filas sin hashes en común no se tocan.
+
+Para reducir memoria las claves son los 32 bits bajos de cada hash (unos
+10 bytes por hash: clave, fila y posición). Las coincidencias espurias
+entre 32 bits son escasas y se reparten entre todas las filas.
+
+Los sketches borrados de la BD se marcan como retirados (retain) y las
+búsquedas los saltan; sus hashes siguen en los segmentos hasta que se
+reconstruye el índice.
+"""
+import numpy as np
+
+# Tamaño máximo de sketch: la posición de cada hash se guarda como uint16
+MAX_SKETCH_SIZE = int(np.iinfo(np.uint16).max)
+
+
+def _segment(hash_lists: list, first_row: int):
+    """Construye un segmento ordenado (claves, filas, posiciones) a partir de sketches."""
+    sizes = np.array([h.size for h in hash_lists], dtype=np.int64)
+    if not sizes.sum():
+        return None
+    keys = np.concatenate(hash_lists).astype(np.uint32)
+    rows = np.repeat(np.arange(first_row, first_row + len(hash_lists), dtype=np.int32), sizes)
+    ranks = (np.arange(keys.size) - np.repeat(np.cumsum(sizes) - sizes, sizes)).astype(np.uint16)
+    order = np.argsort(keys, kind='stable')
+    return keys[order], rows[order], ranks[order]
+
+
+class SketchIndex:
+    """
+    Sketches de un mismo k y tamaño, con la cepa y el análisis de cada uno.
+    """
+
+    def __init__(self, k: int, sketch_size: int):
+        if not 0 < sketch_size <= MAX_SKETCH_SIZE:
+            raise ValueError(f"El tamaño de sketch debe estar entre 1 y {MAX_SKETCH_SIZE}.")
+        self.k = k
+        self.sketch_size = sketch_size
+        self.last_sketch_id = 0
+        self.sketch_ids = np.zeros(0, dtype=np.int64)
+        self.removed = np.zeros(0, dtype=bool)
+        self.analysis_ids = np.zeros(0, dtype=np.int64)
+        self.strain_ids = np.zeros(0, dtype=np.int64)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self._segments = []
+
+    def __len__(self) -> int:
+        return self.analysis_ids.size
+
+    @property
+    def live_count(self) -> int:
+        """Número de sketches no retirados."""
+        return len(self) - int(self.removed.sum())
+
+    def retain(self, sketch_ids) -> None:
+        """Retira los sketches del índice cuyo ID no está en sketch_ids (p. ej. los borrados de la BD)."""
+        self.removed |= ~np.isin(self.sketch_ids, np.asarray(sketch_ids, dtype=np.int64))
+
+    def add(self, sketch_ids: list, analysis_ids: list, strain_ids: list, hash_lists: list) -> None:
+        """
+        Añade un lote de sketches al índice.
+
+        Args:
+            sketch_ids: ID de cada sketch en la BD (para cargar sólo los nuevos)
+            analysis_ids: Análisis de cada sketch
+            strain_ids: Cepa de cada sketch
+            hash_lists: Hashes uint64 ordenados de cada sketch
+        """
+        if not sketch_ids:
+            return
+        segment = _segment(hash_lists, len(self))
+        self.sketch_ids = np.concatenate((self.sketch_ids, sketch_ids))
+        self.removed = np.concatenate((self.removed, np.zeros(len(sketch_ids), dtype=bool)))
+        self.analysis_ids = np.concatenate((self.analysis_ids, analysis_ids))
+        self.strain_ids = np.concatenate((self.strain_ids, strain_ids))
+        self.sizes = np.concatenate((self.sizes, [h.size for h in hash_lists]))
+        self.last_sketch_id = max(self.last_sketch_id, max(sketch_ids))
+        if segment is None:
+            return
+        self._segments.append(segment)
+        # Fusión por niveles: un segmento se fusiona con el anterior mientras
+        # éste no sea más del doble de grande, así hay O(log n) segmentos y
+        # cada hash se reordena O(log n) veces
+        while len(self._segments) > 1 and self._segments[-2][0].size <= 2 * self._segments[-1][0].size:
+            newer = self._segments.pop()
+            older = self._segments.pop()
+            keys, rows, ranks = (np.concatenate(parts) for parts in zip(older, newer))
+            order = np.argsort(keys, kind='stable')
+            self._segments.append((keys[order], rows[order], ranks[order]))
+
+    def _postings(self, query_keys: np.ndarray):
+        """Filas, posición en la consulta y posición en la fila de cada hash compartido."""
+        rows, query_ranks, row_ranks = [], [], []
+        for keys, segment_rows, segment_ranks in self._segments:
+            lo = np.searchsorted(keys, query_keys, side='left')
+            hi = np.searchsorted(keys, query_keys, side='right')
+            matches = hi - lo
+            total = int(matches.sum())
+            if not total:
+                continue
+            starts = np.cumsum(matches) - matches
+            idx = np.arange(total) - np.repeat(starts, matches) + np.repeat(lo, matches)
+            rows.append(segment_rows[idx])
+            query_ranks.append(np.repeat(np.arange(query_keys.size), matches))
+            row_ranks.append(segment_ranks[idx])
+        if not rows:
+            return None
+        return np.concatenate(rows), np.concatenate(query_ranks), np.concatenate(row_ranks).astype(np.int64)
+
+    def jaccard(self, hashes: np.ndarray):
+        """
+        Estimación de Jaccard de Mash contra todas las filas del índice.
+
+        Un hash compartido cuenta si está entre los s más pequeños de la unión
+        de ambos sketches: con i y j sus posiciones en la consulta y en la fila
+        y c los hashes compartidos anteriores, la unión tiene i + j - c hashes
+        menores que él.
+
+        Args:
+            hashes: Sketch de consulta (uint64, ordenado)
+
+        Returns:
+            Tupla (filas, jaccard, hashes compartidos) de las filas con algún
+            hash en común
+        """
+        postings = self._postings(hashes.astype(np.uint32))
+        if postings is None:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0), empty
+        rows, i, j = postings
+        order = np.lexsort((i, rows))
+        rows, i, j = rows[order], i[order], j[order]
+
+        group_start = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        group_sizes = np.diff(np.r_[group_start, rows.size])
+        c = np.arange(rows.size) - np.repeat(group_start, group_sizes)
+        in_union = (i + j - c) < self.sketch_size
+
+        hit_rows = rows[group_start]
+        shared = group_sizes
+        in_both = np.add.reduceat(in_union.astype(np.int64), group_start)
+        union = np.minimum(self.sketch_size, hashes.size + self.sizes[hit_rows] - shared)
+        return hit_rows, in_both / union, shared
+
+    def search(self, hashes: np.ndarray, limit: int = 20, exclude_strain_id: int = None) -> list:
+        """
+        Cepas más parecidas al sketch de consulta (el mejor sketch de cada cepa).
+
+        Args:
+            hashes: Sketch de consulta (uint64, ordenado)
+            limit: Número máximo de cepas
+            exclude_strain_id: Cepa a excluir (normalmente la de la consulta)
+
+        Los sketches retirados no aparecen en los resultados.
+
+        Returns:
+            Lista de diccionarios con strain_id, analysis_id, shared_hashes y
+            jaccard, de mayor a menor Jaccard
+        """
+        rows, jaccard, shared = self.jaccard(hashes)
+        keep = (jaccard > 0) & ~self.removed[rows]
+        if exclude_strain_id is not None:
+            keep &= self.strain_ids[rows] != exclude_strain_id
+        rows, jaccard, shared = rows[keep], jaccard[keep], shared[keep]
+
+        # Mejor fila de cada cepa: la primera de cada cepa en orden de Jaccard descendente
+        order = np.lexsort((-shared, -jaccard))
+        _, first = np.unique(self.strain_ids[rows[order]], return_index=True)
+        best = order[np.sort(first)][:limit]
+        return [
+            {
+                "strain_id": int(self.strain_ids[rows[b]]),
+                "analysis_id": int(self.analysis_ids[rows[b]]),
+                "shared_hashes": int(shared[b]),
+                "jaccard": float(jaccard[b]),
+            }
+            for b in best
+        ]
@@ -0,0 +1,44 @@
+"""
+Utilidades para leer objetos de MinIO/S3 como flujos de bytes por bloques.
+"""
+
+# Tamaño de bloque por defecto para las lecturas (1 MiB cabe en la caché L2,
+# lo que mantiene rápidas las operaciones vectorizadas de NumPy).
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(body, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Itera sobre un flujo binario en bloques de bytes.
+
+    Args:
+        body: Objeto con método read(n), p. ej. response['Body'] de boto3
+        chunk_size: Tamaño máximo de cada bloque en bytes
+
+    Yields:
+        Bloques de bytes no vacíos hasta agotar el flujo
+    """
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_lines(chunks):
+    """
+    Itera las líneas de un flujo de bloques de bytes sin decodificarlas.
+
+    Args:
+        chunks: Iterable de bloques de bytes
+
+    Yields:
+        Cada línea como bytes, sin el salto de línea final
+    """
+    pending = b''
+    for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
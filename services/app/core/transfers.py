@@ -0,0 +1,140 @@
+"""
+Subidas a MinIO con transferencias multiparte en paralelo.
+
+boto3 divide los archivos de al menos UPLOAD_MULTIPART_THRESHOLD_MB en partes
+de UPLOAD_PART_SIZE_MB que sube con UPLOAD_MAX_CONCURRENCY hilos (s3transfer
+agranda la parte si el archivo superaría el máximo de 10.000 partes). Las
+subidas leen un flujo sin seek() (el UploadValidator), así que s3transfer
+copia cada parte en memoria: como mucho guarda UPLOAD_MAX_CONCURRENCY partes a
+la vez, de modo que cada subida ocupa como máximo unos
+UPLOAD_PART_SIZE_MB * UPLOAD_MAX_CONCURRENCY (o el umbral, si es mayor). Cada
+subida registra su rendimiento en upload_stats, que se consulta en
+/analysis/uploads/metrics.
+"""
+import logging
+import math
+import threading
+import time
+
+from boto3.s3.transfer import TransferConfig
+
+from .config import settings
+
+MB = 1024 * 1024
+# Límites de S3 para subidas multiparte
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10_000
+
+
+def upload_transfer_config() -> TransferConfig:
+    """
+    TransferConfig de las subidas según Settings. Las partes en memoria por
+    subida se limitan a las que se envían a la vez (por defecto s3transfer
+    guarda hasta 10, de hasta UPLOAD_PART_SIZE_MB cada una).
+    """
+    config = TransferConfig(
+        multipart_threshold=settings.UPLOAD_MULTIPART_THRESHOLD_MB * MB,
+        multipart_chunksize=settings.UPLOAD_PART_SIZE_MB * MB,
+        max_concurrency=settings.UPLOAD_MAX_CONCURRENCY,
+        use_threads=settings.UPLOAD_MAX_CONCURRENCY > 1,
+    )
+    # Opción de s3transfer que el constructor de boto3 no expone
+    config.max_in_memory_upload_chunks = max(1, settings.UPLOAD_MAX_CONCURRENCY)
+    return config
+
+
+def plan_parts(size: int, part_size: int):
+    """
+    Tamaño y número de partes de una subida multiparte hecha por el cliente.
+
+    La parte se agranda (en MB enteros) si el archivo superaría MAX_PARTS.
+
+    Returns:
+        Tupla (tamaño de parte, número de partes)
+    """
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS / MB) * MB)
+    return part_size, max(1, math.ceil(size / part_size))
+
+
+class UploadStats:
+    """
+    Totales de las subidas del proceso (seguro entre hilos).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self.seconds = 0.0
+        self.deduplicated = 0
+        self.bytes_deduplicated = 0
+        self.last_upload = None
+
+    def record_upload(self, metrics: dict) -> None:
+        with self._lock:
+            self.uploads += 1
+            self.bytes_uploaded += metrics["bytes"]
+            self.seconds += metrics["seconds"]
+            self.last_upload = metrics
+
+    def record_deduplicated(self, size: int) -> None:
+        with self._lock:
+            self.deduplicated += 1
+            self.bytes_deduplicated += size
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            Diccionario con los totales y el rendimiento medio en bytes/s
+        """
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "bytes_uploaded": self.bytes_uploaded,
+                "seconds": round(self.seconds, 3),
+                "average_bytes_per_second": round(self.bytes_uploaded / self.seconds) if self.seconds else None,
+                "deduplicated_uploads": self.deduplicated,
+                "bytes_deduplicated": self.bytes_deduplicated,
+                "last_upload": self.last_upload,
+            }
+
+
+upload_stats = UploadStats()
+
+
+def upload_file(s3_client, fileobj, bucket: str, object_key: str, size: int = None) -> dict:
+    """
+    Sube un archivo a MinIO con la configuración multiparte de Settings.
+
+    Args:
+        s3_client: Cliente S3
+        fileobj: Archivo con read(n) (p. ej. UploadFile.file o un
+            UploadValidator que lo envuelve)
+        bucket: Bucket de MinIO
+        object_key: Clave del objeto
+        size: Tamaño del archivo en bytes; si no se indica, se toma
+            fileobj.bytes_read al terminar la subida
+
+    Returns:
+        Métricas de la subida: bytes, parts, seconds y bytes_per_second
+    """
+    config = upload_transfer_config()
+    start = time.monotonic()
+    s3_client.upload_fileobj(fileobj, bucket, object_key, Config=config)
+    elapsed = time.monotonic() - start
+    if size is None:
+        size = fileobj.bytes_read
+
+    parts = math.ceil(size / config.multipart_chunksize) if size >= config.multipart_threshold else 1
+    metrics = {
+        "bytes": size,
+        "parts": parts,
+        "seconds": round(elapsed, 3),
+        "bytes_per_second": round(size / elapsed) if elapsed > 0 else None,
+    }
+    upload_stats.record_upload(metrics)
+    logging.info(
+        f"Subida de {object_key}: {size} bytes en {parts} partes, {elapsed:.2f} s "
+        f"({size / MB / elapsed if elapsed > 0 else 0:.1f} MB/s)"
+    )
+    return metrics
@@ -0,0 +1,96 @@
+"""
+Estado de las subidas reanudables, guardado en Redis (el mismo que usa Celery).
+
+Cada sesión es un JSON en {KEY_PREFIX}:{id} y sus partes recibidas un hash
+{KEY_PREFIX}:{id}:parts (número de parte -> ETag). Un conjunto ordenado
+guarda la última actividad de cada sesión para que la tarea de limpieza
+encuentre las abandonadas y aborte su subida multiparte en MinIO; las claves
+además caducan solas tras el doble del tiempo de vida, por si la limpieza no
+llega a ejecutarse.
+"""
+import json
+import time
+from typing import Optional
+
+import redis
+
+from .config import settings
+
+KEY_PREFIX = "genolab:resumable"
+ACTIVITY_KEY = f"{KEY_PREFIX}:activity"
+
+
+class UploadSessionStore:
+    """
+    Sesiones de subida reanudable en Redis.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: int, clock=time.time):
+        """
+        Args:
+            redis_client: Cliente de Redis
+            ttl_seconds: Segundos sin actividad tras los que una sesión se
+                considera abandonada
+            clock: Reloj (sustituible en pruebas)
+        """
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+
+    def _key(self, upload_id: str) -> str:
+        return f"{KEY_PREFIX}:{upload_id}"
+
+    def _touch(self, upload_id: str) -> None:
+        self.redis.zadd(ACTIVITY_KEY, {upload_id: self._clock()})
+        for key in (self._key(upload_id), f"{self._key(upload_id)}:parts"):
+            self.redis.expire(key, 2 * self.ttl_seconds)
+
+    def create(self, session: dict) -> dict:
+        """Guarda una sesión nueva (session['id'] es su identificador)."""
+        self.redis.set(self._key(session["id"]), json.dumps(session), ex=2 * self.ttl_seconds)
+        self._touch(session["id"])
+        return session
+
+    def get(self, upload_id: str) -> Optional[dict]:
+        data = self.redis.get(self._key(upload_id))
+        return json.loads(data) if data else None
+
+    def update(self, upload_id: str, **fields) -> dict:
+        """Añade o cambia campos de una sesión existente y la devuelve."""
+        session = {**self.get(upload_id), **fields}
+        self.redis.set(self._key(upload_id), json.dumps(session), ex=2 * self.ttl_seconds)
+        self._touch(upload_id)
+        return session
+
+    def record_part(self, upload_id: str, part_number: int, etag: str) -> None:
+        """Registra una parte recibida (si se reenvía, la última sustituye a la anterior)."""
+        self.redis.hset(f"{self._key(upload_id)}:parts", str(part_number), etag)
+        self._touch(upload_id)
+
+    def parts(self, upload_id: str) -> dict:
+        """Partes recibidas como {número de parte: ETag}."""
+        raw = self.redis.hgetall(f"{self._key(upload_id)}:parts")
+        return {int(number): etag.decode() if isinstance(etag, bytes) else etag for number, etag in raw.items()}
+
+    def delete(self, upload_id: str) -> None:
+        self.redis.delete(self._key(upload_id), f"{self._key(upload_id)}:parts")
+        self.redis.zrem(ACTIVITY_KEY, upload_id)
+
+    def abandoned(self, limit: int = 100) -> list:
+        """IDs de las sesiones sin actividad durante más de ttl_seconds."""
+        ids = self.redis.zrangebyscore(ACTIVITY_KEY, 0, self._clock() - self.ttl_seconds, start=0, num=limit)
+        return [upload_id.decode() if isinstance(upload_id, bytes) else upload_id for upload_id in ids]
+
+
+_store = None
+
+
+def get_upload_session_store() -> UploadSessionStore:
+    """Almacén de sesiones del proceso (cliente de Redis creado en el primer uso)."""
+    global _store
+    if _store is None:
+        _store = UploadSessionStore(
+            redis.Redis.from_url(settings.REDIS_URL),
+            settings.RESUMABLE_UPLOAD_TTL_HOURS * 3600
+        )
+    return _store
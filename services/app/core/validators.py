@@ -1,10 +1,16 @@
 """
 Validadores para archivos subidos
 """
+from typing import Optional
+
 from fastapi import HTTPException, UploadFile, status
 
-# Configuración de validación (idealmente desde .env)
-MAX_FILE_SIZE_MB = 10  # Tamaño máximo en megabytes
+from .config import settings
+from .compression import COMPRESSED_EXTENSIONS, decompress_head
+from .hashing import HashingReader
+
+# Configuración de validación (desde Settings / .env)
+MAX_FILE_SIZE_MB = settings.MAX_UPLOAD_SIZE_MB  # Tamaño máximo en megabytes
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
 # Extensiones permitidas para archivos bioinformáticos
@@ -15,27 +21,165 @@ ALLOWED_EXTENSIONS = {
     '.gff', '.gff3',  # GFF
 }
 
+# Extensiones esperadas para cada tipo de archivo de análisis
+ANALYSIS_TYPE_EXTENSIONS = {
+    'fasta': {'.fasta', '.fa', '.fna', '.ffn', '.faa', '.frn'},
+    'fastq': {'.fastq', '.fq'},
+    'genbank': {'.gb', '.gbk', '.genbank'},
+    'gff': {'.gff', '.gff3'},
+}
+
 MIME_TYPES = {
     'application/octet-stream',  # Archivos binarios genéricos
     'text/plain',  # Archivos de texto
     'application/x-fasta',  # FASTA
     'application/x-fastq',  # FASTQ
+    'application/gzip',  # .gz / .bgz
+    'application/x-gzip',
+    'application/zstd',  # .zst
 }
 
 
+def sniff_format(head: bytes) -> Optional[str]:
+    """
+    Reconoce el formato de un archivo de secuencias por su inicio (ya
+    descomprimido).
+
+    Returns:
+        'fasta', 'fastq', 'genbank', 'gff' o None si no se reconoce
+    """
+    text = head.lstrip()
+    if text.startswith(b'>'):
+        return 'fasta'
+    if text.startswith(b'@'):
+        return 'fastq'
+    if text.startswith(b'LOCUS'):
+        return 'genbank'
+    # GFF: cabecera/comentarios '#' o líneas de 9 columnas separadas por tabuladores
+    if text.startswith(b'#') or text.split(b'\n', 1)[0].count(b'\t') == 8:
+        return 'gff'
+    return None
+
+
+def _size_error(size: int, max_size_bytes: int) -> HTTPException:
+    max_size_mb = max_size_bytes / (1024 * 1024)
+    current_size_mb = size / (1024 * 1024)
+    return HTTPException(
+        status_code=413,  # Content Too Large (RFC 9110)
+        detail=f"Archivo demasiado grande ({current_size_mb:.2f}MB). Tamaño máximo: {max_size_mb:.0f}MB"
+    )
+
+
+class UploadValidator(HashingReader):
+    """
+    Flujo con read(n) sobre un archivo subido que, bloque a bloque, aplica el
+    límite de tamaño, reconoce el formato en el primer bloque y calcula el
+    SHA-256. Sólo se guarda en memoria el bloque actual.
+    """
+
+    def __init__(self, fileobj, expected_format: str = None, max_size_bytes: int = MAX_FILE_SIZE_BYTES):
+        """
+        Args:
+            fileobj: Archivo subido (p. ej. UploadFile.file)
+            expected_format: Formato que debe tener el contenido ('fasta',
+                'fastq', 'genbank', 'gff'); None para no comprobarlo
+            max_size_bytes: Tamaño máximo en bytes
+        """
+        super().__init__(fileobj)
+        self.expected_format = expected_format
+        self.max_size_bytes = max_size_bytes
+        self.detected_format = None
+
+    def read(self, size: int = -1) -> bytes:
+        first = self.bytes_read == 0
+        data = super().read(size)
+        if self.bytes_read > self.max_size_bytes:
+            raise _size_error(self.bytes_read, self.max_size_bytes)
+        if first and data:
+            self._check_format(data)
+        return data
+
+    def _check_format(self, head: bytes) -> None:
+        content = decompress_head(head)
+        if content is None:  # zstd sin el paquete zstandard: no se puede comprobar
+            return
+        self.detected_format = sniff_format(content)
+        if self.expected_format and self.detected_format != self.expected_format:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"El contenido del archivo no corresponde al formato '{self.expected_format}'."
+            )
+
+
+def check_declared_size(declared_size: Optional[int], max_size_bytes: int = MAX_FILE_SIZE_BYTES) -> None:
+    """
+    Rechaza sin leerlo un archivo cuyo tamaño ya conocido (p. ej.
+    UploadFile.size) supera el máximo.
+
+    Raises:
+        HTTPException: Si el tamaño declarado supera el máximo (413)
+    """
+    if declared_size is not None and declared_size > max_size_bytes:
+        raise _size_error(declared_size, max_size_bytes)
+
+
+def check_not_empty(validator: UploadValidator) -> None:
+    """
+    Rechaza un archivo del que el validador no leyó ningún byte.
+
+    Raises:
+        HTTPException: Si el archivo está vacío (400)
+    """
+    if validator.bytes_read == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo está vacío"
+        )
+
+
+def validate_upload_stream(fileobj, expected_format: str = None, max_size_bytes: int = MAX_FILE_SIZE_BYTES,
+                           declared_size: int = None) -> UploadValidator:
+    """
+    Valida un archivo subido leyéndolo por bloques y lo rebobina.
+
+    Args:
+        fileobj: Archivo subido con read(n) y seek()
+        expected_format: Formato que debe tener el contenido (opcional)
+        max_size_bytes: Tamaño máximo en bytes
+        declared_size: Tamaño ya conocido (p. ej. UploadFile.size); si supera
+            el máximo se rechaza sin leer el archivo
+
+    Returns:
+        UploadValidator con bytes_read, detected_format y hexdigest()
+
+    Raises:
+        HTTPException: Si el archivo está vacío (400), no tiene el formato
+            esperado (400) o supera el tamaño máximo (413)
+    """
+    check_declared_size(declared_size, max_size_bytes)
+    validator = UploadValidator(fileobj, expected_format, max_size_bytes)
+    validator.drain()
+    check_not_empty(validator)
+    fileobj.seek(0)
+    return validator
+
+
 async def validate_file_upload(
     file: UploadFile,
     allowed_extensions: set = ALLOWED_EXTENSIONS,
     max_size_bytes: int = MAX_FILE_SIZE_BYTES
-) -> None:
+) -> UploadValidator:
     """
-    Valida un archivo subido por tamaño y extensión.
+    Valida un archivo subido por tamaño y extensión, sin cargarlo en memoria.
 
     Args:
         file: Archivo subido
         allowed_extensions: Conjunto de extensiones permitidas
         max_size_bytes: Tamaño máximo en bytes
 
+    Returns:
+        UploadValidator con el tamaño y el hash del archivo
+
     Raises:
         HTTPException: Si el archivo no cumple con los requisitos
     """
@@ -55,43 +199,28 @@ async def validate_file_upload(
             detail=f"Extensión de archivo no permitida. Extensiones válidas: {', '.join(sorted(allowed_extensions))}"
         )
 
-    # Validar tamaño del archivo
-    contents = await file.read()
-    file_size = len(contents)
-
-    if file_size == 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El archivo está vacío"
-        )
-
-    if file_size > max_size_bytes:
-        max_size_mb = max_size_bytes / (1024 * 1024)
-        current_size_mb = file_size / (1024 * 1024)
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"Archivo demasiado grande ({current_size_mb:.2f}MB). Tamaño máximo: {max_size_mb:.0f}MB"
-        )
-
-    # Resetear el cursor del archivo para lecturas posteriores
-    await file.seek(0)
-
-    return contents
+    # Validar tamaño del archivo leyéndolo por bloques
+    return validate_upload_stream(file.file, max_size_bytes=max_size_bytes, declared_size=file.size)
 
 
 def get_file_extension(filename: str) -> str:
     """
-    Obtiene la extensión del archivo en minúsculas.
+    Obtiene la extensión del archivo en minúsculas, sin el sufijo de
+    compresión (.gz, .bgz, .zst).
 
     Args:
         filename: Nombre del archivo
 
     Returns:
-        Extensión del archivo (ej: '.fasta')
+        Extensión del archivo (ej: '.fasta' para 'lecturas.fasta.gz')
     """
     if '.' not in filename:
         return ''
-    return '.' + filename.rsplit('.', 1)[1].lower()
+    stem, extension = filename.rsplit('.', 1)
+    extension = '.' + extension.lower()
+    if extension in COMPRESSED_EXTENSIONS:
+        return get_file_extension(stem)
+    return extension
 
 
 def validate_file_extension_for_analysis_type(filename: str, analysis_type: str) -> None:
@@ -107,18 +236,37 @@ def validate_file_extension_for_analysis_type(filename: str, analysis_type: str)
     """
     extension = get_file_extension(filename)
 
-    expected_extensions = {
-        'fasta': {'.fasta', '.fa', '.fna', '.ffn', '.faa', '.frn'},
-        'fastq': {'.fastq', '.fq'},
-        'genbank': {'.gb', '.gbk', '.genbank'},
-        'gff': {'.gff', '.gff3'},
-    }
-
-    if analysis_type in expected_extensions:
-        valid_extensions = expected_extensions[analysis_type]
+    if analysis_type in ANALYSIS_TYPE_EXTENSIONS:
+        valid_extensions = ANALYSIS_TYPE_EXTENSIONS[analysis_type]
         if extension not in valid_extensions:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Extensión de archivo '{extension}' no válida para análisis de tipo '{analysis_type}'. "
                        f"Extensiones esperadas: {', '.join(sorted(valid_extensions))}"
             )
+
+
+def detect_sequence_format(filename: str, formats=('fasta', 'fastq')) -> str:
+    """
+    Determina el formato de un archivo de secuencias a partir de su extensión.
+
+    Args:
+        filename: Nombre del archivo
+        formats: Formatos aceptados
+
+    Returns:
+        Formato del archivo (p. ej. 'fasta')
+
+    Raises:
+        HTTPException: Si la extensión no corresponde a ninguno de los formatos
+    """
+    extension = get_file_extension(filename)
+    for file_format in formats:
+        if extension in ANALYSIS_TYPE_EXTENSIONS[file_format]:
+            return file_format
+    valid_extensions = set().union(*(ANALYSIS_TYPE_EXTENSIONS[f] for f in formats))
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Extensión de archivo '{extension}' no válida. "
+               f"Extensiones esperadas: {', '.join(sorted(valid_extensions))}"
+    )
@@ -1,5 +1,8 @@
 # Importaciones necesarias
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy import String, cast
+from sqlalchemy.sql import func
 from . import models, schemas
 
 
@@ -153,6 +156,228 @@ def get_analyses_by_strain(db: Session, strain_id: int, skip: int = 0, limit: in
     """
     return db.query(models.Analysis).filter(models.Analysis.strain_id == strain_id).offset(skip).limit(limit).all()
 
+# --- Funciones para Sketches MinHash ---
+
+def create_analysis_sketch(db: Session, analysis_id: int, strain_id: int, k: int, sketch_size: int, hashes: bytes):
+    """Guarda el sketch MinHash del archivo de un análisis."""
+    db_sketch = models.AnalysisSketch(
+        analysis_id=analysis_id,
+        strain_id=strain_id,
+        k=k,
+        sketch_size=sketch_size,
+        hashes=hashes
+    )
+    db.add(db_sketch)
+    db.commit()
+    db.refresh(db_sketch)
+    return db_sketch
+
+def get_analysis_sketch(db: Session, analysis_id: int):
+    """Devuelve el sketch MinHash de un análisis."""
+    return db.query(models.AnalysisSketch).filter(models.AnalysisSketch.analysis_id == analysis_id).first()
+
+def get_sketch_for_file_url(db: Session, file_url: str, k: int, sketch_size: int):
+    """Devuelve un sketch con los parámetros indicados de algún análisis del archivo file_url."""
+    return db.query(models.AnalysisSketch).join(models.Analysis).filter(
+        models.Analysis.file_url == file_url,
+        models.AnalysisSketch.k == k,
+        models.AnalysisSketch.sketch_size == sketch_size
+    ).first()
+
+def get_sketches_after(db: Session, last_id: int, k: int, sketch_size: int, limit: int = 5000):
+    """
+    Devuelve, en orden de ID, los sketches con ID mayor que last_id y los
+    parámetros indicados (para cargar el índice de similitud por lotes).
+    """
+    return db.query(models.AnalysisSketch).filter(
+        models.AnalysisSketch.id > last_id,
+        models.AnalysisSketch.k == k,
+        models.AnalysisSketch.sketch_size == sketch_size
+    ).order_by(models.AnalysisSketch.id).limit(limit).all()
+
+def get_sketch_ids(db: Session, k: int, sketch_size: int) -> list:
+    """IDs de todos los sketches con los parámetros indicados."""
+    rows = db.query(models.AnalysisSketch.id).filter(
+        models.AnalysisSketch.k == k,
+        models.AnalysisSketch.sketch_size == sketch_size
+    ).all()
+    return [row.id for row in rows]
+
+def count_sketches(db: Session, k: int, sketch_size: int) -> int:
+    """Número de sketches con los parámetros indicados."""
+    return db.query(models.AnalysisSketch.id).filter(
+        models.AnalysisSketch.k == k,
+        models.AnalysisSketch.sketch_size == sketch_size
+    ).count()
+
+# --- Funciones para la Caché de Resultados ---
+
+def get_cached_result(db: Session, content_hash: str, analysis_type: str, engine_version: str, parameters: str):
+    """Devuelve la entrada de caché de un archivo y análisis, si existe."""
+    return db.query(models.AnalysisResultCache).filter(
+        models.AnalysisResultCache.content_hash == content_hash,
+        models.AnalysisResultCache.analysis_type == analysis_type,
+        models.AnalysisResultCache.engine_version == engine_version,
+        models.AnalysisResultCache.parameters == parameters
+    ).first()
+
+def create_cached_result(db: Session, content_hash: str, analysis_type: str, engine_version: str,
+                         parameters: str, results: dict):
+    """Guarda los resultados de un análisis en la caché."""
+    db_entry = models.AnalysisResultCache(
+        content_hash=content_hash,
+        analysis_type=analysis_type,
+        engine_version=engine_version,
+        parameters=parameters,
+        results=results
+    )
+    db.add(db_entry)
+    db.commit()
+    db.refresh(db_entry)
+    return db_entry
+
+def record_cache_hit(db: Session, db_entry: models.AnalysisResultCache):
+    """Incrementa el contador de aciertos de una entrada de caché."""
+    db_entry.hit_count = models.AnalysisResultCache.hit_count + 1
+    db.commit()
+    return db_entry
+
+# --- Funciones para Objetos Direccionados por Contenido ---
+
+def get_stored_object(db: Session, content_hash: str):
+    """Devuelve el objeto guardado con ese hash de contenido, si existe."""
+    return db.query(models.StoredObject).filter(models.StoredObject.content_hash == content_hash).first()
+
+def register_stored_object(db: Session, content_hash: str, bucket: str, object_key: str, file_url: str, size: int = None):
+    """
+    Registra un objeto recién subido. Si otra subida simultánea del mismo
+    contenido ya lo registró, devuelve ese registro.
+    """
+    db_object = models.StoredObject(
+        content_hash=content_hash,
+        bucket=bucket,
+        object_key=object_key,
+        file_url=file_url,
+        size=size
+    )
+    db.add(db_object)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_stored_object(db, content_hash)
+    db.refresh(db_object)
+    return db_object
+
+def touch_stored_object(db: Session, db_object: models.StoredObject):
+    """Marca una nueva subida (duplicada) del objeto."""
+    db_object.last_uploaded_at = func.now()
+    db.commit()
+    return db_object
+
+def count_object_references(db: Session, file_url: str) -> int:
+    """Número de análisis que referencian un archivo."""
+    return db.query(models.Analysis.id).filter(models.Analysis.file_url == file_url).count()
+
+def count_record_column_references(db: Session, prefix: str) -> int:
+    """
+    Número de análisis y de entradas de la caché de resultados cuyos
+    resultados apuntan a columnas por registro bajo prefix (record_columns).
+    """
+    pattern = f'%"{prefix}/%'
+    analyses = db.query(models.Analysis.id).filter(cast(models.Analysis.results, String).like(pattern)).count()
+    cached = db.query(models.AnalysisResultCache.id).filter(
+        cast(models.AnalysisResultCache.results, String).like(pattern)
+    ).count()
+    return analyses + cached
+
+def get_unreferenced_stored_objects(db: Session, uploaded_before, limit: int = 100):
+    """
+    Devuelve objetos que ningún análisis referencia y que no se han vuelto a
+    subir desde uploaded_before.
+    """
+    referenced = db.query(models.Analysis.id).filter(models.Analysis.file_url == models.StoredObject.file_url)
+    return db.query(models.StoredObject).filter(
+        models.StoredObject.last_uploaded_at < uploaded_before,
+        ~referenced.exists()
+    ).limit(limit).all()
+
+def delete_stored_object(db: Session, db_object: models.StoredObject):
+    """Elimina el registro de un objeto guardado."""
+    db.delete(db_object)
+    db.commit()
+
+def get_analyses_with_file_url_like(db: Session, pattern: str, after_id: int = 0, limit: int = 100):
+    """
+    Devuelve análisis cuyo file_url coincide con un patrón LIKE, en orden de
+    ID a partir de after_id.
+    """
+    return db.query(models.Analysis).filter(
+        models.Analysis.id > after_id,
+        models.Analysis.file_url.like(pattern)
+    ).order_by(models.Analysis.id).limit(limit).all()
+
+def replace_analysis_file_url(db: Session, old_file_url: str, new_file_url: str) -> int:
+    """Cambia el file_url de todos los análisis que usan old_file_url."""
+    updated = db.query(models.Analysis).filter(models.Analysis.file_url == old_file_url).update(
+        {models.Analysis.file_url: new_file_url}, synchronize_session=False
+    )
+    db.commit()
+    return updated
+
+# --- Funciones para Subidas Directas ---
+
+def create_direct_upload(db: Session, **fields):
+    """Registra una subida directa a MinIO."""
+    db_upload = models.DirectUpload(**fields)
+    db.add(db_upload)
+    db.commit()
+    db.refresh(db_upload)
+    return db_upload
+
+def get_direct_upload(db: Session, upload_id: str):
+    """Devuelve una subida directa por su ID."""
+    return db.query(models.DirectUpload).filter(models.DirectUpload.id == upload_id).first()
+
+def update_direct_upload_status(db: Session, db_upload: models.DirectUpload, status: str, task_id: str = None, **fields):
+    """Cambia el estado de una subida directa (y guarda su tarea y los demás campos indicados)."""
+    db_upload.status = status
+    if task_id is not None:
+        db_upload.task_id = task_id
+    for name, value in fields.items():
+        setattr(db_upload, name, value)
+    db.commit()
+    db.refresh(db_upload)
+    return db_upload
+
+def get_stale_direct_uploads(db: Session, created_before, limit: int = 100):
+    """Devuelve subidas directas aún pendientes (partes sin unir) creadas antes de created_before."""
+    return db.query(models.DirectUpload).filter(
+        models.DirectUpload.status == "pending",
+        models.DirectUpload.timestamp < created_before
+    ).limit(limit).all()
+
+def create_upload_batch(db: Session, **fields):
+    """Registra un lote de subidas."""
+    db_batch = models.UploadBatch(**fields)
+    db.add(db_batch)
+    db.commit()
+    db.refresh(db_batch)
+    return db_batch
+
+def get_upload_batch(db: Session, batch_id: str):
+    """Devuelve un lote de subidas por su ID."""
+    return db.query(models.UploadBatch).filter(models.UploadBatch.id == batch_id).first()
+
+def complete_upload_batch(db: Session, db_batch: models.UploadBatch, summary: dict):
+    """Marca un lote como terminado y guarda su resumen."""
+    db_batch.status = "completed"
+    db_batch.summary = summary
+    db_batch.completed_at = func.now()
+    db.commit()
+    db.refresh(db_batch)
+    return db_batch
+
 # --- Funciones de Conteo para Estadísticas ---
 
 def get_organisms_count(db: Session) -> int:
@@ -6,7 +6,10 @@ from .core.config import settings # <-- IMPORTACIÓN AÑADIDA
 # --- Creación del Motor de la Base de Datos ---
 # Usamos la URL de la base de datos desde nuestra configuración centralizada.
 # Esto nos permite cambiar fácilmente entre SQLite, MySQL y PostgreSQL.
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URL)
+# Con SQLite se permite usar la conexión desde varios hilos: los endpoints
+# async ejecutan las consultas de una misma sesión en hilos del threadpool.
+connect_args = {"check_same_thread": False} if settings.SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
 
 # --- Creación de la Fábrica de Sesiones ---
 # SessionLocal será la clase que usaremos para crear nuestras sesiones de BD.
@@ -9,9 +9,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from slowapi.middleware import SlowAPIMiddleware
 from .routers import users, auth, organisms, analysis, stats
 from contextlib import asynccontextmanager
-import boto3
 from botocore.exceptions import ClientError
 from .core.config import settings
+from .core.s3_clients import shared_s3_client
 
 # --- Configuración de Rate Limiting ---
 # Limita las peticiones por IP para prevenir abusos y ataques de fuerza bruta
@@ -29,12 +29,7 @@ async def lifespan(app: FastAPI):
     # On startup, connect to MinIO and ensure the bucket exists.
     print("Attempting to connect to MinIO and verify bucket...")
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-        )
+        s3_client = shared_s3_client()
 
         bucket_name = settings.MINIO_BUCKET_NAME
 
@@ -1,5 +1,5 @@
 # Importaciones necesarias de SQLAlchemy, la librería que nos permite hablar con la base de datos usando Python.
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, BigInteger, String, DateTime, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func # Para obtener la fecha y hora actual de la base de datos
 
@@ -82,4 +82,124 @@ class Analysis(Base):
     # Permite acceder al objeto 'Strain' completo desde un análisis.
     strain = relationship("Strain", back_populates="analyses")
     # Permite acceder al objeto 'User' (propietario) completo desde un análisis.
-    owner = relationship("User", back_populates="analyses")
\ No newline at end of file
+    owner = relationship("User", back_populates="analyses")
+    # Sketch MinHash del archivo analizado (sólo FASTA), si existe; se borra con el análisis.
+    sketch = relationship("AnalysisSketch", back_populates="analysis", uselist=False, cascade="all, delete-orphan")
+
+# --- MODELO DE SKETCH MINHASH ---
+# Define la tabla 'analysis_sketches': el sketch MinHash bottom-s del archivo
+# de un análisis, para buscar cepas parecidas sin volver a leer los archivos.
+class AnalysisSketch(Base):
+    __tablename__ = "analysis_sketches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), unique=True, nullable=False)
+    # Se repite la cepa del análisis para cargar el índice de similitud sin joins.
+    strain_id = Column(Integer, ForeignKey("strains.id"), index=True, nullable=False)
+
+    # Longitud de los k-meros y número máximo de hashes del sketch.
+    k = Column(Integer, nullable=False)
+    sketch_size = Column(Integer, nullable=False)
+    # Hashes uint64 ordenados, en binario little-endian (8 bytes por hash).
+    hashes = Column(LargeBinary, nullable=False)
+
+    analysis = relationship("Analysis", back_populates="sketch")
+
+# --- MODELO DE CACHÉ DE RESULTADOS ---
+# Define la tabla 'analysis_result_cache': resultados de análisis ya calculados,
+# indexados por el hash del contenido del archivo, para no repetir la tarea
+# cuando se sube el mismo archivo a otra cepa.
+class AnalysisResultCache(Base):
+    __tablename__ = "analysis_result_cache"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "analysis_type", "engine_version", "parameters"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # SHA-256 (hexadecimal) del archivo tal como se subió.
+    content_hash = Column(String(64), index=True, nullable=False)
+    analysis_type = Column(String, nullable=False)
+    # Versión de la salida del motor (ver core/result_cache.ENGINE_VERSIONS).
+    engine_version = Column(String, nullable=False)
+    # Parámetros del análisis como JSON canónico (p. ej. k del espectro).
+    parameters = Column(String, nullable=False, default="{}")
+
+    # Resultados sin las claves propias de cada subida (filename).
+    results = Column(JSON, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+# Define la tabla 'stored_objects': archivos subidos guardados en MinIO una
+# sola vez, bajo una clave derivada del hash de su contenido. Los Analysis
+# que usan el archivo lo referencian con file_url.
+class StoredObject(Base):
+    __tablename__ = "stored_objects"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # SHA-256 (hexadecimal) del contenido; identifica el objeto.
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    bucket = Column(String, nullable=False)
+    object_key = Column(String(1024), nullable=False)
+    # URL con la que los Analysis referencian el objeto.
+    file_url = Column(String(1024), index=True, nullable=False)
+    size = Column(BigInteger, nullable=True)
+
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Última subida del contenido (nueva o duplicada); protege de la
+    # limpieza de objetos sin referencias mientras su tarea está pendiente.
+    last_uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Define la tabla 'direct_uploads': subidas multiparte que el cliente hace
+# directamente a MinIO con URLs prefirmadas; al completarse se encola el
+# análisis.
+class DirectUpload(Base):
+    __tablename__ = "direct_uploads"
+
+    # UUID de la subida, usado en /analysis/uploads/{id}/complete.
+    id = Column(String(36), primary_key=True, index=True)
+
+    strain_id = Column(Integer, ForeignKey("strains.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    analysis_type = Column(String, nullable=False)
+    parameters = Column(JSON, nullable=False, default=dict)
+    filename = Column(String, nullable=False)
+
+    bucket = Column(String, nullable=False)
+    object_key = Column(String(1024), nullable=False)
+    # UploadId de la subida multiparte en MinIO.
+    s3_upload_id = Column(String(1024), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    part_size = Column(BigInteger, nullable=False)
+    part_count = Column(Integer, nullable=False)
+
+    # 'pending', 'uploaded' (partes unidas en la clave provisional),
+    # 'completed' o 'failed'.
+    status = Column(String, nullable=False, default="pending")
+    # SHA-256 del archivo; se rellena (junto con object_key, que pasa a ser
+    # la clave direccionada por contenido) al guardarlo en objects/sha256/.
+    content_hash = Column(String(64), nullable=True)
+    task_id = Column(String, nullable=True)
+    # Análisis creado desde la caché de resultados (sin tarea).
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=True)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+# Define la tabla 'upload_batches': lotes de archivos subidos en una sola
+# petición cuyos análisis se lanzan juntos como un chord de Celery.
+class UploadBatch(Base):
+    __tablename__ = "upload_batches"
+
+    # UUID del lote, usado en /analysis/upload/batch/{id}.
+    id = Column(String(36), primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # Un elemento por archivo: filename, strain_id, analysis_type, object_key
+    # y task_id (o analysis_id si el resultado salió de la caché).
+    entries = Column(JSON, nullable=False, default=list)
+
+    # 'processing' o 'completed'; el resumen lo guarda el callback del chord.
+    status = Column(String, nullable=False, default="processing")
+    summary = Column(JSON, nullable=True)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
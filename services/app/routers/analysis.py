@@ -1,28 +1,55 @@
 # Importaciones de librerías estándar y de terceros
-import os
 import uuid
-import boto3
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response
+import logging
+import base64
+import hashlib
+import threading
+import functools
+import anyio
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Response, Request, Query
+from fastapi.responses import StreamingResponse, RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from botocore.exceptions import ClientError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
+from pydantic import ValidationError
+from celery import chord, group
 
 from .. import crud, models, schemas
 from ..dependencies import get_db
 from ..core.config import settings
-from ..core.validators import validate_file_extension_for_analysis_type
+from ..core.validators import validate_file_extension_for_analysis_type, get_file_extension, detect_sequence_format
+from ..core.validators import check_declared_size, check_not_empty, UploadValidator
 from ..tasks import process_fasta_count, process_fasta_gc_content, process_fastq_stats, process_genbank_stats, process_gff_stats
+from ..tasks import process_fasta_profile, process_fastq_profile, process_assembly_stats, process_kmer_spectrum
+from ..tasks import finalize_upload_batch, ingest_direct_upload, analysis_from_cached_result
+from ..core.kmers import MAX_K
+from ..core.minhash import mash_distance
+from ..core.sketch_index import SketchIndex
+from ..core.sidecar import read_record_columns, MAX_PAGE_SIZE
+from ..core.genbank_engine import RECORD_COLUMNS
+from ..core.object_store import content_object_key, parse_file_url, staging_object_key
+from ..core.transfers import upload_file, upload_stats, upload_transfer_config, plan_parts, MB
+from ..core.streams import iter_chunks
+from ..core.upload_sessions import get_upload_session_store
+from ..core.archives import ArchiveError, is_archive, iter_members
+from ..core.s3_clients import shared_s3_client, shared_presign_client
+from ..core.result_cache import cache_parameters, result_cache_key
+from ..core.profiles import FASTA_PROFILE_METRICS, FASTQ_PROFILE_METRICS, parse_metrics
 from ..celery_worker import celery_app
 
 # --- Configuración del Cliente MinIO/S3 ---
 def get_s3_client():
-    """FastAPI dependency to get a boto3 S3 client."""
-    return boto3.client(
-        's3',
-        endpoint_url=settings.MINIO_ENDPOINT,
-        aws_access_key_id=settings.MINIO_ACCESS_KEY,
-        aws_secret_access_key=settings.MINIO_SECRET_KEY,
-        region_name='us-east-1'  # Puede ser cualquier región, MinIO no la usa
-    )
+    """FastAPI dependency to get the process-wide boto3 S3 client."""
+    return shared_s3_client()
+
+def get_presign_client():
+    """
+    Cliente S3 para firmar URLs que usará el navegador: apunta al endpoint
+    público de MinIO (la firma incluye el host).
+    """
+    return shared_presign_client()
 
 S3_BUCKET_NAME = settings.MINIO_BUCKET_NAME
 
@@ -45,6 +72,126 @@ def get_analyses_for_strain(
     analyses = crud.get_analyses_by_strain(db, strain_id=strain_id)
     return analyses
 
+# --- Índice de sketches MinHash para /similar ---
+# Se carga de la BD en la primera consulta y después sólo se le añaden los
+# sketches nuevos, por lotes. Si la BD tiene menos sketches que el índice,
+# se retiran los borrados; cuando son más de la mitad, se reconstruye.
+_sketch_index = None
+_sketch_index_lock = threading.Lock()
+
+def _sketch_hashes(sketch: models.AnalysisSketch) -> np.ndarray:
+    return np.frombuffer(sketch.hashes, dtype='<u8').astype(np.uint64)
+
+def _load_new_sketches(db: Session, index: SketchIndex) -> None:
+    while True:
+        batch = crud.get_sketches_after(db, index.last_sketch_id, index.k, index.sketch_size)
+        if not batch:
+            return
+        index.add(
+            [sketch.id for sketch in batch],
+            [sketch.analysis_id for sketch in batch],
+            [sketch.strain_id for sketch in batch],
+            [_sketch_hashes(sketch) for sketch in batch]
+        )
+
+def get_sketch_index(db: Session) -> SketchIndex:
+    """Devuelve el índice de sketches en memoria, al día con la BD."""
+    global _sketch_index
+    with _sketch_index_lock:
+        if _sketch_index is None or (_sketch_index.k, _sketch_index.sketch_size) != (settings.SKETCH_K, settings.SKETCH_SIZE):
+            _sketch_index = SketchIndex(settings.SKETCH_K, settings.SKETCH_SIZE)
+        _load_new_sketches(db, _sketch_index)
+        # Los sketches sólo se añaden o se borran: si hay menos en la BD, se borró alguno
+        if crud.count_sketches(db, settings.SKETCH_K, settings.SKETCH_SIZE) < _sketch_index.live_count:
+            _sketch_index.retain(crud.get_sketch_ids(db, settings.SKETCH_K, settings.SKETCH_SIZE))
+            if _sketch_index.live_count < len(_sketch_index) // 2:
+                _sketch_index = SketchIndex(settings.SKETCH_K, settings.SKETCH_SIZE)
+                _load_new_sketches(db, _sketch_index)
+        return _sketch_index
+
+@router.get("/similar/{analysis_id}")
+def get_similar_strains(
+    analysis_id: int,
+    limit: int = Query(20, ge=1, le=settings.SIMILAR_STRAINS_MAX_LIMIT),
+    db: Session = Depends(get_db)
+):
+    """
+    Ordena las cepas del cepario por similitud con el archivo FASTA de un
+    análisis, comparando sus sketches MinHash (distancia de Mash y ANI
+    estimada). Para cada cepa se usa su sketch más parecido.
+    """
+    analysis = crud.get_analysis(db, analysis_id=analysis_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Análisis no encontrado.")
+    sketch = crud.get_analysis_sketch(db, analysis_id=analysis_id)
+    if not sketch:
+        raise HTTPException(status_code=404, detail="El análisis no tiene sketch MinHash (sólo se calcula para archivos FASTA).")
+    if (sketch.k, sketch.sketch_size) != (settings.SKETCH_K, settings.SKETCH_SIZE):
+        raise HTTPException(status_code=409, detail="El sketch del análisis se calculó con otros parámetros (k o tamaño).")
+
+    index = get_sketch_index(db)
+    hits = index.search(_sketch_hashes(sketch), limit=limit, exclude_strain_id=sketch.strain_id)
+
+    strains = {}
+    if hits:
+        strain_ids = [hit["strain_id"] for hit in hits]
+        strains = {s.id: s for s in db.query(models.Strain).filter(models.Strain.id.in_(strain_ids)).all()}
+
+    results = []
+    for hit in hits:
+        strain = strains.get(hit["strain_id"])
+        distance = mash_distance(hit["jaccard"], index.k)
+        results.append({
+            **hit,
+            "strain_name": strain.strain_name if strain else None,
+            "organism_id": strain.organism_id if strain else None,
+            "jaccard": round(hit["jaccard"], 4),
+            "mash_distance": round(distance, 5),
+            "ani": round((1 - distance) * 100, 2),
+        })
+
+    return {
+        "analysis_id": analysis_id,
+        "strain_id": sketch.strain_id,
+        "k": index.k,
+        "sketch_size": index.sketch_size,
+        "indexed_sketches": index.live_count,
+        "results": results,
+    }
+
+# Extensiones admitidas en las subidas sin análisis
+RAW_FILE_EXTENSIONS = ['.fasta', '.fastq', '.gbk', '.gff', '.txt', '.fa', '.fas', '.mfasta', '.fna', '.faa']
+
+def validate_raw_file_extension(filename: str) -> None:
+    """Valida la extensión de un archivo subido sin análisis (ignora .gz/.bgz/.zst)."""
+    if get_file_extension(filename) not in RAW_FILE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Extensión de archivo no permitida. Extensiones permitidas: {RAW_FILE_EXTENSIONS}")
+
+def create_raw_analysis(db: Session, analysis_type: str, strain_id: int, owner_id: int,
+                        filename: str, file_size, bucket: str, object_key: str):
+    """
+    Crea el registro de un archivo guardado sin análisis, para hacer
+    seguimiento del archivo.
+
+    Returns:
+        Tupla (Analysis creado, file_url)
+    """
+    analysis_results = {
+        "filename": filename,
+        "file_size": file_size,
+        "upload_status": "completed",
+        "message": "Archivo subido directamente sin análisis"
+    }
+
+    file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+    analysis_to_create = schemas.AnalysisCreate(
+        analysis_type=analysis_type,
+        results=analysis_results,
+        strain_id=strain_id,
+        file_url=file_url
+    )
+    return crud.create_analysis(db=db, analysis=analysis_to_create, owner_id=owner_id), file_url
+
 @router.post("/upload/raw", status_code=status.HTTP_201_CREATED)
 async def upload_raw_file(
     strain_id: int = Form(...),
@@ -56,52 +203,162 @@ async def upload_raw_file(
     """
     Endpoint para subir archivos sin análisis, simplemente para almacenarlos en MinIO.
     """
-    if not crud.get_strain(db, strain_id=strain_id):
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
         raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
 
     # Validar extensiones permitidas
-    allowed_extensions = ['.fasta', '.fastq', '.gbk', '.gff', '.txt', '.fa', '.fas', '.mfasta', '.fna', '.faa']
-    file_extension = os.path.splitext(file.filename)[1].lower()
+    validate_raw_file_extension(file.filename)
 
-    if file_extension not in allowed_extensions:
-        raise HTTPException(status_code=400, detail=f"Extensión de archivo no permitida. Extensiones permitidas: {allowed_extensions}")
-
-    object_key = f"uploads/{uuid.uuid4()}-{file.filename}"
-
-    try:
-        s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, object_key)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
+    object_key, _ = await store_upload_in_thread(db, s3_client, file)
 
     # Crear registro en la base de datos para hacer seguimiento del archivo
-    first_user = db.query(models.User).first()
+    first_user = await run_in_threadpool(db.query(models.User).first)
     if not first_user:
         raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el registro.")
 
-    # Crear un registro de análisis con resultados mínimos
-    analysis_results = {
-        "filename": file.filename,
-        "file_size": file.size if file.size else "unknown",
-        "upload_status": "completed",
-        "message": "Archivo subido directamente sin análisis"
+    created_analysis, file_url = await run_in_threadpool(
+        create_raw_analysis, db, analysis_type, strain_id, first_user.id, file.filename,
+        file.size if file.size else "unknown", S3_BUCKET_NAME, object_key
+    )
+
+    return {
+        "message": "Archivo subido exitosamente",
+        "analysis_id": created_analysis.id,
+        "file_url": file_url
     }
 
-    file_url = f"{settings.MINIO_ENDPOINT}/{S3_BUCKET_NAME}/{object_key}"
-    analysis_to_create = schemas.AnalysisCreate(
-        analysis_type=analysis_type,
-        results=analysis_results,
-        strain_id=strain_id,
-        file_url=file_url
+# --- Subida con hash de contenido y caché de resultados ---
+# Limita las subidas que se validan y envían a MinIO a la vez (se crea en el primer uso)
+_upload_limiter = None
+
+def stage_upload(s3_client, file: UploadFile, expected_format: str = None):
+    """
+    Valida el archivo subido, calcula su SHA-256 y lo sube a MinIO bajo una
+    clave provisional en una sola lectura: boto3 lee el archivo a través de
+    un UploadValidator, así que un archivo demasiado grande o con otro
+    formato interrumpe la subida (s3transfer aborta la subida multiparte).
+
+    Returns:
+        Tupla (clave provisional, hash SHA-256 hexadecimal, tamaño en bytes)
+    """
+    max_size_bytes = settings.MAX_UPLOAD_SIZE_MB * MB
+    check_declared_size(file.size, max_size_bytes)
+    validator = UploadValidator(file.file, expected_format, max_size_bytes)
+    staging_key = staging_object_key()
+    try:
+        upload_file(s3_client, validator, S3_BUCKET_NAME, staging_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
+    try:
+        check_not_empty(validator)
+    except HTTPException:
+        delete_staged_object(s3_client, staging_key)
+        raise
+    return staging_key, validator.hexdigest(), validator.bytes_read
+
+def delete_staged_object(s3_client, staging_key: str) -> None:
+    """Borra una clave provisional; si falla, la limpieza periódica la recoge."""
+    try:
+        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=staging_key)
+    except Exception as e:
+        logging.warning(f"No se pudo borrar el objeto provisional {staging_key}: {e}")
+
+def register_upload(db: Session, content_hash: str, object_key: str, size: int) -> None:
+    """Registra en la BD un archivo recién subido a MinIO."""
+    crud.register_stored_object(
+        db, content_hash, S3_BUCKET_NAME, object_key,
+        f"{settings.MINIO_ENDPOINT}/{S3_BUCKET_NAME}/{object_key}", size
     )
 
-    created_analysis = crud.create_analysis(
-        db=db, analysis=analysis_to_create, owner_id=first_user.id
+def promote_staged_upload(db: Session, s3_client, staging_key: str, content_hash: str, size: int) -> str:
+    """
+    Lleva un archivo subido bajo una clave provisional a su clave
+    direccionada por contenido (copia dentro de MinIO) y lo registra. Si el
+    mismo contenido ya está guardado no se copia nada. La clave provisional
+    no se borra.
+
+    Returns:
+        Clave del objeto direccionada por contenido
+    """
+    stored = crud.get_stored_object(db, content_hash)
+    if stored:
+        crud.touch_stored_object(db, stored)
+        upload_stats.record_deduplicated(size)
+        return stored.object_key
+
+    object_key = content_object_key(content_hash)
+    try:
+        s3_client.copy(
+            {'Bucket': S3_BUCKET_NAME, 'Key': staging_key}, S3_BUCKET_NAME, object_key,
+            Config=upload_transfer_config()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar el archivo en MinIO: {e}")
+    register_upload(db, content_hash, object_key, size)
+    return object_key
+
+def store_upload(db: Session, s3_client, file: UploadFile, expected_format: str = None):
+    """
+    Guarda el archivo subido en MinIO bajo su clave direccionada por contenido.
+
+    El archivo se valida, se hashea y se sube en una sola lectura (ver
+    stage_upload); después se copia a su clave definitiva o, si el mismo
+    contenido ya está guardado, se descarta.
+
+    Returns:
+        Tupla (clave del objeto, hash SHA-256 hexadecimal)
+    """
+    staging_key, content_hash, size = stage_upload(s3_client, file, expected_format)
+    try:
+        return promote_staged_upload(db, s3_client, staging_key, content_hash, size), content_hash
+    finally:
+        delete_staged_object(s3_client, staging_key)
+
+def get_upload_limiter() -> anyio.CapacityLimiter:
+    """
+    Limitador de los hilos que validan y suben archivos a la vez
+    (UPLOAD_INGEST_CONCURRENCY por proceso; se crea en el primer uso).
+    """
+    global _upload_limiter
+    if _upload_limiter is None:
+        _upload_limiter = anyio.CapacityLimiter(settings.UPLOAD_INGEST_CONCURRENCY)
+    return _upload_limiter
+
+async def store_upload_in_thread(db: Session, s3_client, file: UploadFile, expected_format: str = None):
+    """
+    Ejecuta store_upload en un hilo para no bloquear el bucle de eventos.
+
+    Validar, calcular el hash y subir a MinIO puede tardar minutos con
+    archivos grandes: como mucho UPLOAD_INGEST_CONCURRENCY subidas ocupan un
+    hilo a la vez (las demás esperan sin bloquear), así que los hilos del
+    pool por defecto quedan libres para los endpoints síncronos.
+    """
+    return await anyio.to_thread.run_sync(
+        functools.partial(store_upload, db, s3_client, file, expected_format), limiter=get_upload_limiter()
     )
 
+def create_analysis_from_cache(db: Session, content_hash: str, analysis_type: str, parameters: str,
+                               strain_id: int, owner_id: int, filename: str, object_key: str):
+    """
+    Si el mismo contenido ya se analizó con la versión actual del motor y los
+    mismos parámetros, crea el Analysis con los resultados guardados (ver
+    analysis_from_cached_result).
+
+    Returns:
+        Respuesta del endpoint si hubo acierto en la caché; None si no
+    """
+    created_analysis = analysis_from_cached_result(
+        db, content_hash, analysis_type, parameters, strain_id, owner_id, filename, S3_BUCKET_NAME, object_key
+    )
+    if not created_analysis:
+        return None
     return {
-        "message": "Archivo subido exitosamente",
+        "message": "Resultados obtenidos de la caché",
+        "task_id": None,
         "analysis_id": created_analysis.id,
-        "file_url": file_url
+        "cached": True
     }
 
 @router.post("/upload/fasta_count", status_code=status.HTTP_202_ACCEPTED)
@@ -114,31 +371,50 @@ async def upload_and_count_fasta(
     """
     Endpoint para subir un archivo FASTA y contar el número de secuencias.
     """
-    if not crud.get_strain(db, strain_id=strain_id):
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
         raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
     validate_file_extension_for_analysis_type(file.filename, 'fasta')
-    object_key = f"uploads/{uuid.uuid4()}-{file.filename}"
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, 'fasta')
 
-    try:
-        s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, object_key)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
-
-    first_user = db.query(models.User).first()
+    first_user = await run_in_threadpool(db.query(models.User).first)
     if not first_user:
         raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
 
-    task = process_fasta_count.delay(
+    cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "fasta_count", cache_parameters(),
+        strain_id, first_user.id, file.filename, object_key
+    )
+    if cached:
+        return cached
+
+    task = await run_in_threadpool(
+        process_fasta_count.delay,
         strain_id=strain_id,
         owner_id=first_user.id,
         bucket=S3_BUCKET_NAME,
         object_key=object_key,
-        analysis_type_str="fasta_count"
+        filename=file.filename,
+        analysis_type_str="fasta_count",
+        content_hash=content_hash
     )
     return {"message": "Análisis de conteo FASTA iniciado", "task_id": task.id}
 
+@router.get("/uploads/metrics")
+def get_upload_metrics():
+    """
+    Rendimiento de las subidas a MinIO de este proceso de la API y la
+    configuración multiparte en uso.
+    """
+    config = upload_transfer_config()
+    return {
+        **upload_stats.snapshot(),
+        "multipart_threshold_bytes": config.multipart_threshold,
+        "part_size_bytes": config.multipart_chunksize,
+        "max_concurrency": config.max_concurrency,
+    }
+
 @router.get("/tasks/{task_id}")
-async def get_task_status(task_id: str):
+def get_task_status(task_id: str):
     """
     Consulta el estado de una tarea de Celery.
     """
@@ -152,6 +428,9 @@ async def get_task_status(task_id: str):
     elif state == 'PROGRESS':
         response['status'] = info.get('status', 'Procesando...')
         response['progress'] = info.get('progress', 0)
+        # Bytes y registros procesados, velocidad, tiempo restante estimado y,
+        # en el modo approximate, las estimaciones provisionales
+        response.update({key: value for key, value in info.items() if key not in response})
     elif state == 'SUCCESS':
         response['status'] = 'Completado'
         response['result'] = task.result
@@ -165,67 +444,91 @@ async def get_task_status(task_id: str):
 async def upload_and_analyze_fasta_gc_content(
     strain_id: int = Form(...),
     file: UploadFile = File(...),
+    approximate: bool = Form(False),
     db: Session = Depends(get_db),
     s3_client = Depends(get_s3_client)  # <-- INJECTED DEPENDENCY
 ):
     """
     Endpoint para subir un archivo FASTA y calcular el contenido GC.
+
+    Con approximate=true se analiza una muestra del archivo: la tarea publica
+    estimaciones provisionales con intervalos de confianza (estado PROGRESS)
+    y guarda las estimaciones finales marcadas como aproximadas.
     """
-    if not crud.get_strain(db, strain_id=strain_id):
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
         raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
     validate_file_extension_for_analysis_type(file.filename, 'fasta')
-    object_key = f"uploads/{uuid.uuid4()}-{file.filename}"
-
-    try:
-        s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, object_key)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, 'fasta')
 
-    first_user = db.query(models.User).first()
+    first_user = await run_in_threadpool(db.query(models.User).first)
     if not first_user:
         raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
 
-    task = process_fasta_gc_content.delay(
+    if not approximate:
+        cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "fasta_gc_content", cache_parameters(),
+            strain_id, first_user.id, file.filename, object_key
+        )
+        if cached:
+            return {**cached, "approximate": approximate}
+
+    task = await run_in_threadpool(
+        process_fasta_gc_content.delay,
         strain_id=strain_id,
         owner_id=first_user.id,
         bucket=S3_BUCKET_NAME,
         object_key=object_key,
-        analysis_type_str="fasta_gc_content"
+        filename=file.filename,
+        analysis_type_str="fasta_gc_content",
+        content_hash=content_hash,
+        approximate=approximate
     )
-    return {"message": "Análisis de contenido GC FASTA iniciado", "task_id": task.id}
+    return {"message": "Análisis de contenido GC FASTA iniciado", "task_id": task.id, "approximate": approximate}
 
 @router.post("/upload/fastq_stats", status_code=status.HTTP_202_ACCEPTED)
 async def upload_and_analyze_fastq(
     strain_id: int = Form(...),
     file: UploadFile = File(...),
+    approximate: bool = Form(False),
     db: Session = Depends(get_db),
     s3_client = Depends(get_s3_client)  # <-- INJECTED DEPENDENCY
 ):
     """
     Endpoint para subir un archivo FASTQ y calcular estadísticas de calidad.
+
+    Con approximate=true se analiza una muestra del archivo: la tarea publica
+    estimaciones provisionales con intervalos de confianza (estado PROGRESS)
+    y guarda las estimaciones finales marcadas como aproximadas.
     """
-    if not crud.get_strain(db, strain_id=strain_id):
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
         raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
     validate_file_extension_for_analysis_type(file.filename, 'fastq')
-    object_key = f"uploads/{uuid.uuid4()}-{file.filename}"
-
-    try:
-        s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, object_key)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, 'fastq')
 
-    first_user = db.query(models.User).first()
+    first_user = await run_in_threadpool(db.query(models.User).first)
     if not first_user:
         raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
 
-    task = process_fastq_stats.delay(
+    if not approximate:
+        cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "fastq_stats", cache_parameters(),
+            strain_id, first_user.id, file.filename, object_key
+        )
+        if cached:
+            return {**cached, "approximate": approximate}
+
+    task = await run_in_threadpool(
+        process_fastq_stats.delay,
         strain_id=strain_id,
         owner_id=first_user.id,
         bucket=S3_BUCKET_NAME,
         object_key=object_key,
-        analysis_type_str="fastq_stats"
+        filename=file.filename,
+        analysis_type_str="fastq_stats",
+        content_hash=content_hash,
+        approximate=approximate
     )
-    return {"message": "Análisis de estadísticas FASTQ iniciado", "task_id": task.id}
+    return {"message": "Análisis de estadísticas FASTQ iniciado", "task_id": task.id, "approximate": approximate}
 
 @router.post("/upload/genbank_stats", status_code=status.HTTP_202_ACCEPTED)
 async def upload_and_analyze_genbank(
@@ -237,62 +540,1015 @@ async def upload_and_analyze_genbank(
     """
     Endpoint para subir un archivo GenBank y extraer estadísticas y anotaciones.
     """
-    if not crud.get_strain(db, strain_id=strain_id):
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
         raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
     validate_file_extension_for_analysis_type(file.filename, 'genbank')
-    object_key = f"uploads/{uuid.uuid4()}-{file.filename}"
-
-    try:
-        s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, object_key)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, 'genbank')
 
-    first_user = db.query(models.User).first()
+    first_user = await run_in_threadpool(db.query(models.User).first)
     if not first_user:
         raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
 
-    task = process_genbank_stats.delay(
+    cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "genbank_stats", cache_parameters(),
+        strain_id, first_user.id, file.filename, object_key
+    )
+    if cached:
+        return cached
+
+    task = await run_in_threadpool(
+        process_genbank_stats.delay,
         strain_id=strain_id,
         owner_id=first_user.id,
         bucket=S3_BUCKET_NAME,
         object_key=object_key,
-        analysis_type_str="genbank_stats"
+        filename=file.filename,
+        analysis_type_str="genbank_stats",
+        content_hash=content_hash
     )
     return {"message": "Análisis de estadísticas GenBank iniciado", "task_id": task.id}
 
 @router.post("/upload/gff_stats", status_code=status.HTTP_202_ACCEPTED)
 async def upload_and_analyze_gff(
     strain_id: int = Form(...),
+    deep_validation: bool = Form(False),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     s3_client = Depends(get_s3_client)  # <-- INJECTED DEPENDENCY
 ):
     """
     Endpoint para subir un archivo GFF y contar los tipos de features.
+
+    Por defecto cuenta la columna 3 línea a línea; con deep_validation=true
+    usa BCBio para construir y validar el árbol completo de features.
     """
-    if not crud.get_strain(db, strain_id=strain_id):
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
         raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
     validate_file_extension_for_analysis_type(file.filename, 'gff')
-    object_key = f"uploads/{uuid.uuid4()}-{file.filename}"
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, 'gff')
+
+    first_user = await run_in_threadpool(db.query(models.User).first)
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "gff_stats", cache_parameters(deep_validation=deep_validation),
+        strain_id, first_user.id, file.filename, object_key
+    )
+    if cached:
+        return cached
+
+    task = await run_in_threadpool(
+        process_gff_stats.delay,
+        strain_id=strain_id,
+        owner_id=first_user.id,
+        bucket=S3_BUCKET_NAME,
+        object_key=object_key,
+        filename=file.filename,
+        analysis_type_str="gff_stats",
+        content_hash=content_hash,
+        deep_validation=deep_validation
+    )
+    return {"message": "Análisis de estadísticas GFF iniciado", "task_id": task.id}
+
+@router.post("/upload/assembly_stats", status_code=status.HTTP_202_ACCEPTED)
+async def upload_and_analyze_assembly(
+    strain_id: int = Form(...),
+    expected_genome_size: Optional[int] = Form(None),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Endpoint para subir un ensamblaje FASTA y calcular estadísticas de contigüidad
+    (N50/L50, N90, auN y GC por tamaño de contig).
 
+    Si se indica expected_genome_size también se calculan NG50/LG50.
+    """
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
+        raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
+    validate_file_extension_for_analysis_type(file.filename, 'fasta')
+    if expected_genome_size is not None and expected_genome_size <= 0:
+        raise HTTPException(status_code=400, detail="El tamaño esperado del genoma debe ser positivo.")
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, 'fasta')
+
+    first_user = await run_in_threadpool(db.query(models.User).first)
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "assembly_stats", cache_parameters(genome_size=expected_genome_size),
+        strain_id, first_user.id, file.filename, object_key
+    )
+    if cached:
+        return cached
+
+    task = await run_in_threadpool(
+        process_assembly_stats.delay,
+        strain_id=strain_id,
+        owner_id=first_user.id,
+        bucket=S3_BUCKET_NAME,
+        object_key=object_key,
+        filename=file.filename,
+        analysis_type_str="assembly_stats",
+        content_hash=content_hash,
+        genome_size=expected_genome_size
+    )
+    return {"message": "Análisis de estadísticas de ensamblaje iniciado", "task_id": task.id}
+
+@router.post("/upload/kmer_spectrum", status_code=status.HTTP_202_ACCEPTED)
+async def upload_and_analyze_kmer_spectrum(
+    strain_id: int = Form(...),
+    k: int = Form(21),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Endpoint para subir un archivo FASTA o FASTQ y calcular su espectro de
+    k-meros (histograma de abundancias y estimación del tamaño del genoma).
+    """
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
+        raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
+    file_format = detect_sequence_format(file.filename)
+    if not 1 <= k <= MAX_K:
+        raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {MAX_K}.")
+    object_key, content_hash = await store_upload_in_thread(db, s3_client, file, file_format)
+
+    first_user = await run_in_threadpool(db.query(models.User).first)
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    cached = await run_in_threadpool(
+        create_analysis_from_cache, db, content_hash, "kmer_spectrum", cache_parameters(file_format=file_format, k=k),
+        strain_id, first_user.id, file.filename, object_key
+    )
+    if cached:
+        return cached
+
+    task = await run_in_threadpool(
+        process_kmer_spectrum.delay,
+        strain_id=strain_id,
+        owner_id=first_user.id,
+        bucket=S3_BUCKET_NAME,
+        object_key=object_key,
+        filename=file.filename,
+        analysis_type_str="kmer_spectrum",
+        content_hash=content_hash,
+        file_format=file_format,
+        k=k
+    )
+    return {"message": "Análisis de espectro de k-meros iniciado", "task_id": task.id}
+
+@router.post("/upload/fasta_profile", status_code=status.HTTP_202_ACCEPTED)
+async def upload_and_profile_fasta(
+    strain_id: int = Form(...),
+    metrics: str = Form(",".join(FASTA_PROFILE_METRICS)),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Endpoint para subir un archivo FASTA y calcular varias métricas en una sola pasada.
+
+    metrics es una lista separada por comas de: count, gc_content, lengths, assembly.
+    Se guarda un análisis por cada conjunto de métricas pedido.
+    """
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
+        raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
+    validate_file_extension_for_analysis_type(file.filename, 'fasta')
     try:
-        s3_client.upload_fileobj(file.file, S3_BUCKET_NAME, object_key)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir el archivo a MinIO: {e}")
+        requested_metrics = parse_metrics(metrics, FASTA_PROFILE_METRICS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    object_key, _ = await store_upload_in_thread(db, s3_client, file, 'fasta')
 
-    first_user = db.query(models.User).first()
+    first_user = await run_in_threadpool(db.query(models.User).first)
     if not first_user:
         raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
 
-    task = process_gff_stats.delay(
+    task = await run_in_threadpool(
+        process_fasta_profile.delay,
         strain_id=strain_id,
         owner_id=first_user.id,
         bucket=S3_BUCKET_NAME,
         object_key=object_key,
-        analysis_type_str="gff_stats"
+        filename=file.filename,
+        metrics=requested_metrics
     )
-    return {"message": "Análisis de estadísticas GFF iniciado", "task_id": task.id}
+    return {"message": "Perfil FASTA iniciado", "task_id": task.id, "metrics": requested_metrics}
+
+@router.post("/upload/fastq_profile", status_code=status.HTTP_202_ACCEPTED)
+async def upload_and_profile_fastq(
+    strain_id: int = Form(...),
+    metrics: str = Form(",".join(FASTQ_PROFILE_METRICS)),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Endpoint para subir un archivo FASTQ y calcular varias métricas en una sola pasada.
+
+    metrics es una lista separada por comas de: stats, lengths, quality_profile.
+    Se guarda un análisis por cada conjunto de métricas pedido.
+    """
+    if not await run_in_threadpool(crud.get_strain, db, strain_id=strain_id):
+        raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
+    validate_file_extension_for_analysis_type(file.filename, 'fastq')
+    try:
+        requested_metrics = parse_metrics(metrics, FASTQ_PROFILE_METRICS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    object_key, _ = await store_upload_in_thread(db, s3_client, file, 'fastq')
+
+    first_user = await run_in_threadpool(db.query(models.User).first)
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    task = await run_in_threadpool(
+        process_fastq_profile.delay,
+        strain_id=strain_id,
+        owner_id=first_user.id,
+        bucket=S3_BUCKET_NAME,
+        object_key=object_key,
+        filename=file.filename,
+        metrics=requested_metrics
+    )
+    return {"message": "Perfil FASTQ iniciado", "task_id": task.id, "metrics": requested_metrics}
+
+
+# --- Subidas directas a MinIO con URLs prefirmadas ---
+# Tipo de análisis -> (tarea, formato esperado del contenido, parámetros admitidos).
+# kmer_spectrum acepta FASTA o FASTQ según la extensión.
+DIRECT_UPLOAD_ANALYSES = {
+    "fasta_count": (process_fasta_count, 'fasta', set()),
+    "fasta_gc_content": (process_fasta_gc_content, 'fasta', {"approximate"}),
+    "fastq_stats": (process_fastq_stats, 'fastq', {"approximate"}),
+    "genbank_stats": (process_genbank_stats, 'genbank', set()),
+    "gff_stats": (process_gff_stats, 'gff', {"deep_validation"}),
+    "assembly_stats": (process_assembly_stats, 'fasta', {"genome_size"}),
+    "kmer_spectrum": (process_kmer_spectrum, None, {"k"}),
+}
+
+def _direct_upload_parameters(request: Union[schemas.DirectUploadCreate, schemas.BatchUploadEntry]) -> dict:
+    """Valida los parámetros de una subida directa (o de un archivo de un lote) y añade los implícitos."""
+    _, expected_format, allowed = DIRECT_UPLOAD_ANALYSES[request.analysis_type]
+    unknown = set(request.parameters) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Parámetros no admitidos para {request.analysis_type}: {sorted(unknown)}")
+    parameters = dict(request.parameters)
+    for name in ("approximate", "deep_validation"):
+        if name in parameters and not isinstance(parameters[name], bool):
+            raise HTTPException(status_code=400, detail=f"El parámetro {name} debe ser true o false.")
+    if request.analysis_type == "kmer_spectrum":
+        k = parameters.setdefault("k", 21)
+        if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+            raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {MAX_K}.")
+        parameters["file_format"] = detect_sequence_format(request.filename)
+    else:
+        validate_file_extension_for_analysis_type(request.filename, expected_format)
+    genome_size = parameters.get("genome_size")
+    if genome_size is not None and (not isinstance(genome_size, int) or isinstance(genome_size, bool) or genome_size <= 0):
+        raise HTTPException(status_code=400, detail="El tamaño esperado del genoma debe ser positivo.")
+    return parameters
+
+@router.post("/uploads", status_code=status.HTTP_201_CREATED)
+def create_direct_upload(
+    request: schemas.DirectUploadCreate,
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client),
+    presign_client = Depends(get_presign_client)
+):
+    """
+    Inicia una subida multiparte directa a MinIO y devuelve una URL PUT
+    prefirmada por parte; los datos no pasan por la API.
+
+    El cliente sube cada parte (los bytes [(n - 1) * part_size, n * part_size)
+    del archivo) a su URL y después llama a /analysis/uploads/{id}/complete.
+    """
+    if request.analysis_type not in DIRECT_UPLOAD_ANALYSES:
+        raise HTTPException(status_code=400, detail=f"Tipo de análisis no admitido. Tipos válidos: {sorted(DIRECT_UPLOAD_ANALYSES)}")
+    if not crud.get_strain(db, strain_id=request.strain_id):
+        raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
+    parameters = _direct_upload_parameters(request)
+    max_size_bytes = settings.MAX_UPLOAD_SIZE_MB * MB
+    if not 0 < request.size <= max_size_bytes:
+        raise HTTPException(status_code=400, detail=f"El tamaño del archivo debe estar entre 1 byte y {settings.MAX_UPLOAD_SIZE_MB}MB.")
+
+    first_user = db.query(models.User).first()
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    # Clave provisional: al completar la subida el archivo se hashea y se
+    # lleva a su clave direccionada por contenido
+    object_key = staging_object_key()
+    part_size, part_count = plan_parts(request.size, settings.UPLOAD_PART_SIZE_MB * MB)
+    try:
+        s3_upload_id = s3_client.create_multipart_upload(Bucket=S3_BUCKET_NAME, Key=object_key)['UploadId']
+        part_urls = [
+            presign_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': S3_BUCKET_NAME, 'Key': object_key, 'UploadId': s3_upload_id, 'PartNumber': part_number},
+                ExpiresIn=settings.PRESIGNED_URL_EXPIRES_S
+            )
+            for part_number in range(1, part_count + 1)
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al iniciar la subida en MinIO: {e}")
 
+    upload = crud.create_direct_upload(
+        db,
+        id=str(uuid.uuid4()),
+        strain_id=request.strain_id,
+        owner_id=first_user.id,
+        analysis_type=request.analysis_type,
+        parameters=parameters,
+        filename=request.filename,
+        bucket=S3_BUCKET_NAME,
+        object_key=object_key,
+        s3_upload_id=s3_upload_id,
+        size=request.size,
+        part_size=part_size,
+        part_count=part_count
+    )
+    return {
+        "upload_id": upload.id,
+        "part_size": part_size,
+        "parts": [{"part_number": n, "url": url} for n, url in enumerate(part_urls, start=1)],
+        "expires_in": settings.PRESIGNED_URL_EXPIRES_S
+    }
+
+def _list_uploaded_parts(s3_client, upload: models.DirectUpload) -> list:
+    """Partes recibidas por MinIO de una subida multiparte (todas las páginas)."""
+    parts = []
+    marker = 0
+    while True:
+        response = s3_client.list_parts(
+            Bucket=upload.bucket, Key=upload.object_key, UploadId=upload.s3_upload_id, PartNumberMarker=marker
+        )
+        parts.extend({'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in response.get('Parts', []))
+        if not response.get('IsTruncated'):
+            return parts
+        marker = response['NextPartNumberMarker']
+
+def _hash_uploaded_object(s3_client, bucket: str, object_key: str, expected_size: int, expected_format: str = None):
+    """
+    Comprueba un objeto subido por el cliente y calcula su SHA-256 leyéndolo
+    de MinIO por bloques: su tamaño con head_object y, si se indica, el
+    formato de su primer bloque.
+
+    Returns:
+        Tupla (hash SHA-256 hexadecimal, mensaje de error); el hash es None
+        si el objeto no es válido y el mensaje es None si lo es
+    """
+    try:
+        size = s3_client.head_object(Bucket=bucket, Key=object_key)['ContentLength']
+        if size != expected_size:
+            return None, f"El archivo subido tiene {size} bytes; se esperaban {expected_size}."
+        validator = UploadValidator(
+            s3_client.get_object(Bucket=bucket, Key=object_key)['Body'], expected_format,
+            settings.MAX_UPLOAD_SIZE_MB * MB
+        )
+        validator.drain()
+    except HTTPException as e:
+        return None, e.detail
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al comprobar el archivo en MinIO: {e}")
+    return validator.hexdigest(), None
+
+def _enqueue_uploaded_analysis(analysis_type: str, parameters: dict, strain_id: int, owner_id: int,
+                               bucket: str, object_key: str, filename: str, content_hash: str = None):
+    """Encola la tarea de DIRECT_UPLOAD_ANALYSES de un archivo ya guardado en MinIO."""
+    task_fn, _, _ = DIRECT_UPLOAD_ANALYSES[analysis_type]
+    return task_fn.delay(
+        strain_id=strain_id,
+        owner_id=owner_id,
+        bucket=bucket,
+        object_key=object_key,
+        analysis_type_str=analysis_type,
+        filename=filename,
+        content_hash=content_hash,
+        **parameters
+    )
+
+def _start_uploaded_analysis(db: Session, analysis_type: str, parameters: dict, strain_id: int, owner_id: int,
+                             filename: str, object_key: str, content_hash: str) -> dict:
+    """
+    Crea el análisis de un archivo ya guardado bajo su clave por contenido
+    desde la caché de resultados o, si no hay acierto, encola su tarea.
+
+    Returns:
+        Diccionario con task_id y analysis_id (uno de los dos es None)
+    """
+    cache_key = result_cache_key(analysis_type, parameters)
+    if cache_key is not None:
+        cached = create_analysis_from_cache(
+            db, content_hash, analysis_type, cache_key, strain_id, owner_id, filename, object_key
+        )
+        if cached:
+            return {"task_id": None, "analysis_id": cached["analysis_id"]}
+    task = _enqueue_uploaded_analysis(
+        analysis_type, parameters, strain_id, owner_id, S3_BUCKET_NAME, object_key, filename, content_hash
+    )
+    return {"task_id": task.id, "analysis_id": None}
+
+def _direct_upload_response(upload: models.DirectUpload, message: str) -> dict:
+    return {
+        "message": message,
+        "upload_id": upload.id,
+        "task_id": upload.task_id,
+        "analysis_id": upload.analysis_id,
+    }
+
+def _ingest_pending(upload: models.DirectUpload) -> bool:
+    """Indica si la tarea ingest_direct_upload de una subida unida sigue en curso (o ya creó su análisis)."""
+    if upload.task_id is None:
+        return False
+    task = celery_app.AsyncResult(upload.task_id)
+    if task.state == 'FAILURE':
+        return False
+    return not (task.state == 'SUCCESS' and isinstance(task.result, dict) and task.result.get("status") == "FAILED")
+
+@router.post("/uploads/{upload_id}/complete", status_code=status.HTTP_202_ACCEPTED)
+def complete_direct_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Completa una subida directa: cierra la subida multiparte y encola
+    ingest_direct_upload, que comprueba el objeto (tamaño y formato), lo
+    hashea, lo lleva a su clave direccionada por contenido y crea el análisis
+    desde la caché o se sustituye por su tarea. El task_id devuelto es el del
+    análisis. Los datos no pasan por la API.
+
+    Repetir la llamada devuelve la misma tarea, o vuelve a encolarla si
+    falló antes de terminar.
+    """
+    upload = crud.get_direct_upload(db, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Subida no encontrada.")
+    if upload.status == "completed":
+        return _direct_upload_response(upload, "La subida ya se había completado")
+    if upload.status == "failed":
+        raise HTTPException(status_code=409, detail="La subida falló; iníciala de nuevo.")
+    if upload.status == "uploaded" and _ingest_pending(upload):
+        return _direct_upload_response(upload, "Subida completada; análisis iniciado")
+
+    if upload.status == "pending":
+        try:
+            parts = _list_uploaded_parts(s3_client, upload)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al consultar la subida en MinIO: {e}")
+        missing = sorted(set(range(1, upload.part_count + 1)) - {p['PartNumber'] for p in parts})
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Faltan partes por subir: {missing[:20]}")
+
+        try:
+            s3_client.complete_multipart_upload(
+                Bucket=upload.bucket, Key=upload.object_key, UploadId=upload.s3_upload_id,
+                MultipartUpload={'Parts': sorted(parts, key=lambda p: p['PartNumber'])}
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al completar la subida en MinIO: {e}")
+
+    task_fn, expected_format, _ = DIRECT_UPLOAD_ANALYSES[upload.analysis_type]
+    task = ingest_direct_upload.delay(
+        upload_id=upload.id,
+        analysis_task=task_fn.name,
+        expected_format=upload.parameters.get("file_format", expected_format)
+    )
+    crud.update_direct_upload_status(db, upload, "uploaded", task_id=task.id)
+    return _direct_upload_response(upload, "Subida completada; análisis iniciado")
+
+# --- Subidas reanudables por fragmentos ---
+# Protocolo al estilo tus: se crea una sesión, se envían los fragmentos
+# numerados (cada uno es una parte de una subida multiparte de MinIO) en
+# cualquier orden y tantas veces como haga falta, se consulta qué fragmentos
+# faltan y se completa. El estado de la sesión vive en Redis.
+
+def _resumable_session(sessions, upload_id: str) -> dict:
+    session = sessions.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Subida no encontrada o caducada.")
+    return session
+
+def _chunk_length(session: dict, chunk_number: int) -> int:
+    """Bytes que debe tener un fragmento (el último puede ser más corto)."""
+    if chunk_number < session["chunk_count"]:
+        return session["chunk_size"]
+    return session["size"] - (session["chunk_count"] - 1) * session["chunk_size"]
+
+@router.post("/resumable", status_code=status.HTTP_201_CREATED)
+def create_resumable_upload(
+    request: schemas.ResumableUploadCreate,
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client),
+    sessions = Depends(get_upload_session_store)
+):
+    """
+    Crea una sesión de subida reanudable.
+
+    Con analysis_type raw_file (por defecto) el archivo sólo se guarda; con
+    un tipo de /analysis/uploads se encola su análisis al completar.
+    """
+    if not crud.get_strain(db, strain_id=request.strain_id):
+        raise HTTPException(status_code=404, detail="La cepa especificada no existe.")
+    if request.analysis_type in DIRECT_UPLOAD_ANALYSES:
+        parameters = _direct_upload_parameters(request)
+    else:
+        validate_raw_file_extension(request.filename)
+        if request.parameters:
+            raise HTTPException(status_code=400, detail="Las subidas sin análisis no admiten parámetros.")
+        parameters = {}
+    if not 0 < request.size <= settings.MAX_UPLOAD_SIZE_MB * MB:
+        raise HTTPException(status_code=400, detail=f"El tamaño del archivo debe estar entre 1 byte y {settings.MAX_UPLOAD_SIZE_MB}MB.")
+
+    first_user = db.query(models.User).first()
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    object_key = staging_object_key()
+    chunk_size, chunk_count = plan_parts(request.size, settings.RESUMABLE_CHUNK_SIZE_MB * MB)
+    try:
+        s3_upload_id = s3_client.create_multipart_upload(Bucket=S3_BUCKET_NAME, Key=object_key)['UploadId']
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al iniciar la subida en MinIO: {e}")
+
+    session = sessions.create({
+        "id": str(uuid.uuid4()),
+        "strain_id": request.strain_id,
+        "owner_id": first_user.id,
+        "analysis_type": request.analysis_type,
+        "parameters": parameters,
+        "filename": request.filename,
+        "bucket": S3_BUCKET_NAME,
+        "object_key": object_key,
+        "s3_upload_id": s3_upload_id,
+        "size": request.size,
+        "chunk_size": chunk_size,
+        "chunk_count": chunk_count,
+    })
+    return {
+        "upload_id": session["id"],
+        "chunk_size": chunk_size,
+        "chunk_count": chunk_count,
+        "expires_after_inactive_s": sessions.ttl_seconds
+    }
+
+@router.put("/resumable/{upload_id}/chunks/{chunk_number}")
+async def upload_resumable_chunk(
+    upload_id: str,
+    chunk_number: int,
+    request: Request,
+    s3_client = Depends(get_s3_client),
+    sessions = Depends(get_upload_session_store)
+):
+    """
+    Recibe el fragmento chunk_number (desde 1) en el cuerpo de la petición:
+    los bytes [(n - 1) * chunk_size, n * chunk_size) del archivo.
+
+    Si se envía la cabecera Content-MD5 se comprueba; MinIO verifica además
+    el MD5 de la parte. Reenviar un fragmento sustituye al anterior.
+    """
+    session = await run_in_threadpool(_resumable_session, sessions, upload_id)
+    if not 1 <= chunk_number <= session["chunk_count"]:
+        raise HTTPException(status_code=400, detail=f"El fragmento debe estar entre 1 y {session['chunk_count']}.")
+
+    # Se comprueba el tamaño declarado antes de leer el cuerpo, que se guarda en memoria
+    expected_length = _chunk_length(session, chunk_number)
+    content_length = request.headers.get("content-length")
+    if content_length is None:
+        raise HTTPException(status_code=status.HTTP_411_LENGTH_REQUIRED, detail="Falta la cabecera Content-Length.")
+    if not content_length.isdigit() or int(content_length) != expected_length:
+        raise HTTPException(status_code=400, detail=f"El fragmento {chunk_number} debe tener {expected_length} bytes; Content-Length es {content_length}.")
+    data = await request.body()
+    if len(data) != expected_length:
+        raise HTTPException(status_code=400, detail=f"El fragmento {chunk_number} debe tener {expected_length} bytes; se recibieron {len(data)}.")
+    content_md5 = base64.b64encode(hashlib.md5(data).digest()).decode()
+    if request.headers.get("content-md5", content_md5) != content_md5:
+        raise HTTPException(status_code=400, detail="El MD5 del fragmento no coincide con la cabecera Content-MD5.")
+
+    try:
+        response = await run_in_threadpool(
+            s3_client.upload_part,
+            Bucket=session["bucket"], Key=session["object_key"], UploadId=session["s3_upload_id"],
+            PartNumber=chunk_number, Body=data, ContentMD5=content_md5
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar el fragmento en MinIO: {e}")
+    await run_in_threadpool(sessions.record_part, upload_id, chunk_number, response['ETag'])
+    return {"upload_id": upload_id, "chunk_number": chunk_number, "received_bytes": len(data)}
+
+@router.get("/resumable/{upload_id}")
+def get_resumable_upload(upload_id: str, sessions = Depends(get_upload_session_store)):
+    """
+    Estado de una subida reanudable: fragmentos recibidos y pendientes y
+    offset (bytes contiguos recibidos desde el inicio) para continuar.
+    """
+    session = _resumable_session(sessions, upload_id)
+    received = sorted(sessions.parts(upload_id))
+    missing = sorted(set(range(1, session["chunk_count"] + 1)) - set(received))
+    offset = (missing[0] - 1) * session["chunk_size"] if missing else session["size"]
+    return {
+        "upload_id": upload_id,
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "chunk_count": session["chunk_count"],
+        "received_chunks": received,
+        "missing_chunks": missing,
+        "bytes_received": sum(_chunk_length(session, n) for n in received),
+        "offset": offset
+    }
+
+def _complete_resumable_upload(db: Session, s3_client, sessions, upload_id: str) -> dict:
+    """
+    Pasos de complete_resumable_upload; cada uno guarda su avance en la
+    sesión, que sólo se borra al terminar (o si el archivo no es válido).
+    """
+    session = _resumable_session(sessions, upload_id)
+    bucket, staging_key = session["bucket"], session["object_key"]
+    if not session.get("assembled"):
+        parts = sessions.parts(upload_id)
+        missing = sorted(set(range(1, session["chunk_count"] + 1)) - set(parts))
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Faltan fragmentos por subir: {missing[:20]}")
+        try:
+            s3_client.complete_multipart_upload(
+                Bucket=bucket, Key=staging_key, UploadId=session["s3_upload_id"],
+                MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': parts[n]} for n in sorted(parts)]}
+            )
+        except ClientError as e:
+            # NoSuchUpload: una llamada anterior unió las partes pero no llegó a
+            # anotarlo; el objeto se comprueba igualmente en el paso siguiente
+            if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                raise HTTPException(status_code=500, detail=f"Error al completar la subida en MinIO: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al completar la subida en MinIO: {e}")
+        session = sessions.update(upload_id, assembled=True)
+
+    analysis_type, parameters = session["analysis_type"], session["parameters"]
+    expected_format = None
+    if analysis_type in DIRECT_UPLOAD_ANALYSES:
+        expected_format = parameters.get("file_format", DIRECT_UPLOAD_ANALYSES[analysis_type][1])
+    if not session.get("content_hash"):
+        content_hash, error = _hash_uploaded_object(s3_client, bucket, staging_key, session["size"], expected_format)
+        if error:
+            delete_staged_object(s3_client, staging_key)
+            sessions.delete(upload_id)
+            raise HTTPException(status_code=400, detail=error)
+        stored_key = promote_staged_upload(db, s3_client, staging_key, content_hash, session["size"])
+        session = sessions.update(upload_id, content_hash=content_hash, stored_key=stored_key)
+        delete_staged_object(s3_client, staging_key)
+    object_key, content_hash = session["stored_key"], session["content_hash"]
+
+    if expected_format is None:
+        created_analysis, file_url = create_raw_analysis(
+            db, analysis_type, session["strain_id"], session["owner_id"],
+            session["filename"], session["size"], bucket, object_key
+        )
+        response = {"message": "Archivo subido exitosamente", "upload_id": upload_id,
+                    "analysis_id": created_analysis.id, "file_url": file_url}
+    else:
+        started = _start_uploaded_analysis(
+            db, analysis_type, parameters, session["strain_id"], session["owner_id"],
+            session["filename"], object_key, content_hash
+        )
+        message = "Resultados obtenidos de la caché" if started["task_id"] is None else "Subida completada; análisis iniciado"
+        response = {"message": message, "upload_id": upload_id, **started}
+    sessions.delete(upload_id)
+    return response
+
+@router.post("/resumable/{upload_id}/complete", status_code=status.HTTP_202_ACCEPTED)
+async def complete_resumable_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client),
+    sessions = Depends(get_upload_session_store)
+):
+    """
+    Completa una subida reanudable: une los fragmentos en MinIO, comprueba y
+    hashea el objeto, lo lleva a su clave direccionada por contenido y crea
+    su análisis (desde la caché o encolando su tarea) o, en las subidas sin
+    análisis, su registro. Si falla un paso, repetir la llamada continúa
+    desde ahí. Se ejecuta en un hilo del limitador de subidas.
+    """
+    return await anyio.to_thread.run_sync(
+        functools.partial(_complete_resumable_upload, db, s3_client, sessions, upload_id),
+        limiter=get_upload_limiter()
+    )
+
+@router.delete("/resumable/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_resumable_upload(
+    upload_id: str,
+    s3_client = Depends(get_s3_client),
+    sessions = Depends(get_upload_session_store)
+):
+    """Cancela una subida reanudable y borra sus fragmentos de MinIO."""
+    session = _resumable_session(sessions, upload_id)
+    try:
+        s3_client.abort_multipart_upload(Bucket=session["bucket"], Key=session["object_key"], UploadId=session["s3_upload_id"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cancelar la subida en MinIO: {e}")
+    sessions.delete(upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+# --- Subidas por lotes ---
+def _batch_files(files: List[UploadFile], filenames: set):
+    """
+    Archivos del lote por nombre. Los paquetes .zip/.tar cuyo nombre no está
+    en el manifiesto se sustituyen por sus miembros (nombrados por su ruta
+    dentro del paquete). Un miembro que no está en el manifiesto o repetido
+    se rechaza antes de extraerlo, y la extracción se corta al superar
+    BATCH_MAX_FILES miembros o BATCH_MAX_EXTRACTED_MB en total.
+
+    Returns:
+        Tupla (diccionario {nombre: UploadFile}, miembros extraídos a cerrar)
+    """
+    by_name, extracted = {}, []
+
+    def accept(name: str) -> None:
+        if name not in filenames:
+            raise ArchiveError(f"el archivo {name} no está en el manifiesto")
+        if name in by_name:
+            raise ArchiveError(f"el archivo {name} aparece más de una vez en el lote")
+
+    try:
+        for file in files:
+            members = [file]
+            if is_archive(file.filename) and file.filename not in filenames:
+                members = []
+                try:
+                    for name, member, size in iter_members(
+                        file.file, file.filename, settings.MAX_UPLOAD_SIZE_MB * MB, accept=accept,
+                        max_members=settings.BATCH_MAX_FILES - len(by_name),
+                        max_total_size=settings.BATCH_MAX_EXTRACTED_MB * MB - sum(m.size for m in extracted)
+                    ):
+                        members.append(UploadFile(member, size=size, filename=name))
+                        extracted.append(members[-1])
+                        by_name[name] = members[-1]
+                except ArchiveError as e:
+                    raise HTTPException(status_code=400, detail=f"{file.filename}: {e}")
+                continue
+            if file.filename in by_name:
+                raise HTTPException(status_code=400, detail=f"El archivo {file.filename} aparece más de una vez en el lote.")
+            by_name[file.filename] = file
+    except HTTPException:
+        for member in extracted:
+            member.file.close()
+        raise
+    return by_name, extracted
+
+async def _run_batch_step(func, calls: list, filenames: list) -> list:
+    """
+    Ejecuta func(*args) para cada elemento de calls en hilos del limitador de
+    subidas, todos a la vez. Un archivo que falla no interrumpe a los demás.
+
+    Returns:
+        Resultado de cada llamada, en el mismo orden, o la HTTPException con
+        la que falló (con el nombre del archivo en el detalle)
+    """
+    outcomes = [None] * len(calls)
+
+    async def run(index, args):
+        try:
+            outcomes[index] = await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=get_upload_limiter())
+        except HTTPException as e:
+            outcomes[index] = HTTPException(status_code=e.status_code, detail=f"{filenames[index]}: {e.detail}")
+        except Exception as e:
+            outcomes[index] = HTTPException(status_code=500, detail=f"{filenames[index]}: {e}")
+
+    async with anyio.create_task_group() as task_group:
+        for index, args in enumerate(calls):
+            task_group.start_soon(run, index, args)
+    return outcomes
+
+async def store_batch_uploads(db: Session, s3_client, uploads: list) -> list:
+    """
+    Guarda varios archivos como store_upload, validándolos, hasheándolos y
+    subiéndolos a MinIO (cada uno en partes) en paralelo, hasta
+    UPLOAD_INGEST_CONCURRENCY a la vez. Después se llevan a su clave por
+    contenido en serie, porque la sesión de la BD no admite uso concurrente;
+    el contenido repetido dentro del lote se guarda una vez.
+
+    Cada archivo se registra en cuanto se copia a su clave por contenido, y
+    las claves provisionales se borran aunque el lote falle.
+
+    Args:
+        uploads: Lista de tuplas (UploadFile, formato esperado o None)
+
+    Returns:
+        Lista de tuplas (clave del objeto, hash SHA-256) en el mismo orden
+
+    Raises:
+        HTTPException: La del primer archivo que falle, con su nombre
+    """
+    filenames = [file.filename for file, _ in uploads]
+    outcomes = await _run_batch_step(
+        stage_upload, [(s3_client, file, expected_format) for file, expected_format in uploads], filenames
+    )
+    staged = [outcome for outcome in outcomes if not isinstance(outcome, HTTPException)]
+
+    def promote_all():
+        stored = []
+        for filename, (staging_key, content_hash, size) in zip(filenames, staged):
+            try:
+                stored.append((promote_staged_upload(db, s3_client, staging_key, content_hash, size), content_hash))
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{filename}: {e.detail}")
+        return stored
+
+    def delete_all():
+        for staging_key, _, _ in staged:
+            delete_staged_object(s3_client, staging_key)
+
+    try:
+        for outcome in outcomes:
+            if isinstance(outcome, HTTPException):
+                raise outcome
+        return await run_in_threadpool(promote_all)
+    finally:
+        await run_in_threadpool(delete_all)
+
+def _plan_batch_tasks(db: Session, plans: list, stored: list, owner_id: int):
+    """
+    Crea los análisis de los archivos con resultados en la caché y prepara la
+    firma de la tarea de los demás (con su task_id ya asignado).
+
+    Returns:
+        Tupla (entradas del lote, firmas de las tareas a encolar)
+    """
+    entries, signatures = [], []
+    for (entry, task_fn, _, parameters), (object_key, content_hash) in zip(plans, stored):
+        record = {
+            "filename": entry.filename,
+            "strain_id": entry.strain_id,
+            "analysis_type": entry.analysis_type,
+            "object_key": object_key,
+            "task_id": None,
+            "analysis_id": None,
+        }
+        entries.append(record)
+        cache_key = result_cache_key(entry.analysis_type, parameters)
+        if cache_key is not None:
+            cached = create_analysis_from_cache(
+                db, content_hash, entry.analysis_type, cache_key,
+                entry.strain_id, owner_id, entry.filename, object_key
+            )
+            if cached:
+                record["analysis_id"] = cached["analysis_id"]
+                continue
+        record["task_id"] = str(uuid.uuid4())
+        signatures.append(task_fn.s(
+            strain_id=entry.strain_id,
+            owner_id=owner_id,
+            bucket=S3_BUCKET_NAME,
+            object_key=object_key,
+            filename=entry.filename,
+            analysis_type_str=entry.analysis_type,
+            content_hash=content_hash,
+            **parameters
+        ).set(task_id=record["task_id"]))
+    return entries, signatures
+
+def dispatch_upload_batch(batch_id: str, signatures: list):
+    """
+    Encola las tareas del lote como un grupo de Celery dentro de un chord cuyo
+    callback guarda el resumen del lote al terminar todas.
+    """
+    callback = finalize_upload_batch.s(batch_id=batch_id)
+    if not signatures:
+        # Todo salió de la caché: sólo queda guardar el resumen
+        return callback.delay([])
+    return chord(group(signatures))(callback)
+
+@router.post("/upload/batch", status_code=status.HTTP_202_ACCEPTED)
+async def upload_batch(
+    manifest: str = Form(...),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Sube varios archivos (o los miembros de paquetes .zip/.tar) y lanza todos
+    sus análisis juntos.
+
+    manifest es un JSON {"entries": [{"filename", "strain_id", "analysis_type",
+    "parameters"}]} con una entrada por archivo; analysis_type es uno de los
+    tipos de las subidas directas. Los archivos se guardan en MinIO en
+    paralelo, los resultados en caché se reutilizan y el resto de análisis se
+    encolan como un chord de Celery que guarda el resumen del lote. El
+    progreso se consulta en /analysis/upload/batch/{batch_id}.
+    """
+    try:
+        entries = schemas.BatchUploadManifest.model_validate_json(manifest).entries
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Manifiesto no válido: {e}")
+    filenames = [entry.filename for entry in entries]
+    if not entries:
+        raise HTTPException(status_code=400, detail="El manifiesto no tiene entradas.")
+    if len(entries) > settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Un lote admite como máximo {settings.BATCH_MAX_FILES} archivos.")
+    if len(set(filenames)) != len(filenames):
+        raise HTTPException(status_code=400, detail="El manifiesto repite nombres de archivo.")
+
+    plans = []
+    for entry in entries:
+        if entry.analysis_type not in DIRECT_UPLOAD_ANALYSES:
+            raise HTTPException(status_code=400, detail=f"{entry.filename}: tipo de análisis no admitido. Tipos admitidos: {sorted(DIRECT_UPLOAD_ANALYSES)}")
+        parameters = _direct_upload_parameters(entry)
+        task_fn, expected_format, _ = DIRECT_UPLOAD_ANALYSES[entry.analysis_type]
+        plans.append((entry, task_fn, expected_format or parameters.get("file_format"), parameters))
+
+    strain_ids = {entry.strain_id for entry in entries}
+    existing = await run_in_threadpool(
+        lambda: {strain.id for strain in db.query(models.Strain.id).filter(models.Strain.id.in_(strain_ids))}
+    )
+    if strain_ids - existing:
+        raise HTTPException(status_code=404, detail=f"Las cepas {sorted(strain_ids - existing)} no existen.")
+    first_user = await run_in_threadpool(db.query(models.User).first)
+    if not first_user:
+        raise HTTPException(status_code=500, detail="No hay usuarios en la base de datos para asociar el análisis.")
+
+    by_name, extracted = await run_in_threadpool(_batch_files, files, set(filenames))
+    try:
+        missing = set(filenames) - set(by_name)
+        unexpected = set(by_name) - set(filenames)
+        if missing or unexpected:
+            raise HTTPException(status_code=400, detail=f"Los archivos no coinciden con el manifiesto. Faltan: {sorted(missing)}; sobran: {sorted(unexpected)}")
+        stored = await store_batch_uploads(
+            db, s3_client, [(by_name[entry.filename], expected_format) for entry, _, expected_format, _ in plans]
+        )
+    finally:
+        for member in extracted:
+            member.file.close()
+
+    batch_id = str(uuid.uuid4())
+    batch_entries, signatures = await run_in_threadpool(_plan_batch_tasks, db, plans, stored, first_user.id)
+    await run_in_threadpool(crud.create_upload_batch, db, id=batch_id, owner_id=first_user.id, entries=batch_entries)
+    try:
+        await run_in_threadpool(dispatch_upload_batch, batch_id, signatures)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al encolar los análisis del lote: {e}")
+    return {
+        "message": "Lote de análisis iniciado",
+        "batch_id": batch_id,
+        "total": len(batch_entries),
+        "queued": len(signatures),
+        "cached": len(batch_entries) - len(signatures),
+    }
+
+def _batch_task_progress(task_id: str) -> dict:
+    """Estado y progreso (0-100) de la tarea de un archivo del lote."""
+    task = celery_app.AsyncResult(task_id)
+    state = task.state
+    if state == 'SUCCESS':
+        result = task.result if isinstance(task.result, dict) else {}
+        if result.get("status") == "FAILED":
+            return {"state": "FAILED", "progress": 100, "error": result.get("error")}
+        return {"state": state, "progress": 100, "analysis_id": result.get("analysis_id")}
+    if state == 'FAILURE':
+        return {"state": "FAILED", "progress": 100, "error": str(task.info)}
+    if state == 'PROGRESS':
+        return {"state": state, "progress": (task.info or {}).get("progress") or 0}
+    return {"state": state, "progress": 0}
+
+@router.get("/upload/batch/{batch_id}")
+def get_upload_batch_status(batch_id: str, db: Session = Depends(get_db)):
+    """
+    Progreso agregado de un lote: estado y progreso de cada archivo (los de
+    la caché cuentan como terminados) y su media. Cuando el callback del
+    chord ha guardado el resumen, se incluye y ya no se consulta Celery.
+    """
+    batch = crud.get_upload_batch(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lote no encontrado.")
+
+    failed_tasks = {failure["task_id"] for failure in (batch.summary or {}).get("failures", [])}
+    files = []
+    for entry in batch.entries:
+        if not entry.get("task_id"):
+            progress = {"state": "CACHED", "progress": 100}
+        elif batch.status == "completed":
+            progress = {"state": "FAILED" if entry["task_id"] in failed_tasks else "SUCCESS", "progress": 100}
+        else:
+            progress = _batch_task_progress(entry["task_id"])
+        files.append({**entry, **progress})
+
+    completed = sum(1 for item in files if item["state"] in ("SUCCESS", "CACHED"))
+    failed = sum(1 for item in files if item["state"] == "FAILED")
+    return {
+        "batch_id": batch.id,
+        "status": batch.status,
+        "total": len(files),
+        "completed": completed,
+        "failed": failed,
+        "pending": len(files) - completed - failed,
+        "progress": round(sum(item["progress"] for item in files) / len(files), 1) if files else 100.0,
+        "files": files,
+        "summary": batch.summary,
+    }
 
 def _format_results_to_text(analysis: models.Analysis) -> str:
     """
@@ -346,6 +1602,56 @@ def download_analysis_results_as_txt(
     return Response(content=text_content, media_type="text/plain", headers=headers)
 
 
+@router.get("/{analysis_id}/records")
+def get_analysis_records(
+    analysis_id: int,
+    offset: int = 0,
+    limit: int = 1000,
+    db: Session = Depends(get_db),
+    s3_client = Depends(get_s3_client)
+):
+    """
+    Devuelve una página de los resultados por registro de un análisis (GC y
+    longitud de cada secuencia, o la tabla de registros GenBank) en formato
+    columnar.
+
+    Los análisis grandes guardan estas columnas en MinIO (record_columns) y
+    sólo se leen los bytes de la página pedida; los pequeños las tienen en
+    los resultados (individual_gc_contents o records).
+    """
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"offset debe ser >= 0 y limit estar entre 1 y {MAX_PAGE_SIZE}.")
+    analysis = crud.get_analysis(db, analysis_id=analysis_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Análisis no encontrado.")
+
+    results = analysis.results or {}
+    pointer = results.get("record_columns")
+    if pointer:
+        record_count = pointer["record_count"]
+        try:
+            columns = read_record_columns(s3_client, pointer, offset, limit)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al leer los registros desde MinIO: {e}")
+    elif isinstance(results.get("individual_gc_contents"), list):
+        values = results["individual_gc_contents"]
+        record_count = len(values)
+        columns = {"gc_content": values[offset:offset + limit]}
+    elif isinstance(results.get("records"), list):
+        page = results["records"][offset:offset + limit]
+        record_count = len(results["records"])
+        columns = {name: [record[name] for record in page] for name in RECORD_COLUMNS}
+    else:
+        raise HTTPException(status_code=404, detail="El análisis no tiene resultados por registro.")
+
+    return {
+        "analysis_id": analysis_id,
+        "record_count": record_count,
+        "offset": offset,
+        "limit": limit,
+        "columns": columns,
+    }
+
 @router.get("/user/{user_id}/recent-analyses", response_model=List[schemas.Analysis])
 def get_recent_analyses_for_user(
     user_id: int,
@@ -368,14 +1674,29 @@ def get_recent_analyses_for_user(
 
     return user_analyses
 
+def _stream_body(body):
+    """Itera el cuerpo de un objeto de S3 por bloques y lo cierra al terminar."""
+    try:
+        yield from iter_chunks(body)
+    finally:
+        body.close()
+
 @router.get("/{analysis_id}/download")
 def download_analysis_file(
     analysis_id: int,
+    request: Request,
+    redirect: Optional[bool] = None,
     db: Session = Depends(get_db),
-    s3_client = Depends(get_s3_client)
+    s3_client = Depends(get_s3_client),
+    presign_client = Depends(get_presign_client)
 ):
     """
     Downloads the original file associated with a specific analysis from MinIO.
+
+    The object is streamed in chunks. Range and If-None-Match are passed on to
+    MinIO, so clients can resume or parallelize downloads and revalidate with
+    the ETag. With redirect=true (default: DOWNLOAD_PRESIGNED_REDIRECT) the
+    response is a redirect to a presigned MinIO URL instead.
     """
     # Fetch the analysis from the database
     analysis = crud.get_analysis(db, analysis_id=analysis_id)
@@ -386,35 +1707,66 @@ def download_analysis_file(
     if not analysis.file_url:
         raise HTTPException(status_code=404, detail="No se encontró la URL del archivo asociado al análisis.")
 
+    # URL format: http://minio:9000/genolab-bucket/objects/sha256/ab/abcdef...
     try:
-        # Parse the file URL to extract bucket and object key
-        # URL format: http://minio:9000/genolab-bucket/uploads/some-uuid-filename.fasta
-        url_parts = analysis.file_url.split('/')
-        if len(url_parts) < 5:  # Expected format: [protocol, '', host, bucket, key...]
-            raise HTTPException(status_code=500, detail="Formato de URL de archivo inválido.")
-
-        bucket_name = url_parts[3]  # Typically 'genolab-bucket'
-        object_key = '/'.join(url_parts[4:])  # Everything after the bucket name
-
-        # Get the file from MinIO
-        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-
-        # Get the file content
-        file_content = response['Body'].read()
+        bucket_name, object_key = parse_file_url(analysis.file_url)
+    except ValueError:
+        raise HTTPException(status_code=500, detail="Formato de URL de archivo inválido.")
+
+    # Original filename from the results (content-addressed keys don't include it)
+    original_filename = (analysis.results or {}).get("filename") or object_key.split('/')[-1]
+    content_disposition = f'attachment; filename="{original_filename}"'
+
+    if redirect if redirect is not None else settings.DOWNLOAD_PRESIGNED_REDIRECT:
+        url = presign_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket_name, 'Key': object_key, 'ResponseContentDisposition': content_disposition},
+            ExpiresIn=settings.PRESIGNED_URL_EXPIRES_S
+        )
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    params = {'Bucket': bucket_name, 'Key': object_key}
+    range_header = request.headers.get("range")
+    if range_header:
+        if not range_header.startswith("bytes=") or "," in range_header:
+            raise HTTPException(status_code=416, detail="Sólo se admite un rango de bytes (bytes=inicio-fin).")
+        params['Range'] = range_header
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        params['IfNoneMatch'] = if_none_match
 
-        # Extract original filename from object key
-        original_filename = object_key.split('/')[-1]
-
-        # Define headers for file download
-        headers = {
-            'Content-Disposition': f'attachment; filename="{original_filename}"',
-            'Content-Type': 'application/octet-stream'
-        }
-
-        # Return the file content as a response
-        return Response(content=file_content, headers=headers)
-
-    except s3_client.exceptions.NoSuchKey:
-        raise HTTPException(status_code=404, detail="El archivo no se encuentra en MinIO.")
+    try:
+        response = s3_client.get_object(**params)
+    except ClientError as e:
+        code = str(e.response.get("Error", {}).get("Code"))
+        if code in ("304", "NotModified"):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': if_none_match})
+        if code in ("NoSuchKey", "404"):
+            raise HTTPException(status_code=404, detail="El archivo no se encuentra en MinIO.")
+        if code in ("InvalidRange", "416"):
+            raise HTTPException(status_code=416, detail="Rango de bytes fuera del archivo.")
+        raise HTTPException(status_code=500, detail=f"Error al descargar el archivo: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al descargar el archivo: {str(e)}")
+
+    # Define headers for file download
+    headers = {
+        'Content-Disposition': content_disposition,
+        'Accept-Ranges': 'bytes',
+    }
+    if response.get('ContentLength') is not None:
+        headers['Content-Length'] = str(response['ContentLength'])
+    if response.get('ETag'):
+        headers['ETag'] = response['ETag']
+    status_code = status.HTTP_200_OK
+    if response.get('ContentRange'):
+        headers['Content-Range'] = response['ContentRange']
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+
+    # Stream the object instead of loading it into memory
+    return StreamingResponse(
+        _stream_body(response['Body']),
+        status_code=status_code,
+        headers=headers,
+        media_type='application/octet-stream'
+    )
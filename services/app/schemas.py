@@ -40,6 +40,28 @@ class AnalysisCreate(AnalysisBase):
     strain_id: int
     file_url: str
 
+class DirectUploadCreate(BaseModel):
+    strain_id: int
+    analysis_type: str
+    filename: str
+    size: int
+    # Parámetros del análisis (p. ej. {"k": 21} para kmer_spectrum)
+    parameters: dict = {}
+
+class ResumableUploadCreate(DirectUploadCreate):
+    # raw_file: sólo se guarda el archivo, sin análisis
+    analysis_type: str = "raw_file"
+
+class BatchUploadEntry(BaseModel):
+    # Nombre del archivo subido o ruta del miembro dentro de un .zip/.tar
+    filename: str
+    strain_id: int
+    analysis_type: str
+    parameters: dict = {}
+
+class BatchUploadManifest(BaseModel):
+    entries: List[BatchUploadEntry]
+
 # --- ESQUEMAS PARA LA ACTUALIZACIÓN DE DATOS (INPUT) ---
 
 class OrganismUpdate(BaseModel):
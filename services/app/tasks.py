@@ -1,9 +1,8 @@
 import io
-import boto3
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from Bio import SeqIO
+from fastapi import HTTPException
 from BCBio import GFF # Necesario para gff_stats
-import numpy as np # Necesario para cálculos estadísticos como la media
 from collections import Counter # Necesario para gff_stats
 import logging # <- Añadido
 import traceback # <- Añadido
@@ -12,18 +11,33 @@ from .celery_worker import celery_app
 from . import crud, schemas
 from .database import SessionLocal # Necesario para crear sesiones de DB dentro de las tareas
 from .core.config import settings # Import settings
+from .core.streams import iter_chunks, DEFAULT_CHUNK_SIZE
+from .core.compression import open_body, detect_compression, decompress, open_decompressed
+from .core.fasta_engine import gc_content_results
+from .core.fastq_engine import fastq_stats_results
+from .core.parallel import scan_stream, parallel_scan, can_spawn_processes
+from .core.sampling import sample_ranges, sample_prefix
+from .core.progress import ProgressReporter, ProgressStream
+from .core.sidecar import write_record_columns
+from .core.result_cache import ENGINE_VERSIONS, cache_parameters, cacheable_results, result_cache_key
+from .core.hashing import HashingReader
+from .core.object_store import content_object_key, parse_file_url, results_prefix, iter_objects
+from .core.object_store import LEGACY_UPLOAD_PREFIX, STAGING_PREFIX, RESULTS_PREFIX
+from .core.transfers import upload_transfer_config, MB
+from .core.validators import UploadValidator
+from .core.upload_sessions import get_upload_session_store
+from .core.s3_clients import shared_s3_client
+from .core.assembly_stats import assembly_stats
+from .core.kmers import kmer_spectrum
+from .core.minhash import sketch_fasta
+from .core.profiles import FASTA_PROFILE_METRICS, FASTQ_PROFILE_METRICS, fasta_profile_results, fastq_profile_results
+from .core.gff_engine import count_gff_features
+from .core.genbank_engine import summarize_genbank, record_summaries
 
 # --- Configuración del Cliente MinIO/S3 ---
-# Inicialización diferida para manejar problemas de inicio
+# Cliente compartido del proceso, creado en el primer uso (ver core/s3_clients.py)
 def get_s3_client():
-    return boto3.client(
-        's3',
-        endpoint_url=settings.MINIO_ENDPOINT,
-        aws_access_key_id=settings.MINIO_ACCESS_KEY,
-        aws_secret_access_key=settings.MINIO_SECRET_KEY
-    )
-
-s3_client = None  # Inicializado como None para evitar problemas en la importación
+    return shared_s3_client()
 
 # Función auxiliar para obtener una sesión de base de datos para las tareas
 def get_db_task():
@@ -33,31 +47,298 @@ def get_db_task():
     finally:
         db.close()
 
+def progress_body(task, response) -> ProgressStream:
+    """
+    Envuelve response['Body'] para que la tarea publique su progreso (estado
+    PROGRESS) según los bytes leídos frente a ContentLength.
+    """
+    reporter = ProgressReporter(
+        lambda meta: task.update_state(state='PROGRESS', meta=meta),
+        response.get('ContentLength'),
+        settings.PROGRESS_UPDATE_INTERVAL_S
+    )
+    return ProgressStream(response['Body'], reporter)
+
+def scan_sequence_object(s3_client, bucket: str, object_key: str, kind: str, task=None):
+    """
+    Ejecuta un motor FASTA/FASTQ sobre un objeto de MinIO.
+
+    Los objetos sin comprimir de al menos PARALLEL_SCAN_MIN_SIZE_MB se dividen
+    en rangos de bytes procesados en paralelo si el worker puede crear
+    procesos; el resto (incluidos los gzip, BGZF y zstd, que se descomprimen
+    al vuelo) se lee como un único flujo.
+
+    Args:
+        s3_client: Cliente S3 para la lectura secuencial
+        bucket: Bucket de MinIO
+        object_key: Clave del objeto
+        kind: Clave de parallel.ENGINES (p. ej. 'fasta_count', 'fastq_stats')
+        task: Tarea de Celery en la que publicar el progreso (opcional)
+
+    Returns:
+        Motor finalizado con los resultados
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=object_key)
+    size = response.get('ContentLength') or 0
+    body = progress_body(task, response) if task is not None else response['Body']
+    progress = body.reporter if task is not None else None
+    stream = open_body(body)
+    compression = detect_compression(stream.peek(4)[:4])
+    large = size >= settings.PARALLEL_SCAN_MIN_SIZE_MB * 1024 * 1024
+    if compression is None and large and can_spawn_processes():
+        stream.close()
+        if progress is not None:
+            # El progreso pasa a medirse por rangos terminados; lo leído por peek() no cuenta
+            progress.bytes_done = 0
+        return parallel_scan(kind, bucket, object_key, size, get_s3_client, settings.PARALLEL_SCAN_WORKERS, progress)
+    return scan_stream(kind, iter_chunks(decompress(stream, compression)), progress)
+
+def save_result_cache(db: Session, content_hash: str, analysis_type_str: str, parameters: str, results: dict):
+    """
+    Guarda los resultados de un análisis exitoso en la caché por contenido.
+
+    Un fallo (p. ej. otra tarea ya guardó la misma entrada) sólo se registra
+    en el log: el análisis ya está guardado.
+    """
+    if not content_hash or analysis_type_str not in ENGINE_VERSIONS:
+        return
+    try:
+        crud.create_cached_result(
+            db,
+            content_hash=content_hash,
+            analysis_type=analysis_type_str,
+            engine_version=ENGINE_VERSIONS[analysis_type_str],
+            parameters=parameters,
+            results=cacheable_results(results)
+        )
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"No se pudo guardar en caché el resultado {analysis_type_str} de {content_hash}: {e}")
+
+# Análisis de FASTA completos cuyas tareas encolan el sketch MinHash del archivo
+SKETCHED_ANALYSES = ("fasta_count", "fasta_gc_content", "assembly_stats")
+
+def sketch_cached_analysis(db: Session, db_analysis, bucket: str, object_key: str):
+    """
+    Da su sketch MinHash a un análisis creado desde la caché: copia el de
+    otro análisis del mismo archivo (la clave es por contenido) o, si no
+    hay ninguno, encola su cálculo como las tareas.
+    """
+    if not settings.SKETCH_FASTA_ANALYSES:
+        return
+    existing = crud.get_sketch_for_file_url(db, db_analysis.file_url, settings.SKETCH_K, settings.SKETCH_SIZE)
+    if existing:
+        crud.create_analysis_sketch(
+            db,
+            analysis_id=db_analysis.id,
+            strain_id=db_analysis.strain_id,
+            k=existing.k,
+            sketch_size=existing.sketch_size,
+            hashes=existing.hashes
+        )
+    else:
+        enqueue_fasta_sketch(db_analysis.id, bucket, object_key)
+
+def analysis_from_cached_result(db: Session, content_hash: str, analysis_type: str, parameters: str,
+                                strain_id: int, owner_id: int, filename: str, bucket: str, object_key: str):
+    """
+    Si el mismo contenido ya se analizó con la versión actual del motor y los
+    mismos parámetros, crea el Analysis con los resultados guardados (y, en
+    SKETCHED_ANALYSES, su sketch; ver sketch_cached_analysis).
+
+    Returns:
+        Analysis creado, o None si no hay acierto en la caché
+    """
+    cached = crud.get_cached_result(db, content_hash, analysis_type, ENGINE_VERSIONS[analysis_type], parameters)
+    if not cached:
+        return None
+    analysis_data = schemas.AnalysisCreate(
+        analysis_type=analysis_type,
+        results={"filename": filename, **cached.results},
+        strain_id=strain_id,
+        file_url=f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+    )
+    created_analysis = crud.create_analysis(db, analysis=analysis_data, owner_id=owner_id)
+    crud.record_cache_hit(db, cached)
+    if analysis_type in SKETCHED_ANALYSES:
+        sketch_cached_analysis(db, created_analysis, bucket, object_key)
+    return created_analysis
+
+def gc_content_analysis_results(s3_client, bucket: str, scanner) -> dict:
+    """
+    Resultados de contenido GC de un FastaScanner.
+
+    Con más de SIDECAR_MIN_RECORDS secuencias, el GC y la longitud de cada
+    una se guardan como columnas .npy en MinIO y los resultados llevan el
+    puntero record_columns en lugar de la lista individual_gc_contents.
+    """
+    if scanner.sequence_count <= settings.SIDECAR_MIN_RECORDS:
+        return gc_content_results(scanner)
+    results = gc_content_results(scanner, individual=False)
+    results["record_columns"] = write_record_columns(s3_client, bucket, results_prefix(), {
+        "gc_content": (scanner.gc_percentages(), 100),
+        "length": (scanner.lengths.view(), None),
+    })
+    return results
+
+def genbank_analysis_results(s3_client, bucket: str, summary: dict, columns: dict) -> dict:
+    """
+    Resultados GenBank con la tabla por registro completa.
+
+    Con más de SIDECAR_MIN_RECORDS registros, las columnas de la tabla se
+    guardan como .npy en MinIO y los resultados llevan el puntero
+    record_columns en lugar de la lista records.
+    """
+    if summary["sequence_count"] <= settings.SIDECAR_MIN_RECORDS:
+        return {**summary, "records": record_summaries(columns)}
+    return {**summary, "record_columns": write_record_columns(
+        s3_client, bucket, results_prefix(), {name: (values, None) for name, values in columns.items()}
+    )}
+
+def approximate_scan(task, s3_client, bucket: str, object_key: str, kind: str):
+    """
+    Analiza una muestra del objeto en lugar del archivo completo (modo
+    approximate) y publica las estimaciones parciales, con sus intervalos de
+    confianza, como estado PROGRESS de la tarea tras cada conglomerado.
+
+    Los objetos sin comprimir se muestrean por rangos de bytes estratificados
+    y los comprimidos por un prefijo del flujo descomprimido.
+
+    Returns:
+        Tupla (motor con los registros muestreados, resumen del muestreo), o
+        None si el objeto es tan pequeño que conviene analizarlo completo
+    """
+    sample_bytes = settings.APPROXIMATE_SAMPLE_MB * 1024 * 1024
+    response = s3_client.get_object(Bucket=bucket, Key=object_key)
+    size = response.get('ContentLength') or 0
+    stream = open_body(response['Body'])
+    compression = detect_compression(stream.peek(4)[:4])
+    if compression is None:
+        stream.close()
+        if size <= sample_bytes:
+            return None
+        sampling = "ranges"
+        steps = sample_ranges(kind, s3_client, bucket, object_key, size, sample_bytes, settings.APPROXIMATE_SAMPLE_RANGES)
+    else:
+        sampling = "prefix"
+        chunk_size = min(DEFAULT_CHUNK_SIZE, max(1, sample_bytes // settings.APPROXIMATE_SAMPLE_RANGES))
+        steps = sample_prefix(
+            kind,
+            iter_chunks(decompress(stream, compression), chunk_size),
+            sample_bytes,
+            settings.APPROXIMATE_SAMPLE_RANGES
+        )
+
+    sampled = None
+    try:
+        for engine, estimate in steps:
+            if sampling == "prefix" or sampled is None:
+                sampled = engine
+            else:
+                sampled.merge(engine)
+            if sampling == "ranges":
+                progress = len(estimate.clusters) / settings.APPROXIMATE_SAMPLE_RANGES
+            else:
+                progress = min(engine.bytes_read / sample_bytes, 1.0)
+            task.update_state(state='PROGRESS', meta={
+                'status': f"Muestreo aproximado ({sampling}): {len(estimate.clusters)} conglomerados",
+                'progress': round(progress * 100, 1),
+                'partial_result': {"sampling": sampling, **estimate.results()},
+            })
+    finally:
+        stream.close()
+
+    if sampled is None or sampled.sequence_count == 0:
+        # Ningún registro empieza en la muestra (p. ej. pocos registros enormes)
+        return None
+    return sampled, {"sampling": sampling, **estimate.results()}
+
+def apply_estimates(results: dict, summary: dict) -> dict:
+    """
+    Sustituye los valores de la muestra por las estimaciones para el archivo
+    completo y añade el resumen del muestreo (intervalos de confianza).
+
+    Sin estimación de sequence_count (prefijo cortado de un objeto
+    comprimido, cuyo tamaño descomprimido se desconoce) el recuento de la
+    muestra no vale para el archivo: sequence_count queda en null y el
+    resumen lo indica en sequence_count_unknown.
+    """
+    results = dict(results)
+    for name, estimate in summary["estimates"].items():
+        if estimate["value"] is not None:
+            results[name] = int(round(estimate["value"])) if name == "sequence_count" else estimate["value"]
+    if "sequence_count" not in summary["estimates"]:
+        results["sequence_count"] = None
+        summary = {**summary, "sequence_count_unknown": True}
+    results["approximate"] = True
+    results["sampling"] = summary
+    return results
+
+def record_task_failure(task, e: Exception, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str):
+    """
+    Registra el fallo de una tarea en Celery y como Analysis con los detalles del error.
+
+    Returns:
+        Resultado de la tarea con status FAILED
+    """
+    db_except: Session = SessionLocal() # Nueva sesión para el manejo de errores
+    try:
+        logging.exception(f"Celery task '{task.request.id}' ({task.name}) failed for strain {strain_id}: {e}")
+        task.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e), 'traceback': traceback.format_exc()})
+
+        error_details = {
+            "status": "FAILED",
+            "error_type": type(e).__name__,
+            "error_message": str(e),
+            "traceback": traceback.format_exc(),
+            "celery_task_id": task.request.id,
+            "strain_id": strain_id,
+            "owner_id": owner_id,
+            "bucket": bucket,
+            "object_key": object_key
+        }
+
+        failed_analysis_to_create = schemas.AnalysisCreate(
+            analysis_type=analysis_type_str,
+            results=error_details,
+            strain_id=strain_id,
+            file_url=f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+        )
+        crud.create_analysis(db=db_except, analysis=failed_analysis_to_create, owner_id=owner_id)
+    except Exception as db_e:
+        logging.error(f"FATAL: Failed to record Celery task failure in DB for task {task.request.id}: {db_e}", exc_info=True)
+    finally:
+        db_except.close()
+
+    return {"status": "FAILED", "error": str(e), "celery_task_id": task.request.id}
+
 @celery_app.task(bind=True)
-def process_fasta_count(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str):
+def process_fasta_count(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, content_hash: str = None, filename: str = None):
     db: Session = next(get_db_task())
 
     try:
         # Inicializar cliente S3
         s3_client = get_s3_client()
 
-        # 1. Obtener stream del archivo desde MinIO y procesarlo
-        response = s3_client.get_object(Bucket=bucket, Key=object_key)
-        filename = object_key.split('/')[-1]
-        text_stream = io.TextIOWrapper(response['Body'], encoding='utf-8')
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
 
-        # 2. Verificación de la Cepa
+        # 1. Verificación de la Cepa
         db_strain = crud.get_strain(db, strain_id=strain_id)
         if not db_strain:
             raise ValueError(f"La cepa con ID {strain_id} no existe.")
 
-        # 3. Lectura y Análisis del Archivo (vía stream)
-        sequence_count = 0
-        for record in SeqIO.parse(text_stream, "fasta"):
-            sequence_count += 1
+        # 2. Lectura y Análisis del Archivo desde MinIO (vía stream de bytes,
+        # sin decodificar; por rangos en paralelo si es grande)
+        counter = scan_sequence_object(s3_client, bucket, object_key, "fasta_count", task=self)
 
-        # 4. Guardado de Resultados
-        analysis_results = {"sequence_count": sequence_count, "filename": filename}
+        # 3. Guardado de Resultados
+        analysis_results = {
+            "sequence_count": counter.sequence_count,
+            "filename": filename,
+            "total_bytes": counter.bytes_read,
+            "total_residues": counter.total_residues
+        }
 
         # Construir la URL del archivo para guardarla en la BD
         file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
@@ -72,85 +353,52 @@ def process_fasta_count(self, strain_id: int, owner_id: int, bucket: str, object
         created_analysis = crud.create_analysis(
             db=db, analysis=analysis_to_create, owner_id=owner_id
         )
+        save_result_cache(db, content_hash, analysis_type_str, cache_parameters(), analysis_results)
 
+        enqueue_fasta_sketch(created_analysis.id, bucket, object_key)
         return {"status": "SUCCESS", "analysis_id": created_analysis.id}
     except Exception as e:
-        # --- Lógica mejorada para manejar el fallo de la tarea ---
-        db_except: Session = SessionLocal() # Nueva sesión para el manejo de errores
-        try:
-            logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for strain {strain_id}: {e}")
-            self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e), 'traceback': traceback.format_exc()})
-
-            error_details = {
-                "status": "FAILED",
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "traceback": traceback.format_exc(),
-                "celery_task_id": self.request.id,
-                "strain_id": strain_id,
-                "owner_id": owner_id,
-                "bucket": bucket,
-                "object_key": object_key
-            }
-
-            failed_file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}" # Reconstruir URL si es posible
-
-            failed_analysis_to_create = schemas.AnalysisCreate(
-                analysis_type=analysis_type_str,
-                results=error_details,
-                strain_id=strain_id,
-                file_url=failed_file_url
-            )
-            crud.create_analysis(db=db_except, analysis=failed_analysis_to_create, owner_id=owner_id)
-        except Exception as db_e:
-            logging.error(f"FATAL: Failed to record Celery task failure in DB for task {self.request.id}: {db_e}", exc_info=True)
-        finally:
-            db_except.close() # Asegurarse de cerrar la sesión de error
-
-        return {"status": "FAILED", "error": str(e), "celery_task_id": self.request.id}
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
 
 @celery_app.task(bind=True)
-def process_fasta_gc_content(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str):
+def process_fasta_gc_content(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, approximate: bool = False, content_hash: str = None, filename: str = None):
     db: Session = next(get_db_task())
 
     try:
         # Inicializar cliente S3
         s3_client = get_s3_client()
 
-        response = s3_client.get_object(Bucket=bucket, Key=object_key)
-        filename = object_key.split('/')[-1]
-        text_stream = io.TextIOWrapper(response['Body'], encoding='utf-8')
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
 
         db_strain = crud.get_strain(db, strain_id=strain_id)
         if not db_strain:
             raise ValueError(f"La cepa con ID {strain_id} no existe.")
 
-        gc_contents = []
-        sequence_count = 0
-
-        for record in SeqIO.parse(text_stream, "fasta"):
-            sequence_count += 1
-            seq = str(record.seq).upper()
-            g_count = seq.count('G')
-            c_count = seq.count('C')
-            total_bases = len(seq)
-            if total_bases > 0:
-                gc_percent = ((g_count + c_count) / total_bases) * 100
-                gc_contents.append(gc_percent)
-            else:
-                gc_contents.append(0.0)
-
-        if sequence_count == 0:
-            raise ValueError("El archivo FASTA no contiene secuencias.")
-
-        avg_gc_content = np.mean(gc_contents) if gc_contents else 0.0
-
-        analysis_results = {
-            "filename": filename,
-            "sequence_count": sequence_count,
-            "average_gc_content": round(avg_gc_content, 2),
-            "individual_gc_contents": [round(gc, 2) for gc in gc_contents]
-        }
+        sampled = approximate_scan(self, s3_client, bucket, object_key, "fasta_gc_content") if approximate else None
+        if sampled:
+            scanner, summary = sampled
+            # Los porcentajes individuales de la muestra no representan el archivo
+            analysis_results = {
+                "filename": filename,
+                **apply_estimates(gc_content_results(scanner), summary),
+                "individual_gc_contents": [],
+            }
+        else:
+            # Motor vectorizado: lee el objeto por bloques de bytes y cuenta G/C
+            # con NumPy, sin construir SeqRecord ni copiar cada secuencia a str;
+            # los objetos grandes se procesan por rangos en paralelo.
+            scanner = scan_sequence_object(s3_client, bucket, object_key, "fasta_gc_content", task=self)
+
+            if scanner.sequence_count == 0:
+                raise ValueError("El archivo FASTA no contiene secuencias.")
+
+            analysis_results = {
+                "filename": filename,
+                **gc_content_analysis_results(s3_client, bucket, scanner)
+            }
 
         file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
         analysis_to_create = schemas.AnalysisCreate(
@@ -162,84 +410,53 @@ def process_fasta_gc_content(self, strain_id: int, owner_id: int, bucket: str, o
         created_analysis = crud.create_analysis(
             db=db, analysis=analysis_to_create, owner_id=owner_id
         )
+        if not sampled:
+            # Las estimaciones de una muestra no se guardan en la caché, y el
+            # sketch necesita leer el archivo completo
+            save_result_cache(db, content_hash, analysis_type_str, cache_parameters(), analysis_results)
+            enqueue_fasta_sketch(created_analysis.id, bucket, object_key)
         return {"status": "SUCCESS", "analysis_id": created_analysis.id}
     except Exception as e:
-        # --- Lógica mejorada para manejar el fallo de la tarea ---
-        db_except: Session = SessionLocal() # Nueva sesión para el manejo de errores
-        try:
-            logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for strain {strain_id}: {e}")
-            self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e), 'traceback': traceback.format_exc()})
-
-            error_details = {
-                "status": "FAILED",
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "traceback": traceback.format_exc(),
-                "celery_task_id": self.request.id,
-                "strain_id": strain_id,
-                "owner_id": owner_id,
-                "bucket": bucket,
-                "object_key": object_key
-            }
-
-            failed_file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}" # Reconstruir URL si es posible
-
-            failed_analysis_to_create = schemas.AnalysisCreate(
-                analysis_type=analysis_type_str,
-                results=error_details,
-                strain_id=strain_id,
-                file_url=failed_file_url
-            )
-            crud.create_analysis(db=db_except, analysis=failed_analysis_to_create, owner_id=owner_id)
-        except Exception as db_e:
-            logging.error(f"FATAL: Failed to record Celery task failure in DB for task {self.request.id}: {db_e}", exc_info=True)
-        finally:
-            db_except.close() # Asegurarse de cerrar la sesión de error
-
-        return {"status": "FAILED", "error": str(e), "celery_task_id": self.request.id}
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
 
 @celery_app.task(bind=True)
-def process_fastq_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str):
+def process_fastq_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, approximate: bool = False, content_hash: str = None, filename: str = None):
     db: Session = next(get_db_task())
 
     try:
         # Inicializar cliente S3
         s3_client = get_s3_client()
 
-        response = s3_client.get_object(Bucket=bucket, Key=object_key)
-        filename = object_key.split('/')[-1]
-        text_stream = io.TextIOWrapper(response['Body'], encoding='utf-8')
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
 
         db_strain = crud.get_strain(db, strain_id=strain_id)
         if not db_strain:
             raise ValueError(f"La cepa con ID {strain_id} no existe.")
 
-        sequence_count = 0
-        all_lengths = []
-        all_avg_qualities = []
-
-        for record in SeqIO.parse(text_stream, "fastq"):
-            sequence_count += 1
-            all_lengths.append(len(record.seq))
-            quality_scores = record.letter_annotations["phred_quality"]
-            if quality_scores:
-                avg_quality = np.mean(quality_scores)
-                all_avg_qualities.append(avg_quality)
-
-        if sequence_count == 0:
-            raise ValueError("El archivo FASTQ no contiene secuencias.")
-
-        overall_avg_quality = np.mean(all_avg_qualities) if all_avg_qualities else 0
-        avg_length = np.mean(all_lengths)
-
-        analysis_results = {
-            "filename": filename,
-            "sequence_count": sequence_count,
-            "avg_sequence_length": round(avg_length, 2),
-            "min_length": min(all_lengths),
-            "max_length": max(all_lengths),
-            "overall_avg_quality": round(overall_avg_quality, 2)
-        }
+        sampled = approximate_scan(self, s3_client, bucket, object_key, "fastq_stats") if approximate else None
+        if sampled:
+            # min_length y max_length son los observados en la muestra
+            scanner, summary = sampled
+            analysis_results = {
+                "filename": filename,
+                **apply_estimates(fastq_stats_results(scanner), summary)
+            }
+        else:
+            # Motor de 4 líneas sobre bytes crudos: las calidades de cada bloque
+            # se reducen con NumPy, sin SeqRecord ni listas de enteros por lectura;
+            # los objetos grandes se procesan por rangos en paralelo.
+            scanner = scan_sequence_object(s3_client, bucket, object_key, "fastq_stats", task=self)
+
+            if scanner.sequence_count == 0:
+                raise ValueError("El archivo FASTQ no contiene secuencias.")
+
+            analysis_results = {
+                "filename": filename,
+                **fastq_stats_results(scanner)
+            }
 
         file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
         analysis_to_create = schemas.AnalysisCreate(
@@ -252,44 +469,17 @@ def process_fastq_stats(self, strain_id: int, owner_id: int, bucket: str, object
         created_analysis = crud.create_analysis(
             db=db, analysis=analysis_to_create, owner_id=owner_id
         )
+        if not sampled:
+            # Las estimaciones de una muestra no se guardan en la caché
+            save_result_cache(db, content_hash, analysis_type_str, cache_parameters(), analysis_results)
         return {"status": "SUCCESS", "analysis_id": created_analysis.id}
     except Exception as e:
-        # --- Lógica mejorada para manejar el fallo de la tarea ---
-        db_except: Session = SessionLocal() # Nueva sesión para el manejo de errores
-        try:
-            logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for strain {strain_id}: {e}")
-            self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e), 'traceback': traceback.format_exc()})
-
-            error_details = {
-                "status": "FAILED",
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "traceback": traceback.format_exc(),
-                "celery_task_id": self.request.id,
-                "strain_id": strain_id,
-                "owner_id": owner_id,
-                "bucket": bucket,
-                "object_key": object_key
-            }
-
-            failed_file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}" # Reconstruir URL si es posible
-
-            failed_analysis_to_create = schemas.AnalysisCreate(
-                analysis_type=analysis_type_str,
-                results=error_details,
-                strain_id=strain_id,
-                file_url=failed_file_url
-            )
-            crud.create_analysis(db=db_except, analysis=failed_analysis_to_create, owner_id=owner_id)
-        except Exception as db_e:
-            logging.error(f"FATAL: Failed to record Celery task failure in DB for task {self.request.id}: {db_e}", exc_info=True)
-        finally:
-            db_except.close() # Asegurarse de cerrar la sesión de error
-
-        return {"status": "FAILED", "error": str(e), "celery_task_id": self.request.id}
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
 
 @celery_app.task(bind=True)
-def process_genbank_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str):
+def process_genbank_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, content_hash: str = None, filename: str = None):
     db: Session = next(get_db_task())
 
     try:
@@ -297,28 +487,22 @@ def process_genbank_stats(self, strain_id: int, owner_id: int, bucket: str, obje
         s3_client = get_s3_client()
 
         response = s3_client.get_object(Bucket=bucket, Key=object_key)
-        filename = object_key.split('/')[-1]
-        text_stream = io.TextIOWrapper(response['Body'], encoding='utf-8')
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
+        text_stream = io.TextIOWrapper(open_decompressed(progress_body(self, response)), encoding='utf-8')
 
         db_strain = crud.get_strain(db, strain_id=strain_id)
         if not db_strain:
             raise ValueError(f"La cepa con ID {strain_id} no existe.")
 
-        records = list(SeqIO.parse(text_stream, "genbank"))
-        if not records:
+        # Agregación en streaming: un registro en memoria a la vez
+        genbank_summary, record_columns = summarize_genbank(text_stream)
+        if not genbank_summary["sequence_count"]:
             raise ValueError("El archivo GenBank no contiene registros.")
 
-        main_record = records[0]
-
         analysis_results = {
             "filename": filename,
-            "sequence_count": len(records),
-            "main_record_id": main_record.id,
-            "description": main_record.description,
-            "sequence_length": len(main_record.seq),
-            "feature_count": len(main_record.features),
-            "molecule_type": main_record.annotations.get('molecule_type', 'N/A'),
-            "topology": main_record.annotations.get('topology', 'N/A'),
+            **genbank_analysis_results(s3_client, bucket, genbank_summary, record_columns)
         }
 
         file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
@@ -332,41 +516,12 @@ def process_genbank_stats(self, strain_id: int, owner_id: int, bucket: str, obje
         created_analysis = crud.create_analysis(
             db=db, analysis=analysis_to_create, owner_id=owner_id
         )
+        save_result_cache(db, content_hash, analysis_type_str, cache_parameters(), analysis_results)
         return {"status": "SUCCESS", "analysis_id": created_analysis.id}
     except Exception as e:
-        # --- Lógica mejorada para manejar el fallo de la tarea ---
-        db_except: Session = SessionLocal() # Nueva sesión para el manejo de errores
-        try:
-            logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for strain {strain_id}: {e}")
-            self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e), 'traceback': traceback.format_exc()})
-
-            error_details = {
-                "status": "FAILED",
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "traceback": traceback.format_exc(),
-                "celery_task_id": self.request.id,
-                "strain_id": strain_id,
-                "owner_id": owner_id,
-                "bucket": bucket,
-                "object_key": object_key
-            }
-
-            failed_file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}" # Reconstruir URL si es posible
-
-            failed_analysis_to_create = schemas.AnalysisCreate(
-                analysis_type=analysis_type_str,
-                results=error_details,
-                strain_id=strain_id,
-                file_url=failed_file_url
-            )
-            crud.create_analysis(db=db_except, analysis=failed_analysis_to_create, owner_id=owner_id)
-        except Exception as db_e:
-            logging.error(f"FATAL: Failed to record Celery task failure in DB for task {self.request.id}: {db_e}", exc_info=True)
-        finally:
-            db_except.close() # Asegurarse de cerrar la sesión de error
-
-        return {"status": "FAILED", "error": str(e), "celery_task_id": self.request.id}
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
 
 def process_features(features, feature_counts=None):
     """
@@ -385,7 +540,7 @@ def process_features(features, feature_counts=None):
     return feature_counts
 
 @celery_app.task(bind=True)
-def process_gff_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str):
+def process_gff_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, deep_validation: bool = False, content_hash: str = None, filename: str = None):
     db: Session = next(get_db_task())
 
     try:
@@ -393,17 +548,22 @@ def process_gff_stats(self, strain_id: int, owner_id: int, bucket: str, object_k
         s3_client = get_s3_client()
 
         response = s3_client.get_object(Bucket=bucket, Key=object_key)
-        filename = object_key.split('/')[-1]
-        text_stream = io.TextIOWrapper(response['Body'], encoding='utf-8')
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
 
         db_strain = crud.get_strain(db, strain_id=strain_id)
         if not db_strain:
             raise ValueError(f"La cepa con ID {strain_id} no existe.")
 
-        feature_counts = Counter()
-
-        for rec in GFF.parse(text_stream):
-            process_features(rec.features, feature_counts)
+        if deep_validation:
+            # Validación profunda: BCBio construye y recorre el árbol de features
+            text_stream = io.TextIOWrapper(open_decompressed(progress_body(self, response)), encoding='utf-8')
+            feature_counts = Counter()
+            for rec in GFF.parse(text_stream):
+                process_features(rec.features, feature_counts)
+        else:
+            # Conteo línea a línea de la columna 3, en memoria constante
+            feature_counts = count_gff_features(iter_chunks(open_decompressed(progress_body(self, response))))
 
         if not feature_counts:
             raise ValueError("El archivo GFF no contiene features o está vacío.")
@@ -424,38 +584,567 @@ def process_gff_stats(self, strain_id: int, owner_id: int, bucket: str, object_k
         created_analysis = crud.create_analysis(
             db=db, analysis=analysis_to_create, owner_id=owner_id
         )
+        save_result_cache(db, content_hash, analysis_type_str, cache_parameters(deep_validation=deep_validation), analysis_results)
         return {"status": "SUCCESS", "analysis_id": created_analysis.id}
     except Exception as e:
-        # --- Lógica mejorada para manejar el fallo de la tarea ---
-        db_except: Session = SessionLocal() # Nueva sesión para el manejo de errores
-        try:
-            logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for strain {strain_id}: {e}")
-            self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e), 'traceback': traceback.format_exc()})
-
-            error_details = {
-                "status": "FAILED",
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "traceback": traceback.format_exc(),
-                "celery_task_id": self.request.id,
-                "strain_id": strain_id,
-                "owner_id": owner_id,
-                "bucket": bucket,
-                "object_key": object_key
-            }
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
 
-            failed_file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}" # Reconstruir URL si es posible
+def enqueue_fasta_sketch(analysis_id: int, bucket: str, object_key: str):
+    """
+    Encola el cálculo del sketch MinHash de un FASTA recién analizado.
 
-            failed_analysis_to_create = schemas.AnalysisCreate(
-                analysis_type=analysis_type_str,
-                results=error_details,
-                strain_id=strain_id,
-                file_url=failed_file_url
-            )
-            crud.create_analysis(db=db_except, analysis=failed_analysis_to_create, owner_id=owner_id)
-        except Exception as db_e:
-            logging.error(f"FATAL: Failed to record Celery task failure in DB for task {self.request.id}: {db_e}", exc_info=True)
+    Un fallo al encolar no invalida el análisis: sólo se registra en el log.
+    """
+    if not settings.SKETCH_FASTA_ANALYSES:
+        return
+    try:
+        compute_fasta_sketch.delay(analysis_id, bucket, object_key)
+    except Exception as e:
+        logging.error(f"No se pudo encolar el sketch MinHash del análisis {analysis_id}: {e}")
+
+def save_profile_analyses(db: Session, profile_results: dict, metric_types: dict, filename: str,
+                          strain_id: int, owner_id: int, file_url: str) -> dict:
+    """
+    Guarda un Analysis por cada conjunto de métricas de un perfil.
+
+    Returns:
+        Diccionario {tipo de análisis: ID del Analysis creado}
+    """
+    analysis_ids = {}
+    for metric, results in profile_results.items():
+        analysis_to_create = schemas.AnalysisCreate(
+            analysis_type=metric_types[metric],
+            results={"filename": filename, **results},
+            strain_id=strain_id,
+            file_url=file_url
+        )
+        created_analysis = crud.create_analysis(db=db, analysis=analysis_to_create, owner_id=owner_id)
+        analysis_ids[metric_types[metric]] = created_analysis.id
+    return analysis_ids
+
+@celery_app.task(bind=True)
+def process_fasta_profile(self, strain_id: int, owner_id: int, bucket: str, object_key: str, metrics: list = None, filename: str = None):
+    """
+    Calcula en una sola pasada por el FASTA los conjuntos de métricas pedidos
+    (conteo, contenido GC y longitudes con N50/L50 e histograma).
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        s3_client = get_s3_client()
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
+
+        db_strain = crud.get_strain(db, strain_id=strain_id)
+        if not db_strain:
+            raise ValueError(f"La cepa con ID {strain_id} no existe.")
+
+        scanner = scan_sequence_object(s3_client, bucket, object_key, "fasta_gc_content", task=self)
+        if scanner.sequence_count == 0:
+            raise ValueError("El archivo FASTA no contiene secuencias.")
+
+        profile_results = fasta_profile_results(scanner, metrics or list(FASTA_PROFILE_METRICS))
+        if "gc_content" in profile_results:
+            profile_results["gc_content"] = gc_content_analysis_results(s3_client, bucket, scanner)
+        file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+        analysis_ids = save_profile_analyses(
+            db, profile_results, FASTA_PROFILE_METRICS, filename, strain_id, owner_id, file_url
+        )
+        enqueue_fasta_sketch(next(iter(analysis_ids.values())), bucket, object_key)
+        return {"status": "SUCCESS", "analysis_ids": analysis_ids}
+    except Exception as e:
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, "fasta_profile")
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def process_fastq_profile(self, strain_id: int, owner_id: int, bucket: str, object_key: str, metrics: list = None, filename: str = None):
+    """
+    Calcula en una sola pasada por el FASTQ los conjuntos de métricas pedidos
+    (estadísticas de calidad, longitudes con N50/L50 e histograma y perfil de
+    calidad por posición).
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        s3_client = get_s3_client()
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
+
+        db_strain = crud.get_strain(db, strain_id=strain_id)
+        if not db_strain:
+            raise ValueError(f"La cepa con ID {strain_id} no existe.")
+
+        metrics = metrics or list(FASTQ_PROFILE_METRICS)
+        # El perfil por posición sólo se acumula si se pide (matriz posición x calidad)
+        kind = "fastq_quality_profile" if "quality_profile" in metrics else "fastq_stats"
+        scanner = scan_sequence_object(s3_client, bucket, object_key, kind, task=self)
+        if scanner.sequence_count == 0:
+            raise ValueError("El archivo FASTQ no contiene secuencias.")
+
+        profile_results = fastq_profile_results(scanner, metrics)
+        file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+        analysis_ids = save_profile_analyses(
+            db, profile_results, FASTQ_PROFILE_METRICS, filename, strain_id, owner_id, file_url
+        )
+        return {"status": "SUCCESS", "analysis_ids": analysis_ids}
+    except Exception as e:
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, "fastq_profile")
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def process_assembly_stats(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, genome_size: int = None, content_hash: str = None, filename: str = None):
+    """
+    Calcula estadísticas de contigüidad (N50/L50, N90, auN, NG50 si se conoce
+    el tamaño del genoma) y GC por tamaño de contig de un ensamblaje FASTA.
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        s3_client = get_s3_client()
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
+
+        db_strain = crud.get_strain(db, strain_id=strain_id)
+        if not db_strain:
+            raise ValueError(f"La cepa con ID {strain_id} no existe.")
+
+        scanner = scan_sequence_object(s3_client, bucket, object_key, "fasta_gc_content", task=self)
+        if scanner.sequence_count == 0:
+            raise ValueError("El archivo FASTA no contiene secuencias.")
+
+        analysis_results = {
+            "filename": filename,
+            **assembly_stats(scanner, genome_size)
+        }
+
+        file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+        analysis_to_create = schemas.AnalysisCreate(
+            analysis_type=analysis_type_str,
+            results=analysis_results,
+            strain_id=strain_id,
+            file_url=file_url
+        )
+        created_analysis = crud.create_analysis(
+            db=db, analysis=analysis_to_create, owner_id=owner_id
+        )
+        save_result_cache(db, content_hash, analysis_type_str, cache_parameters(genome_size=genome_size), analysis_results)
+        enqueue_fasta_sketch(created_analysis.id, bucket, object_key)
+        return {"status": "SUCCESS", "analysis_id": created_analysis.id}
+    except Exception as e:
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def process_kmer_spectrum(self, strain_id: int, owner_id: int, bucket: str, object_key: str, analysis_type_str: str, file_format: str = "fasta", k: int = 21, content_hash: str = None, filename: str = None):
+    """
+    Calcula el espectro de k-meros canónicos (histograma de abundancias) de un
+    FASTA o FASTQ, con la estimación del tamaño del genoma.
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        s3_client = get_s3_client()
+        # Nombre original del archivo (las claves antiguas lo incluían tras el UUID)
+        filename = filename or object_key.split('/')[-1]
+
+        db_strain = crud.get_strain(db, strain_id=strain_id)
+        if not db_strain:
+            raise ValueError(f"La cepa con ID {strain_id} no existe.")
+
+        response = s3_client.get_object(Bucket=bucket, Key=object_key)
+        body = progress_body(self, response)
+        spectrum = kmer_spectrum(
+            iter_chunks(open_decompressed(body)),
+            file_format,
+            k,
+            memory_budget_bytes=settings.KMER_MEMORY_BUDGET_MB * 1024 * 1024,
+            progress=body.reporter
+        )
+        if not spectrum["total_kmers"]:
+            raise ValueError(f"El archivo no contiene secuencias de al menos {k} bases.")
+
+        analysis_results = {
+            "filename": filename,
+            **spectrum
+        }
+
+        file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{object_key}"
+        analysis_to_create = schemas.AnalysisCreate(
+            analysis_type=analysis_type_str,
+            results=analysis_results,
+            strain_id=strain_id,
+            file_url=file_url
+        )
+        created_analysis = crud.create_analysis(
+            db=db, analysis=analysis_to_create, owner_id=owner_id
+        )
+        save_result_cache(db, content_hash, analysis_type_str, cache_parameters(file_format=file_format, k=k), analysis_results)
+        return {"status": "SUCCESS", "analysis_id": created_analysis.id}
+    except Exception as e:
+        return record_task_failure(self, e, strain_id, owner_id, bucket, object_key, analysis_type_str)
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def compute_fasta_sketch(self, analysis_id: int, bucket: str, object_key: str):
+    """
+    Calcula y guarda el sketch MinHash bottom-s del FASTA de un análisis,
+    para la búsqueda de cepas parecidas (/analysis/similar).
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        db_analysis = crud.get_analysis(db, analysis_id=analysis_id)
+        if not db_analysis:
+            raise ValueError(f"El análisis con ID {analysis_id} no existe.")
+        if crud.get_analysis_sketch(db, analysis_id=analysis_id):
+            return {"status": "SUCCESS", "analysis_id": analysis_id}
+
+        s3_client = get_s3_client()
+        response = s3_client.get_object(Bucket=bucket, Key=object_key)
+        sketcher = sketch_fasta(
+            iter_chunks(open_decompressed(response['Body'])),
+            settings.SKETCH_K,
+            settings.SKETCH_SIZE
+        )
+        hashes = sketcher.hashes()
+        if not hashes.size:
+            raise ValueError(f"El archivo no contiene secuencias de al menos {settings.SKETCH_K} bases.")
+
+        crud.create_analysis_sketch(
+            db,
+            analysis_id=analysis_id,
+            strain_id=db_analysis.strain_id,
+            k=settings.SKETCH_K,
+            sketch_size=settings.SKETCH_SIZE,
+            hashes=hashes.astype('<u8').tobytes()
+        )
+        return {"status": "SUCCESS", "analysis_id": analysis_id}
+    except Exception as e:
+        # El sketch es auxiliar: el fallo se registra en el log, no como Analysis
+        logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for analysis {analysis_id}: {e}")
+        return {"status": "FAILED", "error": str(e), "celery_task_id": self.request.id}
+    finally:
+        db.close()
+
+def migrate_legacy_upload(db: Session, s3_client, file_url: str) -> str:
+    """
+    Mueve un archivo con clave antigua (uploads/{uuid}-{nombre}) a su clave
+    direccionada por contenido y actualiza los análisis que lo referencian.
+
+    El objeto se hashea leyéndolo por bloques; si el contenido ya está
+    guardado no se copia, y si no se copia dentro de MinIO (copia
+    multiparte para objetos grandes, sin pasar los datos por el worker).
+
+    Returns:
+        Nuevo file_url
+    """
+    bucket, object_key = parse_file_url(file_url)
+    response = s3_client.get_object(Bucket=bucket, Key=object_key)
+    reader = HashingReader(response['Body'])
+    try:
+        reader.drain()
+    finally:
+        response['Body'].close()
+    content_hash = reader.hexdigest()
+
+    stored = crud.get_stored_object(db, content_hash)
+    if not stored:
+        new_key = content_object_key(content_hash)
+        s3_client.copy({'Bucket': bucket, 'Key': object_key}, bucket, new_key, Config=upload_transfer_config())
+        stored = crud.register_stored_object(
+            db, content_hash, bucket, new_key,
+            f"{settings.MINIO_ENDPOINT}/{bucket}/{new_key}", reader.bytes_read
+        )
+
+    crud.replace_analysis_file_url(db, file_url, stored.file_url)
+    s3_client.delete_object(Bucket=bucket, Key=object_key)
+    return stored.file_url
+
+@celery_app.task(bind=True)
+def migrate_uploads_to_content_store(self, after_id: int = 0, batch_size: int = None):
+    """
+    Migra por lotes los archivos subidos con claves antiguas a claves
+    direccionadas por contenido, eliminando los duplicados.
+
+    Cada lote recorre los siguientes análisis con clave antigua en orden de
+    ID y, si quedan más, vuelve a encolarse. Se lanza una vez, p. ej. con
+    `celery -A app.celery_worker call app.tasks.migrate_uploads_to_content_store`.
+    """
+    db: Session = next(get_db_task())
+    batch_size = batch_size or settings.CONTENT_MIGRATION_BATCH_SIZE
+
+    try:
+        s3_client = get_s3_client()
+        analyses = crud.get_analyses_with_file_url_like(
+            db, f"%/{LEGACY_UPLOAD_PREFIX}/%", after_id=after_id, limit=batch_size
+        )
+        file_urls = list(dict.fromkeys(analysis.file_url for analysis in analyses))
+        migrated = 0
+        for file_url in file_urls:
+            try:
+                migrate_legacy_upload(db, s3_client, file_url)
+                migrated += 1
+            except Exception as e:
+                # Un objeto que falla (p. ej. ya no existe) no detiene la migración
+                db.rollback()
+                logging.error(f"No se pudo migrar {file_url} al almacenamiento por contenido: {e}")
+
+        last_id = analyses[-1].id if analyses else after_id
+        if len(analyses) == batch_size:
+            migrate_uploads_to_content_store.delay(after_id=last_id, batch_size=batch_size)
+        return {"status": "SUCCESS", "migrated_objects": migrated, "failed_objects": len(file_urls) - migrated, "last_analysis_id": last_id}
+    finally:
+        db.close()
+
+def store_direct_upload(db: Session, s3_client, upload, expected_format: str = None):
+    """
+    Comprueba el objeto provisional de una subida directa (tamaño y, si se
+    indica, formato), lo hashea leyéndolo por bloques y lo lleva a su clave
+    direccionada por contenido como migrate_legacy_upload. Un objeto no
+    válido se borra y la subida se marca como fallida.
+
+    Returns:
+        Mensaje de error si el objeto no es válido; None si se guardó
+    """
+    staging_key = upload.object_key
+    size = s3_client.head_object(Bucket=upload.bucket, Key=staging_key)['ContentLength']
+    error = None
+    if size != upload.size:
+        error = f"El archivo subido tiene {size} bytes; se esperaban {upload.size}."
+    else:
+        response = s3_client.get_object(Bucket=upload.bucket, Key=staging_key)
+        validator = UploadValidator(response['Body'], expected_format, settings.MAX_UPLOAD_SIZE_MB * MB)
+        try:
+            validator.drain()
+        except HTTPException as e:
+            error = e.detail
         finally:
-            db_except.close() # Asegurarse de cerrar la sesión de error
+            response['Body'].close()
+    if error:
+        s3_client.delete_object(Bucket=upload.bucket, Key=staging_key)
+        crud.update_direct_upload_status(db, upload, "failed")
+        return error
+
+    content_hash = validator.hexdigest()
+    stored = crud.get_stored_object(db, content_hash)
+    if stored:
+        crud.touch_stored_object(db, stored)
+    else:
+        new_key = content_object_key(content_hash)
+        s3_client.copy({'Bucket': upload.bucket, 'Key': staging_key}, upload.bucket, new_key, Config=upload_transfer_config())
+        stored = crud.register_stored_object(
+            db, content_hash, upload.bucket, new_key,
+            f"{settings.MINIO_ENDPOINT}/{upload.bucket}/{new_key}", size
+        )
+    crud.update_direct_upload_status(db, upload, upload.status, content_hash=content_hash, object_key=stored.object_key)
+    s3_client.delete_object(Bucket=upload.bucket, Key=staging_key)
+    return None
 
+@celery_app.task(bind=True)
+def ingest_direct_upload(self, upload_id: str, analysis_task: str, expected_format: str = None):
+    """
+    Segunda mitad de una subida directa, ya unida en MinIO: guarda el objeto
+    por su contenido (ver store_direct_upload) leyéndolo en el worker, no en
+    la API, y crea el análisis desde la caché de resultados o se sustituye
+    por la tarea analysis_task, que conserva el ID de esta tarea.
+
+    Si falla antes de guardar el objeto, /analysis/uploads/{id}/complete la
+    vuelve a encolar; lo ya guardado no se repite.
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        upload = crud.get_direct_upload(db, upload_id)
+        if not upload:
+            raise ValueError(f"La subida directa {upload_id} no existe.")
+        if upload.content_hash is None:
+            error = store_direct_upload(db, get_s3_client(), upload, expected_format)
+            if error:
+                return {"status": "FAILED", "error": error, "celery_task_id": self.request.id}
+
+        parameters = result_cache_key(upload.analysis_type, upload.parameters)
+        if parameters is not None:
+            cached = analysis_from_cached_result(
+                db, upload.content_hash, upload.analysis_type, parameters, upload.strain_id,
+                upload.owner_id, upload.filename, upload.bucket, upload.object_key
+            )
+            if cached:
+                crud.update_direct_upload_status(db, upload, "completed", analysis_id=cached.id)
+                return {"status": "SUCCESS", "analysis_id": cached.id}
+
+        replacement = celery_app.signature(analysis_task, kwargs={
+            "strain_id": upload.strain_id,
+            "owner_id": upload.owner_id,
+            "bucket": upload.bucket,
+            "object_key": upload.object_key,
+            "analysis_type_str": upload.analysis_type,
+            "filename": upload.filename,
+            "content_hash": upload.content_hash,
+            **upload.parameters
+        })
+        crud.update_direct_upload_status(db, upload, "completed")
+    except Exception as e:
+        db.rollback()
+        logging.exception(f"Celery task '{self.request.id}' ({self.name}) failed for direct upload {upload_id}: {e}")
         return {"status": "FAILED", "error": str(e), "celery_task_id": self.request.id}
+    finally:
+        db.close()
+    return self.replace(replacement)
+
+@celery_app.task(bind=True)
+def collect_unreferenced_objects(self, limit: int = 100):
+    """
+    Elimina de MinIO los archivos que ningún análisis referencia (número de
+    análisis con su file_url igual a cero) y que no se han vuelto a subir en
+    UNREFERENCED_OBJECT_GRACE_HOURS, para no borrar el archivo de una tarea
+    que aún no ha creado su Analysis. Borra también las claves provisionales
+    (staging/) de subidas interrumpidas y las columnas por registro
+    (results/{uuid}/) a las que ya no apunta ningún análisis ni la caché de
+    resultados, con la misma antigüedad.
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        s3_client = get_s3_client()
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.UNREFERENCED_OBJECT_GRACE_HOURS)
+        deleted = 0
+        for stored in crud.get_unreferenced_stored_objects(db, cutoff, limit=limit):
+            try:
+                s3_client.delete_object(Bucket=stored.bucket, Key=stored.object_key)
+                crud.delete_stored_object(db, stored)
+                deleted += 1
+            except Exception as e:
+                db.rollback()
+                logging.error(f"No se pudo eliminar el objeto sin referencias {stored.object_key}: {e}")
+
+        deleted_staging = 0
+        for item in iter_objects(s3_client, settings.MINIO_BUCKET_NAME, f"{STAGING_PREFIX}/"):
+            if deleted_staging >= limit:
+                break
+            if item['LastModified'] < cutoff:
+                try:
+                    s3_client.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=item['Key'])
+                    deleted_staging += 1
+                except Exception as e:
+                    logging.error(f"No se pudo eliminar el objeto provisional {item['Key']}: {e}")
+
+        deleted_results = 0
+        referenced = {}
+        for item in iter_objects(s3_client, settings.MINIO_BUCKET_NAME, f"{RESULTS_PREFIX}/"):
+            if deleted_results >= limit:
+                break
+            prefix = item['Key'].rsplit('/', 1)[0]
+            if item['LastModified'] >= cutoff:
+                continue
+            if prefix not in referenced:
+                referenced[prefix] = crud.count_record_column_references(db, prefix) > 0
+            if not referenced[prefix]:
+                try:
+                    s3_client.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=item['Key'])
+                    deleted_results += 1
+                except Exception as e:
+                    logging.error(f"No se pudo eliminar la columna por registro {item['Key']}: {e}")
+        return {"status": "SUCCESS", "deleted_objects": deleted, "deleted_staging_objects": deleted_staging,
+                "deleted_result_objects": deleted_results}
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def collect_abandoned_uploads(self, limit: int = 100):
+    """
+    Aborta en MinIO las subidas reanudables sin actividad durante
+    RESUMABLE_UPLOAD_TTL_HOURS (borra sus partes) y elimina su sesión.
+
+    También aborta las subidas directas que siguen sin completar
+    RESUMABLE_UPLOAD_TTL_HOURS después de caducar sus URLs prefirmadas
+    (PRESIGNED_URL_EXPIRES_S) y las marca como fallidas.
+    """
+    sessions = get_upload_session_store()
+    s3_client = get_s3_client()
+    collected = 0
+    for upload_id in sessions.abandoned(limit):
+        session = sessions.get(upload_id)
+        if session:
+            try:
+                if session.get("assembled"):
+                    # Las partes ya se unieron: queda el objeto provisional
+                    s3_client.delete_object(Bucket=session["bucket"], Key=session["object_key"])
+                else:
+                    s3_client.abort_multipart_upload(
+                        Bucket=session["bucket"], Key=session["object_key"], UploadId=session["s3_upload_id"]
+                    )
+            except Exception as e:
+                # p. ej. NoSuchUpload: la subida ya se completó o se abortó
+                logging.warning(f"No se pudo abortar la subida abandonada {upload_id}: {e}")
+        sessions.delete(upload_id)
+        collected += 1
+
+    db: Session = next(get_db_task())
+    try:
+        cutoff = datetime.now(timezone.utc) - timedelta(
+            seconds=settings.PRESIGNED_URL_EXPIRES_S, hours=settings.RESUMABLE_UPLOAD_TTL_HOURS
+        )
+        for upload in crud.get_stale_direct_uploads(db, cutoff, limit=limit):
+            try:
+                s3_client.abort_multipart_upload(Bucket=upload.bucket, Key=upload.object_key, UploadId=upload.s3_upload_id)
+            except Exception as e:
+                logging.warning(f"No se pudo abortar la subida directa abandonada {upload.id}: {e}")
+            crud.update_direct_upload_status(db, upload, "failed")
+            collected += 1
+    finally:
+        db.close()
+    return {"status": "SUCCESS", "collected_uploads": collected}
+
+def upload_batch_summary(entries: list, results: list) -> dict:
+    """
+    Resumen de un lote a partir de los resultados de sus tareas.
+
+    Args:
+        entries: Entradas del lote (las de la caché llevan analysis_id)
+        results: Resultados de las tareas, en el orden de las entradas con task_id
+
+    Returns:
+        Diccionario con total, succeeded, failed, cached, analysis_ids y failures
+    """
+    queued = [entry for entry in entries if entry.get("task_id")]
+    cached = [entry for entry in entries if not entry.get("task_id")]
+    analysis_ids = [entry["analysis_id"] for entry in cached]
+    failures = []
+    for entry, result in zip(queued, results):
+        if isinstance(result, dict) and result.get("status") == "SUCCESS":
+            analysis_ids.append(result.get("analysis_id"))
+        else:
+            error = result.get("error") if isinstance(result, dict) else str(result)
+            failures.append({"filename": entry["filename"], "task_id": entry["task_id"], "error": error})
+    return {
+        "total": len(entries),
+        "succeeded": len(analysis_ids),
+        "failed": len(failures),
+        "cached": len(cached),
+        "analysis_ids": analysis_ids,
+        "failures": failures,
+    }
+
+@celery_app.task(bind=True)
+def finalize_upload_batch(self, results: list, batch_id: str):
+    """
+    Callback del chord de un lote de subidas: guarda el resumen del lote
+    cuando han terminado todas sus tareas.
+    """
+    db: Session = next(get_db_task())
+
+    try:
+        batch = crud.get_upload_batch(db, batch_id)
+        if not batch:
+            raise ValueError(f"El lote {batch_id} no existe.")
+        summary = upload_batch_summary(batch.entries, results)
+        crud.complete_upload_batch(db, batch, summary)
+        return {"status": "SUCCESS", "batch_id": batch_id, **summary}
+    finally:
+        db.close()
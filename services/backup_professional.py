@@ -8,13 +8,13 @@ import os
 import shutil
 from datetime import datetime
 from pathlib import Path
-import boto3
 from botocore.exceptions import ClientError
 import zipfile
 from typing import List, Dict, Any
 import sys
 
 from app.core.config import settings
+from app.core.s3_clients import shared_s3_client
 
 
 class BackupSystem:
@@ -23,12 +23,7 @@ class BackupSystem:
         self.backup_dir.mkdir(exist_ok=True)
         
         # Configurar cliente S3/MinIO
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-        )
+        self.s3_client = shared_s3_client()
         self.bucket_name = settings.MINIO_BUCKET_NAME
         self.db_path = Path("services", "genolab.db")
 
@@ -0,0 +1,118 @@
+"""
+Script de benchmark de los motores de análisis frente a la implementación
+original basada en Bio.SeqIO.
+
+Genera archivos sintéticos en memoria y muestra el rendimiento de cada motor.
+Uso: python benchmark_engines.py
+"""
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from Bio import SeqIO
+
+# Agregar la carpeta services al path de Python
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.streams import iter_chunks
+from app.core.fasta_engine import scan_fasta, gc_content_results, count_fasta
+from app.core.fastq_engine import scan_fastq, fastq_stats_results
+
+_ALPHABET = np.frombuffer(b"ACGTacgtN", dtype=np.uint8)
+
+
+def make_assembly(n_contigs: int = 400, mean_length: int = 100_000, width: int = 60) -> bytes:
+    """FASTA tipo ensamblaje: pocos contigs largos, con líneas de `width` bases."""
+    rng = np.random.default_rng(0)
+    parts = []
+    for i in range(n_contigs):
+        seq = rng.choice(_ALPHABET, int(rng.integers(mean_length // 2, mean_length * 3 // 2))).tobytes()
+        lines = b"\n".join(seq[j:j + width] for j in range(0, len(seq), width))
+        parts.append(b">contig_%d\n%s\n" % (i, lines))
+    return b"".join(parts)
+
+
+def make_short_records(n_records: int = 200_000, length: int = 150) -> bytes:
+    """FASTA con muchos registros cortos (p. ej. lecturas exportadas)."""
+    rng = np.random.default_rng(1)
+    seqs = rng.choice(_ALPHABET, (n_records, length))
+    return b"".join(b">read_%d\n%s\n" % (i, s.tobytes()) for i, s in enumerate(seqs))
+
+
+def make_fastq(n_reads: int = 200_000, length: int = 150) -> bytes:
+    """FASTQ Phred+33 de 4 líneas por registro con lecturas de longitud fija."""
+    rng = np.random.default_rng(2)
+    seqs = rng.choice(_ALPHABET[:4], (n_reads, length))
+    quals = rng.integers(35, 75, (n_reads, length), dtype=np.uint8)
+    return b"".join(
+        b"@read_%d\n%s\n+\n%s\n" % (i, s.tobytes(), q.tobytes())
+        for i, (s, q) in enumerate(zip(seqs, quals))
+    )
+
+
+def gc_content_biopython(data: bytes) -> int:
+    """Implementación original de process_fasta_gc_content."""
+    gc_contents = []
+    for record in SeqIO.parse(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), "fasta"):
+        seq = str(record.seq).upper()
+        total_bases = len(seq)
+        gc_contents.append(((seq.count('G') + seq.count('C')) / total_bases) * 100 if total_bases else 0.0)
+    return len(gc_contents)
+
+
+def gc_content_engine(data: bytes) -> int:
+    return gc_content_results(scan_fasta(iter_chunks(io.BytesIO(data))))["sequence_count"]
+
+
+def fasta_count_biopython(data: bytes) -> int:
+    """Implementación original de process_fasta_count."""
+    sequence_count = 0
+    for record in SeqIO.parse(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), "fasta"):
+        sequence_count += 1
+    return sequence_count
+
+
+def fasta_count_engine(data: bytes) -> int:
+    return count_fasta(iter_chunks(io.BytesIO(data))).sequence_count
+
+
+def fastq_stats_biopython(data: bytes) -> int:
+    """Implementación original de process_fastq_stats."""
+    all_lengths = []
+    all_avg_qualities = []
+    for record in SeqIO.parse(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), "fastq"):
+        all_lengths.append(len(record.seq))
+        quality_scores = record.letter_annotations["phred_quality"]
+        if quality_scores:
+            all_avg_qualities.append(np.mean(quality_scores))
+    np.mean(all_avg_qualities)
+    return len(all_lengths)
+
+
+def fastq_stats_engine(data: bytes) -> int:
+    return fastq_stats_results(scan_fastq(iter_chunks(io.BytesIO(data))))["sequence_count"]
+
+
+def report(name: str, data: bytes, baseline, engine) -> None:
+    start = time.perf_counter()
+    records = baseline(data)
+    baseline_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert engine(data) == records
+    engine_time = time.perf_counter() - start
+
+    size_mb = len(data) / (1024 * 1024)
+    print(f"{name}: {size_mb:.1f} MB, {records} registros")
+    print(f"  Bio.SeqIO : {size_mb / baseline_time:8.1f} MB/s  {records / baseline_time:12.0f} registros/s")
+    print(f"  motor     : {size_mb / engine_time:8.1f} MB/s  {records / engine_time:12.0f} registros/s")
+    print(f"  aceleración: {baseline_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    report("GC FASTA (ensamblaje)", make_assembly(), gc_content_biopython, gc_content_engine)
+    report("GC FASTA (registros cortos)", make_short_records(), gc_content_biopython, gc_content_engine)
+    report("Conteo FASTA (registros cortos)", make_short_records(), fasta_count_biopython, fasta_count_engine)
+    report("Estadísticas FASTQ", make_fastq(), fastq_stats_biopython, fastq_stats_engine)
@@ -9,6 +9,15 @@ from app.main import app
 # 1. Create a mock S3 client and the override function
 mock_s3_client = MagicMock()
 
+
+def _drain_upload(fileobj, bucket, key, Config=None):
+    """Reads the stream like boto3 does, so validation and hashing run."""
+    while fileobj.read(1024 * 1024):
+        pass
+
+
+mock_s3_client.upload_fileobj.side_effect = _drain_upload
+
 def override_get_s3_client():
     """Dependency override function that returns our mock S3 client."""
     return mock_s3_client
@@ -70,3 +79,1016 @@ def test_upload_fasta_for_analysis(mock_process_fasta_count: MagicMock, client:
     # 6. Assert that our mocks were called as expected
     mock_s3_client.upload_fileobj.assert_called_once()
     mock_process_fasta_count.delay.assert_called_once()
+
+
+@patch('app.routers.analysis.process_fasta_profile')
+def test_upload_fasta_profile_validates_metrics(mock_process_fasta_profile: MagicMock, client: TestClient):
+    """
+    The profile endpoint starts a single task with the requested metric sets
+    and rejects unknown ones before uploading anything.
+    """
+    mock_s3_client.reset_mock()
+    mock_task = MagicMock()
+    mock_task.id = "a-profile-task-id"
+    mock_process_fasta_profile.delay.return_value = mock_task
+
+    client.post("/api/users/", json={"email": "profiler@example.com", "name": "Profiler"})
+    org_response = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Profile Organism", "genus": "Profile", "species": "organism"},
+    )
+    strain_response = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Strain for Profile", "source": "Test Lab", "organism_id": org_response.json()["id"]},
+    )
+    strain_id = strain_response.json()["id"]
+
+    response = client.post(
+        "/api/analysis/upload/fasta_profile",
+        data={"strain_id": strain_id, "metrics": "count,n50"},
+        files={"file": ("test.fasta", BytesIO(b">seq1\nACGT\n"), "text/plain")},
+    )
+    assert response.status_code == 400
+    mock_s3_client.upload_fileobj.assert_not_called()
+
+    response = client.post(
+        "/api/analysis/upload/fasta_profile",
+        data={"strain_id": strain_id, "metrics": "lengths, count"},
+        files={"file": ("test.fasta.gz", BytesIO(b">seq1\nACGT\n"), "application/gzip")},
+    )
+    assert response.status_code == 202, response.text
+    assert response.json()["metrics"] == ["lengths", "count"]
+    assert mock_process_fasta_profile.delay.call_args.kwargs["metrics"] == ["lengths", "count"]
+
+
+def test_similar_strains_ranks_by_minhash_sketch(client: TestClient, db_session, monkeypatch):
+    """
+    /similar ranks other strains by their closest sketch and skips the
+    query strain itself.
+    """
+    import numpy as np
+    from app import crud, schemas
+    from app.core.config import settings
+    from app.core.minhash import sketch_fasta
+    from app.routers import analysis as analysis_router
+
+    monkeypatch.setattr(analysis_router, "_sketch_index", None)
+    user_id = client.post("/api/users/", json={"email": "sketch@example.com", "name": "Sketch"}).json()["id"]
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Sketch Organism", "genus": "Sketch", "species": "organism"},
+    ).json()["id"]
+
+    rng = np.random.default_rng(9)
+    base = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), 20_000)
+    analysis_ids = []
+    for name, rate in (("query", 0.0), ("close", 0.005), ("far", 0.05), ("unrelated", 1.0)):
+        genome = base.copy()
+        mutated = rng.random(genome.size) < rate
+        genome[mutated] = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), mutated.sum())
+        strain_id = client.post(
+            "/api/ceparium/strains/",
+            json={"strain_name": name, "source": "Test Lab", "organism_id": organism_id},
+        ).json()["id"]
+        analysis = crud.create_analysis(
+            db_session,
+            schemas.AnalysisCreate(analysis_type="fasta_count", results={}, strain_id=strain_id, file_url="x"),
+            owner_id=user_id,
+        )
+        hashes = sketch_fasta([b">s\n" + genome.tobytes()], settings.SKETCH_K, settings.SKETCH_SIZE).hashes()
+        crud.create_analysis_sketch(
+            db_session, analysis.id, strain_id, settings.SKETCH_K, settings.SKETCH_SIZE, hashes.astype('<u8').tobytes()
+        )
+        analysis_ids.append(analysis.id)
+
+    response = client.get(f"/api/analysis/similar/{analysis_ids[0]}")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["indexed_sketches"] == 4
+    assert [r["strain_name"] for r in data["results"]] == ["close", "far"]
+    assert data["results"][0]["ani"] > data["results"][1]["ani"] > 90
+
+    assert client.get("/api/analysis/similar/999999").status_code == 404
+    for limit in (0, settings.SIMILAR_STRAINS_MAX_LIMIT + 1):
+        assert client.get(f"/api/analysis/similar/{analysis_ids[0]}", params={"limit": limit}).status_code == 422
+
+    # Deleting an analysis deletes its sketch and drops it from the index
+    db_session.delete(crud.get_analysis(db_session, analysis_id=analysis_ids[1]))
+    db_session.commit()
+    data = client.get(f"/api/analysis/similar/{analysis_ids[0]}").json()
+    assert data["indexed_sketches"] == 3
+    assert [r["strain_name"] for r in data["results"]] == ["far"]
+
+
+def test_analysis_records_are_paginated(client: TestClient, db_session):
+    """
+    /records pages through per-record results and validates the window.
+    """
+    from app import crud, schemas
+
+    user_id = client.post("/api/users/", json={"email": "records@example.com", "name": "Records"}).json()["id"]
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Records Organism", "genus": "Records", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Records Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+    gc_values = [round(40 + i / 100, 2) for i in range(250)]
+    analysis = crud.create_analysis(
+        db_session,
+        schemas.AnalysisCreate(
+            analysis_type="fasta_gc_content",
+            results={"sequence_count": 250, "average_gc_content": 41.25, "individual_gc_contents": gc_values},
+            strain_id=strain_id,
+            file_url="x",
+        ),
+        owner_id=user_id,
+    )
+
+    response = client.get(f"/api/analysis/{analysis.id}/records", params={"offset": 200, "limit": 100})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["record_count"] == 250
+    assert data["columns"]["gc_content"] == gc_values[200:]
+
+    assert client.get(f"/api/analysis/{analysis.id}/records", params={"limit": 0}).status_code == 400
+    assert client.get("/api/analysis/999999/records").status_code == 404
+
+
+
+class _ListingS3Client:
+    """S3 client whose list_objects_v2 returns two keys per page."""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys=1000, ContinuationToken=None):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix) and key > (ContinuationToken or ""))
+        response = {
+            "Contents": [{"Key": key, "LastModified": self.objects[key]} for key in keys[:2]],
+            "IsTruncated": len(keys) > 2,
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = keys[1]
+        return response
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+
+def test_unreferenced_record_columns_are_collected(client: TestClient, db_session, monkeypatch):
+    """
+    The cleanup task deletes old results/{uuid}/ columns that no analysis or
+    cache entry points to, and old staging keys, across listing pages.
+    """
+    from datetime import datetime, timedelta, timezone
+    from app import crud, schemas, tasks
+    from app.core.result_cache import cache_parameters
+
+    user_id = client.post("/api/users/", json={"email": "sweep@example.com", "name": "Sweep"}).json()["id"]
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Sweep Organism", "genus": "Sweep", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Sweep Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    def pointer(prefix):
+        return {"format": "npy", "bucket": "b", "record_count": 2, "columns": {
+            "gc_content": {"key": f"{prefix}/gc_content.npy", "dtype": "<u2", "data_offset": 128, "scale": 100},
+        }}
+
+    crud.create_analysis(
+        db_session,
+        schemas.AnalysisCreate(
+            analysis_type="fasta_gc_content", results={"record_columns": pointer("results/analysis")},
+            strain_id=strain_id, file_url="x",
+        ),
+        owner_id=user_id,
+    )
+    crud.create_cached_result(
+        db_session, "0" * 64, "fasta_gc_content", "1", cache_parameters(),
+        {"record_columns": pointer("results/cached")},
+    )
+
+    old = datetime.now(timezone.utc) - timedelta(days=3)
+    s3 = _ListingS3Client({
+        "results/analysis/gc_content.npy": old,
+        "results/analysis/length.npy": old,
+        "results/cached/gc_content.npy": old,
+        "results/orphan/gc_content.npy": old,
+        "results/orphan/length.npy": old,
+        "results/recent/gc_content.npy": datetime.now(timezone.utc),
+        "staging/1": datetime.now(timezone.utc),
+        "staging/2": datetime.now(timezone.utc),
+        "staging/3": old,
+        "staging/4": old,
+    })
+    monkeypatch.setattr(tasks, "get_s3_client", lambda: s3)
+    monkeypatch.setattr(tasks, "get_db_task", lambda: iter([db_session]))
+
+    result = tasks.collect_unreferenced_objects.apply().get()
+
+    assert (result["deleted_staging_objects"], result["deleted_result_objects"]) == (2, 2)
+    assert sorted(s3.objects) == [
+        "results/analysis/gc_content.npy", "results/analysis/length.npy",
+        "results/cached/gc_content.npy", "results/recent/gc_content.npy", "staging/1", "staging/2",
+    ]
+
+
+@patch('app.routers.analysis.process_fasta_count')
+def test_cached_results_skip_the_task(mock_process_fasta_count: MagicMock, client: TestClient, db_session):
+    """
+    Re-uploading content already analysed with the current engine version
+    creates the analysis from the cache without enqueueing a task.
+    """
+    import hashlib
+    from app import crud, models
+    from app.core.config import settings
+    from app.core.result_cache import ENGINE_VERSIONS, cache_parameters
+
+    mock_s3_client.reset_mock()
+    mock_task = MagicMock()
+    mock_task.id = "a-mock-task-id"
+    mock_process_fasta_count.delay.return_value = mock_task
+
+    client.post("/api/users/", json={"email": "cache@example.com", "name": "Cache"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Cache Organism", "genus": "Cache", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Cache Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    content = b">seq1\nACGT\n>seq2\nGCTA\n"
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    # Miss: the task runs and receives the content hash
+    response = client.post(
+        "/api/analysis/upload/fasta_count",
+        data={"strain_id": strain_id},
+        files={"file": ("first.fasta", BytesIO(content), "text/plain")},
+    )
+    assert response.status_code == 202, response.text
+    assert mock_process_fasta_count.delay.call_args.kwargs["content_hash"] == content_hash
+
+    crud.create_cached_result(
+        db_session, content_hash, "fasta_count", ENGINE_VERSIONS["fasta_count"],
+        cache_parameters(), {"sequence_count": 2},
+    )
+    mock_process_fasta_count.delay.reset_mock()
+
+    # Hit: no task, the analysis is created with the cached results and,
+    # as no analysis of the file has a sketch yet, its sketch is enqueued
+    with patch('app.tasks.compute_fasta_sketch') as compute_fasta_sketch:
+        response = client.post(
+            "/api/analysis/upload/fasta_count",
+            data={"strain_id": strain_id},
+            files={"file": ("second.fasta", BytesIO(content), "text/plain")},
+        )
+    assert response.status_code == 202, response.text
+    data = response.json()
+    assert data["cached"] is True
+    assert data["task_id"] is None
+    mock_process_fasta_count.delay.assert_not_called()
+    assert compute_fasta_sketch.delay.call_args.args[0] == data["analysis_id"]
+
+    analysis = db_session.get(models.Analysis, data["analysis_id"])
+    assert analysis.results == {"filename": "second.fasta", "sequence_count": 2}
+    assert crud.get_cached_result(
+        db_session, content_hash, "fasta_count", ENGINE_VERSIONS["fasta_count"], cache_parameters()
+    ).hit_count == 1
+
+    # Later hits for the same content copy the existing sketch instead
+    crud.create_analysis_sketch(
+        db_session, analysis_id=analysis.id, strain_id=strain_id,
+        k=settings.SKETCH_K, sketch_size=settings.SKETCH_SIZE, hashes=b"\x01" * 8,
+    )
+    other_strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Other Cache Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+    with patch('app.tasks.compute_fasta_sketch') as compute_fasta_sketch:
+        response = client.post(
+            "/api/analysis/upload/fasta_count",
+            data={"strain_id": other_strain_id},
+            files={"file": ("third.fasta", BytesIO(content), "text/plain")},
+        )
+    compute_fasta_sketch.delay.assert_not_called()
+    sketch = crud.get_analysis_sketch(db_session, response.json()["analysis_id"])
+    assert (sketch.strain_id, sketch.hashes) == (other_strain_id, b"\x01" * 8)
+
+
+@patch('app.routers.analysis.process_fasta_count')
+def test_duplicate_uploads_are_stored_once(mock_process_fasta_count: MagicMock, client: TestClient):
+    """
+    Uploads are stored under a content-addressed key; identical content is
+    copied there once and the second staged copy is discarded.
+    """
+    import hashlib
+    from app.core.object_store import content_object_key
+
+    mock_s3_client.reset_mock()
+    mock_process_fasta_count.delay.return_value = MagicMock(id="a-mock-task-id")
+
+    client.post("/api/users/", json={"email": "dedup@example.com", "name": "Dedup"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Dedup Organism", "genus": "Dedup", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Dedup Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    content = b">seq1\nACGTACGT\n"
+    for name in ("a.fasta", "b.fasta"):
+        response = client.post(
+            "/api/analysis/upload/fasta_count",
+            data={"strain_id": strain_id},
+            files={"file": (name, BytesIO(content), "text/plain")},
+        )
+        assert response.status_code == 202, response.text
+
+    expected_key = content_object_key(hashlib.sha256(content).hexdigest())
+    assert mock_s3_client.upload_fileobj.call_count == 2
+    mock_s3_client.copy.assert_called_once()
+    assert mock_s3_client.copy.call_args.args[2] == expected_key
+    staging_keys = [call.args[2] for call in mock_s3_client.upload_fileobj.call_args_list]
+    assert [call.kwargs["Key"] for call in mock_s3_client.delete_object.call_args_list] == staging_keys
+
+    metrics = client.get("/api/analysis/uploads/metrics").json()
+    assert metrics["deduplicated_uploads"] >= 1
+    assert metrics["last_upload"]["bytes"] == len(content)
+    calls = mock_process_fasta_count.delay.call_args_list
+    assert [call.kwargs["object_key"] for call in calls] == [expected_key, expected_key]
+    assert [call.kwargs["filename"] for call in calls] == ["a.fasta", "b.fasta"]
+
+
+def test_invalid_upload_is_rejected_while_streaming(client: TestClient):
+    """
+    Validation runs on the stream boto3 reads: a file with the wrong format
+    aborts the staged upload and is never promoted to the content store.
+    """
+    mock_s3_client.reset_mock()
+    client.post("/api/users/", json={"email": "invalid@example.com", "name": "Invalid"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Invalid Organism", "genus": "Invalid", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Invalid Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    response = client.post(
+        "/api/analysis/upload/fasta_count",
+        data={"strain_id": strain_id},
+        files={"file": ("reads.fasta", BytesIO(b"@r1\nACGT\n+\nIIII\n"), "text/plain")},
+    )
+    assert response.status_code == 400
+    mock_s3_client.upload_fileobj.assert_called_once()
+    mock_s3_client.copy.assert_not_called()
+
+
+class _CopyingS3Client:
+    """In-memory S3 client with get_object, copy and delete_object."""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def get_object(self, Bucket, Key):
+        return {"Body": BytesIO(self.objects[(Bucket, Key)])}
+
+    def copy(self, CopySource, Bucket, Key, Config=None):
+        self.objects[(Bucket, Key)] = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[(Bucket, Key)]
+
+
+def test_legacy_uploads_migrate_to_content_store(client: TestClient, db_session):
+    """
+    The migration moves legacy uuid keys to one content-addressed object
+    and repoints every analysis that referenced them.
+    """
+    import hashlib
+    from datetime import datetime, timedelta, timezone
+    from app import crud, schemas
+    from app.core.config import settings
+    from app.core.object_store import content_object_key
+    from app.tasks import migrate_legacy_upload
+
+    user_id = client.post("/api/users/", json={"email": "migrate@example.com", "name": "Migrate"}).json()["id"]
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Migrate Organism", "genus": "Migrate", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Migrate Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    content = b">seq1\nACGT\n"
+    legacy_keys = ["uploads/1111-a.fasta", "uploads/2222-b.fasta"]
+    s3 = _CopyingS3Client({("bucket", key): content for key in legacy_keys})
+    legacy_urls = [f"{settings.MINIO_ENDPOINT}/bucket/{key}" for key in legacy_keys]
+    for file_url in legacy_urls + legacy_urls[:1]:
+        crud.create_analysis(
+            db_session,
+            schemas.AnalysisCreate(analysis_type="fasta_count", results={}, strain_id=strain_id, file_url=file_url),
+            owner_id=user_id,
+        )
+
+    new_urls = {migrate_legacy_upload(db_session, s3, file_url) for file_url in legacy_urls}
+
+    content_key = content_object_key(hashlib.sha256(content).hexdigest())
+    assert list(s3.objects) == [("bucket", content_key)]
+    assert new_urls == {f"{settings.MINIO_ENDPOINT}/bucket/{content_key}"}
+    assert crud.count_object_references(db_session, new_urls.pop()) == 3
+
+    # Only objects nobody references are eligible for cleanup
+    crud.register_stored_object(db_session, "0" * 64, "bucket", content_object_key("0" * 64), "unused-url")
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    assert [o.content_hash for o in crud.get_unreferenced_stored_objects(db_session, later)] == ["0" * 64]
+
+
+def test_direct_upload_presigns_parts_and_enqueues_on_complete(client: TestClient, db_session, monkeypatch):
+    """
+    The direct upload flow returns presigned part URLs and, on completion,
+    joins the parts and enqueues an ingest task that checks and hashes the
+    object in the worker, moves it to its content-addressed key and replaces
+    itself with the analysis (or reuses cached results).
+    """
+    import hashlib
+    from datetime import datetime, timedelta, timezone
+    from app import crud, models, tasks
+    from app.core.object_store import content_object_key
+    from app.core.result_cache import ENGINE_VERSIONS, cache_parameters
+    from app.core.transfers import MB
+    from app.routers import analysis as analysis_router
+
+    mock_s3_client.reset_mock()
+    presign_client = MagicMock()
+    presign_client.generate_presigned_url.side_effect = lambda op, Params, ExpiresIn: f"https://minio/part/{Params['PartNumber']}"
+    app.dependency_overrides[analysis_router.get_presign_client] = lambda: presign_client
+    mock_s3_client.create_multipart_upload.return_value = {"UploadId": "s3-upload"}
+
+    client.post("/api/users/", json={"email": "direct@example.com", "name": "Direct"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Direct Organism", "genus": "Direct", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Direct Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    size = 40 * MB
+    try:
+        response = client.post("/api/analysis/uploads", json={
+            "strain_id": strain_id, "analysis_type": "kmer_spectrum", "filename": "reads.fq.gz",
+            "size": size, "parameters": {"k": 25},
+        })
+        assert response.status_code == 201, response.text
+        created = response.json()
+        assert created["part_size"] == 16 * MB
+        assert [part["url"] for part in created["parts"]] == [f"https://minio/part/{n}" for n in (1, 2, 3)]
+
+        assert client.post("/api/analysis/uploads", json={
+            "strain_id": strain_id, "analysis_type": "kmer_spectrum", "filename": "reads.fq",
+            "size": size, "parameters": {"genome_size": 5},
+        }).status_code == 400
+        # Flags must be real booleans (a string "false" would be truthy)
+        for analysis_type, filename, parameters in (
+            ("fastq_stats", "reads.fq", {"approximate": "false"}),
+            ("gff_stats", "genes.gff", {"deep_validation": 1}),
+            ("kmer_spectrum", "reads.fq", {"k": True}),
+        ):
+            assert client.post("/api/analysis/uploads", json={
+                "strain_id": strain_id, "analysis_type": analysis_type, "filename": filename,
+                "size": size, "parameters": parameters,
+            }).status_code == 400
+    finally:
+        del app.dependency_overrides[analysis_router.get_presign_client]
+
+    complete_url = f"/api/analysis/uploads/{created['upload_id']}/complete"
+    mock_s3_client.list_parts.return_value = {
+        "Parts": [{"PartNumber": n, "ETag": f'"{n}"'} for n in (1, 2)], "IsTruncated": False
+    }
+    assert client.post(complete_url).status_code == 400  # falta la parte 3
+
+    mock_s3_client.list_parts.return_value = {
+        "Parts": [{"PartNumber": n, "ETag": f'"{n}"'} for n in (1, 2, 3)], "IsTruncated": False
+    }
+    content = b"@r1\nACGT\n+\nIIII\n"
+    content_hash = hashlib.sha256(content).hexdigest()
+    staging_key = mock_s3_client.create_multipart_upload.call_args.kwargs["Key"]
+    assert staging_key.startswith("staging/")
+    mock_s3_client.head_object.return_value = {"ContentLength": size}
+    mock_s3_client.get_object.side_effect = lambda **kw: {"Body": BytesIO(content)}
+    monkeypatch.setattr(tasks, "get_s3_client", lambda: mock_s3_client)
+    monkeypatch.setattr(tasks, "get_db_task", lambda: iter([db_session]))
+
+    def ingest(upload_id):
+        """Runs the ingest task eagerly and returns the task it replaced itself with."""
+        kwargs = ingest_delay.call_args.kwargs
+        assert kwargs["upload_id"] == upload_id
+        with patch.object(tasks.ingest_direct_upload, "replace", side_effect=lambda sig: sig) as replace:
+            result = tasks.ingest_direct_upload.apply(kwargs=kwargs).get()
+        return result, replace
+
+    try:
+        with patch.object(analysis_router.ingest_direct_upload, "delay") as ingest_delay, \
+                patch.object(analysis_router.celery_app, "AsyncResult") as async_result:
+            ingest_delay.return_value = MagicMock(id="ingest-task")
+            async_result.return_value = MagicMock(state="PENDING")
+            response = client.post(complete_url)
+            assert response.status_code == 202, response.text
+            assert response.json()["task_id"] == "ingest-task"
+            assert ingest_delay.call_args.kwargs["analysis_task"] == analysis_router.process_kmer_spectrum.name
+            assert ingest_delay.call_args.kwargs["expected_format"] == "fastq"
+            # The API never reads the uploaded object
+            mock_s3_client.get_object.assert_not_called()
+
+            # Completar otra vez devuelve la misma tarea sin volver a encolar
+            assert client.post(complete_url).json()["task_id"] == "ingest-task"
+            ingest_delay.assert_called_once()
+
+            signature, replace = ingest(created["upload_id"])
+            kwargs = signature.kwargs
+            assert signature.task == analysis_router.process_kmer_spectrum.name
+            assert (kwargs["k"], kwargs["file_format"], kwargs["filename"]) == (25, "fastq", "reads.fq.gz")
+            assert (kwargs["object_key"], kwargs["content_hash"]) == (content_object_key(content_hash), content_hash)
+            assert mock_s3_client.copy.call_args.args[2] == content_object_key(content_hash)
+            assert mock_s3_client.delete_object.call_args.kwargs["Key"] == staging_key
+            assert crud.get_stored_object(db_session, content_hash) is not None
+            assert crud.get_direct_upload(db_session, created["upload_id"]).status == "completed"
+
+            # The same content with cached results completes without a task
+            crud.create_cached_result(
+                db_session, content_hash, "kmer_spectrum", ENGINE_VERSIONS["kmer_spectrum"],
+                cache_parameters(file_format="fastq", k=25), {"distinct_kmers": 4},
+            )
+            app.dependency_overrides[analysis_router.get_presign_client] = lambda: presign_client
+            try:
+                second = client.post("/api/analysis/uploads", json={
+                    "strain_id": strain_id, "analysis_type": "kmer_spectrum", "filename": "again.fq.gz",
+                    "size": size, "parameters": {"k": 25},
+                }).json()
+                stale = client.post("/api/analysis/uploads", json={
+                    "strain_id": strain_id, "analysis_type": "kmer_spectrum", "filename": "never.fq.gz",
+                    "size": size, "parameters": {"k": 25},
+                }).json()
+            finally:
+                del app.dependency_overrides[analysis_router.get_presign_client]
+            assert client.post(f"/api/analysis/uploads/{second['upload_id']}/complete").status_code == 202
+            result, replace = ingest(second["upload_id"])
+            replace.assert_not_called()
+            assert result["status"] == "SUCCESS"
+            upload = crud.get_direct_upload(db_session, second["upload_id"])
+            assert (upload.status, upload.analysis_id) == ("completed", result["analysis_id"])
+            mock_s3_client.copy.assert_called_once()
+    finally:
+        mock_s3_client.get_object.side_effect = None
+
+    # A direct upload that is never completed is aborted once its URLs expire
+    db_session.query(models.DirectUpload).filter(models.DirectUpload.id == stale["upload_id"]).update(
+        {"timestamp": datetime.now(timezone.utc) - timedelta(days=3)}
+    )
+    db_session.commit()
+    monkeypatch.setattr(tasks, "get_upload_session_store", lambda: MagicMock(abandoned=lambda limit: []))
+    mock_s3_client.abort_multipart_upload.reset_mock()
+    assert tasks.collect_abandoned_uploads.apply().get()["collected_uploads"] == 1
+    assert mock_s3_client.abort_multipart_upload.call_args.kwargs["UploadId"] == "s3-upload"
+    assert crud.get_direct_upload(db_session, stale["upload_id"]).status == "failed"
+    assert crud.get_direct_upload(db_session, second["upload_id"]).status == "completed"
+
+
+class _FakeRedis:
+    """In-memory subset of the Redis commands used by the upload session store."""
+
+    def __init__(self):
+        self.values, self.hashes, self.zsets = {}, {}, {}
+
+    def set(self, name, value, ex=None):
+        self.values[name] = value
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def expire(self, name, seconds):
+        pass
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+            self.hashes.pop(name, None)
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, member):
+        self.zsets.get(name, {}).pop(member, None)
+
+    def zrangebyscore(self, name, low, high, start=0, num=None):
+        members = sorted((score, member) for member, score in self.zsets.get(name, {}).items() if low <= score <= high)
+        return [member for _, member in members][start:start + num if num else None]
+
+
+def test_resumable_upload_reports_offset_and_completes(client: TestClient):
+    """
+    Chunks can arrive in any order and be retried; the status reports the
+    resume offset and completion stores the file.
+    """
+    import hashlib
+    from app.core.object_store import content_object_key
+    from app.core.transfers import MB
+    from app.core.upload_sessions import UploadSessionStore, get_upload_session_store
+
+    now = [1000.0]
+    sessions = UploadSessionStore(_FakeRedis(), ttl_seconds=3600, clock=lambda: now[0])
+    app.dependency_overrides[get_upload_session_store] = lambda: sessions
+    mock_s3_client.reset_mock()
+    mock_s3_client.create_multipart_upload.return_value = {"UploadId": "s3-upload"}
+    mock_s3_client.upload_part.side_effect = lambda **kw: {"ETag": f'"{hashlib.md5(kw["Body"]).hexdigest()}"'}
+
+    try:
+        client.post("/api/users/", json={"email": "resume@example.com", "name": "Resume"})
+        organism_id = client.post(
+            "/api/ceparium/organisms/",
+            json={"name": "Resume Organism", "genus": "Resume", "species": "organism"},
+        ).json()["id"]
+        strain_id = client.post(
+            "/api/ceparium/strains/",
+            json={"strain_name": "Resume Strain", "source": "Test Lab", "organism_id": organism_id},
+        ).json()["id"]
+
+        data = b"A" * (8 * MB) + b"C" * (8 * MB) + b"G" * 100
+        created = client.post("/api/analysis/resumable", json={
+            "strain_id": strain_id, "filename": "genome.fasta", "size": len(data),
+        }).json()
+        upload_id, chunk_size = created["upload_id"], created["chunk_size"]
+        assert (chunk_size, created["chunk_count"]) == (8 * MB, 3)
+
+        def put(n, body):
+            return client.put(f"/api/analysis/resumable/{upload_id}/chunks/{n}", content=body)
+
+        assert put(3, data[2 * chunk_size:]).status_code == 200
+        assert put(1, data[:chunk_size]).status_code == 200
+        assert put(2, data[chunk_size:chunk_size + 10]).status_code == 400  # tamaño incorrecto
+        # A streamed body without Content-Length is refused before it is read
+        chunked = client.put(f"/api/analysis/resumable/{upload_id}/chunks/2", content=iter([data[chunk_size:2 * chunk_size]]))
+        assert chunked.status_code == 411
+
+        status = client.get(f"/api/analysis/resumable/{upload_id}").json()
+        assert status["received_chunks"] == [1, 3]
+        assert status["missing_chunks"] == [2]
+        assert status["offset"] == chunk_size
+        assert client.post(f"/api/analysis/resumable/{upload_id}/complete").status_code == 400
+
+        assert put(2, data[chunk_size:2 * chunk_size]).status_code == 200
+        mock_s3_client.head_object.return_value = {"ContentLength": len(data)}
+        mock_s3_client.get_object.side_effect = lambda **kw: {"Body": BytesIO(data)}
+
+        # A failure after the parts are joined keeps the session, and the retry resumes
+        mock_s3_client.copy.side_effect = Exception("MinIO unavailable")
+        assert client.post(f"/api/analysis/resumable/{upload_id}/complete").status_code == 500
+        assert sessions.get(upload_id)["assembled"] is True
+        mock_s3_client.copy.side_effect = None
+        response = client.post(f"/api/analysis/resumable/{upload_id}/complete")
+        assert response.status_code == 202, response.text
+        mock_s3_client.complete_multipart_upload.assert_called_once()
+        assert response.json()["analysis_id"]
+        assert response.json()["file_url"].endswith(content_object_key(hashlib.sha256(data).hexdigest()))
+        parts = mock_s3_client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+        assert [part["PartNumber"] for part in parts] == [1, 2, 3]
+        assert sessions.get(upload_id) is None
+
+        # Sessions left idle past the TTL are reported for cleanup
+        abandoned = client.post("/api/analysis/resumable", json={
+            "strain_id": strain_id, "filename": "other.fasta", "size": 10,
+        }).json()["upload_id"]
+        assert sessions.abandoned() == []
+        now[0] += 3601
+        assert sessions.abandoned() == [abandoned]
+    finally:
+        del app.dependency_overrides[get_upload_session_store]
+        mock_s3_client.upload_part.side_effect = None
+        mock_s3_client.get_object.side_effect = None
+        mock_s3_client.copy.side_effect = None
+
+
+def test_download_streams_ranges_and_revalidates(client: TestClient, db_session):
+    """
+    Downloads stream the object and map Range / If-None-Match onto S3.
+    """
+    from botocore.exceptions import ClientError
+    from app import crud, schemas
+    from app.routers import analysis as analysis_router
+
+    user_id = client.post("/api/users/", json={"email": "download@example.com", "name": "Download"}).json()["id"]
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Download Organism", "genus": "Download", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Download Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+    analysis = crud.create_analysis(
+        db_session,
+        schemas.AnalysisCreate(
+            analysis_type="raw_file", results={"filename": "reads.fastq"}, strain_id=strain_id,
+            file_url="http://minio:9000/bucket/objects/sha256/ab/abcdef",
+        ),
+        owner_id=user_id,
+    )
+    url = f"/api/analysis/{analysis.id}/download"
+    data = b"@r1\nACGT\n+\nIIII\n" * 1000
+
+    mock_s3_client.reset_mock()
+    mock_s3_client.get_object.return_value = {"Body": BytesIO(data), "ContentLength": len(data), "ETag": '"etag"'}
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["etag"] == '"etag"'
+    assert 'filename="reads.fastq"' in response.headers["content-disposition"]
+
+    mock_s3_client.get_object.return_value = {
+        "Body": BytesIO(data[:100]), "ContentLength": 100, "ETag": '"etag"',
+        "ContentRange": f"bytes 0-99/{len(data)}",
+    }
+    response = client.get(url, headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-99/{len(data)}"
+    assert mock_s3_client.get_object.call_args.kwargs["Range"] == "bytes=0-99"
+
+    mock_s3_client.get_object.side_effect = ClientError({"Error": {"Code": "304"}}, "GetObject")
+    response = client.get(url, headers={"If-None-Match": '"etag"'})
+    assert response.status_code == 304
+    mock_s3_client.get_object.side_effect = None
+
+    presign_client = MagicMock()
+    presign_client.generate_presigned_url.return_value = "http://minio:9000/presigned"
+    app.dependency_overrides[analysis_router.get_presign_client] = lambda: presign_client
+    try:
+        response = client.get(url, params={"redirect": True}, follow_redirects=False)
+    finally:
+        del app.dependency_overrides[analysis_router.get_presign_client]
+    assert response.status_code == 307
+    assert response.headers["location"] == "http://minio:9000/presigned"
+
+
+@patch("app.routers.analysis.process_fasta_count")
+def test_uploads_do_not_block_the_event_loop(mock_process_fasta_count: MagicMock, client: TestClient):
+    """
+    While an upload is being sent to MinIO, other requests keep being served.
+    """
+    import threading
+    import anyio
+    import httpx
+
+    mock_process_fasta_count.delay.return_value = MagicMock(id="a-mock-task-id")
+    client.post("/api/users/", json={"email": "async@example.com", "name": "Async"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Async Organism", "genus": "Async", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Async Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+
+    entered, release = threading.Event(), threading.Event()
+    released = []
+
+    def slow_upload(fileobj, *args, **kwargs):
+        _drain_upload(fileobj, *args, **kwargs)
+        entered.set()
+        # If the upload blocked the event loop, /api/health could not answer and this would time out
+        released.append(release.wait(2))
+
+    mock_s3_client.reset_mock()
+    mock_s3_client.upload_fileobj.side_effect = slow_upload
+
+    async def scenario():
+        results = {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            async def upload():
+                results["upload"] = await http.post(
+                    "/api/analysis/upload/fasta_count",
+                    data={"strain_id": strain_id},
+                    files={"file": ("slow.fasta", b">seq1\nACGTTTGA\n", "text/plain")},
+                )
+
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(upload)
+                with anyio.fail_after(5):
+                    while not entered.is_set():
+                        await anyio.sleep(0.01)
+                results["health"] = await http.get("/api/health")
+                release.set()
+        return results
+
+    try:
+        results = anyio.run(scenario)
+    finally:
+        mock_s3_client.upload_fileobj.side_effect = _drain_upload
+    assert results["health"].status_code == 200
+    assert released == [True]
+    assert results["upload"].status_code == 202, results["upload"].text
+
+
+def test_batch_upload_dispatches_a_chord_and_reports_progress(client: TestClient, db_session):
+    """
+    A batch stores every file (including archive members), enqueues all the
+    analyses as one chord and reports aggregate progress until the chord
+    callback records the summary.
+    """
+    import json
+    import zipfile
+    from app import crud
+    from app.tasks import upload_batch_summary
+
+    client.post("/api/users/", json={"email": "batch@example.com", "name": "Batch"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Batch Organism", "genus": "Batch", "species": "organism"},
+    ).json()["id"]
+    strain_ids = [
+        client.post(
+            "/api/ceparium/strains/",
+            json={"strain_name": f"Batch Strain {i}", "source": "Test Lab", "organism_id": organism_id},
+        ).json()["id"]
+        for i in range(2)
+    ]
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("run/s1.fastq", "@r1\nACGT\n+\nIIII\n")
+        zf.writestr("run/s2.fastq", "@r2\nGGCC\n+\nIIII\n")
+    manifest = {"entries": [
+        {"filename": "run/s1.fastq", "strain_id": strain_ids[0], "analysis_type": "fastq_stats"},
+        {"filename": "run/s2.fastq", "strain_id": strain_ids[1], "analysis_type": "fastq_stats"},
+        {"filename": "genome.fasta", "strain_id": strain_ids[0], "analysis_type": "fasta_count"},
+    ]}
+    files = [
+        ("files", ("run.zip", archive.getvalue(), "application/zip")),
+        ("files", ("genome.fasta", b">seq1\nACGTAC\n", "text/plain")),
+    ]
+
+    response = client.post("/api/analysis/upload/batch", data={"manifest": json.dumps({"entries": manifest["entries"][:2]})}, files=files)
+    assert response.status_code == 400
+
+    mock_s3_client.reset_mock()
+    with patch("app.routers.analysis.chord") as mock_chord:
+        response = client.post("/api/analysis/upload/batch", data={"manifest": json.dumps(manifest)}, files=files)
+    assert response.status_code == 202, response.text
+    body = response.json()
+    assert (body["total"], body["queued"], body["cached"]) == (3, 3, 0)
+    assert mock_s3_client.upload_fileobj.call_count == 3
+    assert mock_s3_client.copy.call_count == 3
+
+    header = mock_chord.call_args.args[0]
+    assert [sig.kwargs["filename"] for sig in header.tasks] == ["run/s1.fastq", "run/s2.fastq", "genome.fasta"]
+    assert [sig.kwargs["strain_id"] for sig in header.tasks] == [strain_ids[0], strain_ids[1], strain_ids[0]]
+    assert mock_chord.return_value.call_args.args[0].kwargs["batch_id"] == body["batch_id"]
+
+    status_url = f"/api/analysis/upload/batch/{body['batch_id']}"
+    with patch("app.routers.analysis.celery_app") as mock_celery:
+        mock_celery.AsyncResult.return_value = MagicMock(state="PROGRESS", info={"progress": 50.0})
+        progress = client.get(status_url).json()
+    assert (progress["status"], progress["pending"], progress["progress"]) == ("processing", 3, 50.0)
+    assert [item["task_id"] for item in progress["files"]] == [sig.options["task_id"] for sig in header.tasks]
+
+    batch = crud.get_upload_batch(db_session, body["batch_id"])
+    results = [{"status": "SUCCESS", "analysis_id": 1}, {"status": "FAILED", "error": "boom"}, {"status": "SUCCESS", "analysis_id": 2}]
+    crud.complete_upload_batch(db_session, batch, upload_batch_summary(batch.entries, results))
+    progress = client.get(status_url).json()
+    assert (progress["status"], progress["completed"], progress["failed"], progress["progress"]) == ("completed", 2, 1, 100.0)
+    assert progress["summary"]["failures"][0]["filename"] == "run/s2.fastq"
+
+
+def test_batch_upload_failure_leaves_no_orphaned_objects(client: TestClient, db_session):
+    """
+    When a member fails mid-batch, the members already copied to the
+    content store stay registered and every staging key is deleted.
+    """
+    import hashlib
+    import json
+    from app import crud
+    from app.core.object_store import content_object_key
+
+    client.post("/api/users/", json={"email": "batchfail@example.com", "name": "Batch Fail"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Batch Fail Organism", "genus": "BatchFail", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Batch Fail Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+    contents = [b">a\nACGTAA\n", b">b\nACGTCC\n", b">c\nACGTGG\n"]
+    manifest = {"entries": [
+        {"filename": f"g{i}.fasta", "strain_id": strain_id, "analysis_type": "fasta_count"} for i in range(3)
+    ]}
+
+    def post(files):
+        return client.post("/api/analysis/upload/batch", data={"manifest": json.dumps(manifest)}, files=files)
+
+    def staging_keys():
+        return sorted(call.args[2] for call in mock_s3_client.upload_fileobj.call_args_list)
+
+    def deleted_keys():
+        return sorted(call.kwargs["Key"] for call in mock_s3_client.delete_object.call_args_list)
+
+    # Validation fails for one member: nothing is promoted, all staged copies are removed
+    mock_s3_client.reset_mock()
+    response = post([
+        ("files", (f"g{i}.fasta", b"@r\nACGT\n+\nIIII\n" if i == 1 else content, "text/plain"))
+        for i, content in enumerate(contents)
+    ])
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("g1.fasta:")
+    mock_s3_client.copy.assert_not_called()
+    # The rejected upload was aborted by the transfer; the other two staged copies are deleted
+    assert len(deleted_keys()) == 2 and set(deleted_keys()) < set(staging_keys())
+
+    # Promotion fails for the second member: the first one is already registered
+    mock_s3_client.reset_mock()
+    copies = []
+
+    def copy(source, bucket, key, Config=None):
+        copies.append(key)
+        if len(copies) == 2:
+            raise Exception("MinIO unavailable")
+
+    mock_s3_client.copy.side_effect = copy
+    try:
+        response = post([("files", (f"g{i}.fasta", content, "text/plain")) for i, content in enumerate(contents)])
+    finally:
+        mock_s3_client.copy.side_effect = None
+    assert response.status_code == 500
+    assert response.json()["detail"].startswith("g1.fasta:")
+    first = crud.get_stored_object(db_session, hashlib.sha256(contents[0]).hexdigest())
+    assert first is not None and first.object_key == copies[0] == content_object_key(first.content_hash)
+    assert crud.get_stored_object(db_session, hashlib.sha256(contents[1]).hexdigest()) is None
+    assert deleted_keys() == staging_keys()
+
+
+def test_batch_archives_are_checked_before_extraction(client: TestClient, monkeypatch):
+    """
+    Archive members that are not in the manifest are rejected before they
+    are extracted, and extraction stops at the batch size limit.
+    """
+    import json
+    import zipfile
+    from app.core import archives
+    from app.core.config import settings
+
+    client.post("/api/users/", json={"email": "archive@example.com", "name": "Archive"})
+    organism_id = client.post(
+        "/api/ceparium/organisms/",
+        json={"name": "Archive Organism", "genus": "Archive", "species": "organism"},
+    ).json()["id"]
+    strain_id = client.post(
+        "/api/ceparium/strains/",
+        json={"strain_name": "Archive Strain", "source": "Test Lab", "organism_id": organism_id},
+    ).json()["id"]
+    manifest = {"entries": [{"filename": "big.fasta", "strain_id": strain_id, "analysis_type": "fasta_count"}]}
+
+    def post(members):
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, content in members:
+                zf.writestr(name, content)
+        return client.post(
+            "/api/analysis/upload/batch", data={"manifest": json.dumps(manifest)},
+            files=[("files", ("run.zip", archive.getvalue(), "application/zip"))],
+        )
+
+    copied = []
+    copy_member = archives._copy_member
+    monkeypatch.setattr(archives, "_copy_member", lambda source, *args: copied.append(1) or copy_member(source, *args))
+
+    response = post([("notes.txt", b"x" * 1000), ("big.fasta", b">s\nACGT\n")])
+    assert response.status_code == 400
+    assert "notes.txt" in response.json()["detail"]
+    assert copied == []
+
+    monkeypatch.setattr(settings, "BATCH_MAX_EXTRACTED_MB", 1)
+    response = post([("big.fasta", b">s\n" + b"A" * (2 * 1024 * 1024))])
+    assert response.status_code == 400
+    assert "tamaño máximo" in response.json()["detail"]
@@ -0,0 +1,745 @@
+import gzip
+import io
+from collections import Counter
+
+import numpy as np
+import pytest
+from BCBio import GFF
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqFeature import SeqFeature, FeatureLocation
+from Bio.SeqRecord import SeqRecord
+
+from app.core.fasta_engine import scan_fasta, gc_content_results, count_fasta
+from app.core.fastq_engine import scan_fastq, fastq_stats_results
+from app.core.gff_engine import count_gff_features
+from app.core.genbank_engine import summarize_genbank, record_summaries
+from app.core.assembly_stats import assembly_stats
+from app.core.kmers import kmer_spectrum
+from app.core.minhash import sketch_fasta, jaccard_estimate, hash_kmers
+from app.core.sketch_index import SketchIndex
+from app.core.quality_profile import MAX_TRACKED_POSITIONS
+from app.core.length_stats import length_distribution, nx_statistics, length_summary
+from app.core.profiles import fasta_profile_results, fastq_profile_results
+from app.core.validators import get_file_extension
+from app.core.parallel import ENGINES, plan_ranges, scan_range, scan_stream
+from app.core.streams import iter_chunks
+
+
+FASTA_SAMPLE = (
+    b">seq1 primera secuencia\n"
+    b"ATGCgcgcNN\n"
+    b"acgt\n"
+    b">seq2 vacia\n"
+    b">seq3\r\n"
+    b"GGGG CCCC\r\n"
+    b"\n"
+    b">seq4 > no es cabecera\n"
+    b"AT>GC\n"
+    b"TTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTTT\n"
+    b">seq5 sin salto final\n"
+    b"nnnnGC"
+)
+
+
+def _biopython_gc_results(data: bytes) -> dict:
+    """Implementación original basada en SeqRecord, usada como referencia."""
+    gc_contents = []
+    for record in SeqIO.parse(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), "fasta"):
+        seq = str(record.seq).upper()
+        total_bases = len(seq)
+        if total_bases > 0:
+            gc_contents.append(((seq.count('G') + seq.count('C')) / total_bases) * 100)
+        else:
+            gc_contents.append(0.0)
+    return {
+        "sequence_count": len(gc_contents),
+        "average_gc_content": round(np.mean(gc_contents), 2),
+        "individual_gc_contents": [round(gc, 2) for gc in gc_contents],
+    }
+
+
+def test_fasta_gc_engine_matches_biopython():
+    expected = _biopython_gc_results(FASTA_SAMPLE)
+    for chunk_size in (1, 3, 16, 1024):
+        scanner = scan_fasta(iter_chunks(io.BytesIO(FASTA_SAMPLE), chunk_size))
+        assert gc_content_results(scanner) == expected
+
+
+def test_fasta_gc_engine_many_short_records():
+    # Más de 16 registros por bloque activa el camino vectorizado con tabla
+    rng = np.random.default_rng(0)
+    alphabet = np.frombuffer(b"ACGTacgtN", dtype=np.uint8)
+    records = [b">r%d\n%s\n" % (i, rng.choice(alphabet, 37 + i % 50).tobytes()) for i in range(500)]
+    data = b"".join(records)
+
+    scanner = scan_fasta(iter_chunks(io.BytesIO(data), 4096))
+
+    assert gc_content_results(scanner) == _biopython_gc_results(data)
+    assert scanner.bytes_read == len(data)
+
+
+def test_fasta_counter_handles_headers_across_chunk_boundaries():
+    records = list(SeqIO.parse(io.TextIOWrapper(io.BytesIO(FASTA_SAMPLE), encoding='utf-8'), "fasta"))
+    for chunk_size in (1, 2, 5, 1 << 20):
+        counter = count_fasta(iter_chunks(io.BytesIO(FASTA_SAMPLE), chunk_size))
+        assert counter.sequence_count == len(records)
+        assert counter.total_residues == sum(len(record.seq) for record in records)
+        assert counter.bytes_read == len(FASTA_SAMPLE)
+
+
+def _biopython_fastq_results(data: bytes) -> dict:
+    """Implementación original basada en SeqRecord, usada como referencia."""
+    all_lengths = []
+    all_avg_qualities = []
+    for record in SeqIO.parse(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), "fastq"):
+        all_lengths.append(len(record.seq))
+        quality_scores = record.letter_annotations["phred_quality"]
+        if quality_scores:
+            all_avg_qualities.append(np.mean(quality_scores))
+    return {
+        "sequence_count": len(all_lengths),
+        "avg_sequence_length": round(np.mean(all_lengths), 2),
+        "min_length": min(all_lengths),
+        "max_length": max(all_lengths),
+        "overall_avg_quality": round(np.mean(all_avg_qualities) if all_avg_qualities else 0, 2),
+    }
+
+
+def test_fastq_engine_matches_biopython():
+    rng = np.random.default_rng(1)
+    records = []
+    for i, length in enumerate([0, 1, 35, 150, 151, 3000] * 20):
+        seq = rng.choice(np.frombuffer(b"ACGTN", dtype=np.uint8), length).tobytes()
+        qual = rng.integers(33, 75, length, dtype=np.uint8).tobytes()
+        newline = b"\r\n" if i % 7 == 0 else b"\n"
+        records.append(newline.join([b"@read%d" % i, seq, b"+", qual, b""]))
+    data = b"".join(records)
+
+    expected = _biopython_fastq_results(data)
+    for chunk_size in (5, 1000, 1 << 20):
+        scanner = scan_fastq(iter_chunks(io.BytesIO(data), chunk_size))
+        assert fastq_stats_results(scanner) == expected
+
+
+def test_fastq_engine_rejects_malformed_records():
+    data = b"@r1\nACGT\n+\nIIII\n@r2\nACGT\n+\nIII\n"
+    with pytest.raises(ValueError):
+        scan_fastq(iter_chunks(io.BytesIO(data)))
+
+
+GFF_SAMPLE = (
+    b"##gff-version 3\n"
+    b"##sequence-region chr1 1 10000\n"
+    b"chr1\t.\tgene\t100\t900\t.\t+\t.\tID=gene1\n"
+    b"chr1\t.\tmRNA\t100\t900\t.\t+\t.\tID=mrna1;Parent=gene1\n"
+    b"chr1\t.\texon\t100\t300\t.\t+\t.\tParent=mrna1\n"
+    b"chr1\t.\texon\t500\t900\t.\t+\t.\tParent=mrna1\n"
+    b"chr1\t.\tCDS\t150\t300\t.\t+\t0\tID=cds1;Parent=mrna1\n"
+    b"chr1\t.\tCDS\t500\t800\t.\t+\t0\tID=cds1;Parent=mrna1\n"
+    b"\n"
+    b"chr2\t.\tgene\t100\t900\t.\t-\t.\tID=gene2\n"
+    b"###\n"
+    b"##FASTA\n"
+    b">chr1\n"
+    b"ACGT\n"
+)
+
+
+def test_gff_line_counter_matches_bcbio():
+    from app.tasks import process_features
+
+    expected = Counter()
+    for rec in GFF.parse(io.StringIO(GFF_SAMPLE.decode())):
+        process_features(rec.features, expected)
+
+    for chunk_size in (7, 1 << 20):
+        assert count_gff_features(iter_chunks(io.BytesIO(GFF_SAMPLE), chunk_size)) == expected
+
+
+def test_gff_line_counter_counts_multi_parent_features_like_bcbio():
+    from app.tasks import process_features
+
+    data = (
+        b"##gff-version 3\n"
+        b"chr1\t.\tgene\t1\t1000\t.\t+\t.\tID=g1\n"
+        b"chr1\t.\tmRNA\t1\t1000\t.\t+\t.\tID=t1;Parent=g1\n"
+        b"chr1\t.\tmRNA\t1\t1000\t.\t+\t.\tID=t2;Parent=g1\n"
+        b"chr1\t.\texon\t1\t100\t.\t+\t.\tID=e1;Parent=t1,t2\n"
+        b"chr1\t.\texon\t200\t300\t.\t+\t.\tID=e2; Parent=t1,t2,t2\n"
+    )
+    expected = Counter()
+    for rec in GFF.parse(io.StringIO(data.decode())):
+        process_features(rec.features, expected)
+
+    assert expected["exon"] == 5
+    assert count_gff_features(iter_chunks(io.BytesIO(data))) == expected
+
+
+def test_genbank_summary_reports_every_record():
+    records = []
+    for i, (length, topology) in enumerate([(120, "circular"), (80, "linear"), (40, "linear")]):
+        record = SeqRecord(Seq("ACGT" * (length // 4)), id=f"contig{i}", name=f"contig{i}", description=f"contig {i}")
+        record.annotations["molecule_type"] = "DNA"
+        record.annotations["topology"] = topology
+        record.features = [SeqFeature(FeatureLocation(0, 10), type="gene") for _ in range(i + 1)]
+        records.append(record)
+    handle = io.StringIO()
+    SeqIO.write(records, handle, "genbank")
+    handle.seek(0)
+
+    summary, columns = summarize_genbank(handle)
+
+    assert summary["sequence_count"] == 3
+    assert summary["main_record_id"] == "contig0"
+    assert summary["sequence_length"] == 120
+    assert summary["topology"] == "circular"
+    assert summary["total_length"] == 240
+    assert summary["total_features"] == 6
+    records = record_summaries(columns)
+    assert [r["feature_count"] for r in records] == [1, 2, 3]
+    assert records[2] == {
+        "record_id": "contig2", "sequence_length": 40, "feature_count": 3,
+        "molecule_type": "DNA", "topology": "linear",
+    }
+
+
+class _RangeS3Client:
+    """Cliente S3 mínimo que sirve un objeto en memoria con soporte de Range."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def get_object(self, Bucket, Key, Range=None):
+        start = int(Range[len("bytes="):].rstrip("-")) if Range else 0
+        return {"Body": io.BytesIO(self.data[start:]), "ContentLength": len(self.data) - start}
+
+
+@pytest.mark.parametrize("kind", list(ENGINES))
+def test_range_split_scan_matches_sequential_scan(kind):
+    rng = np.random.default_rng(3)
+    records = []
+    for i in range(300):
+        seq = rng.choice(np.frombuffer(b"ACGTN", dtype=np.uint8), int(rng.integers(0, 400))).tobytes()
+        if kind.startswith("fastq"):
+            # Calidades que empiezan por '@' para forzar candidatas falsas
+            qual = b"@" + rng.choice(np.frombuffer(b"@+I#", dtype=np.uint8), len(seq)).tobytes()[1:] if seq else b""
+            records.append(b"@read%d\n%s\n+\n%s\n" % (i, seq, qual))
+        else:
+            records.append(b">contig%d\n%s\n" % (i, b"\n".join(seq[j:j + 60] for j in range(0, len(seq), 60))))
+    data = b"".join(records)
+    client = _RangeS3Client(data)
+
+    expected = scan_stream(kind, [data])
+    for n_ranges in (2, 7, 64):
+        partials = [
+            scan_range(kind, "bucket", "key", start, end, lambda: client)
+            for start, end in plan_ranges(len(data), n_ranges, min_range_size=1)
+        ]
+        merged = partials[0]
+        for partial in partials[1:]:
+            merged.merge(partial)
+
+        assert merged.sequence_count == expected.sequence_count
+        assert merged.bytes_read == len(data)
+        if kind == "fasta_count":
+            assert merged.total_residues == expected.total_residues
+        elif kind == "fasta_gc_content":
+            assert gc_content_results(merged) == gc_content_results(expected)
+        else:
+            assert fastq_stats_results(merged) == fastq_stats_results(expected)
+            if expected.position_profile is not None:
+                assert merged.position_profile.results() == expected.position_profile.results()
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data)
+    if compression == "bgzf":
+        # BGZF: bloques gzip independientes de hasta 64 KiB concatenados
+        return b"".join(gzip.compress(data[i:i + 65280]) for i in range(0, len(data), 65280))
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bgzf", "zstd"])
+def test_sequence_scan_decompresses_by_magic_bytes(compression):
+    from app.tasks import scan_sequence_object
+
+    rng = np.random.default_rng(4)
+    seqs = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), (2000, 100))
+    data = b"".join(b">r%d\n%s\n" % (i, seq.tobytes()) for i, seq in enumerate(seqs))
+    client = _RangeS3Client(_compress(data, compression))
+
+    scanner = scan_sequence_object(client, "bucket", "lecturas.fa", "fasta_gc_content")
+
+    assert gc_content_results(scanner) == gc_content_results(scan_stream("fasta_gc_content", [data]))
+    assert scanner.bytes_read == len(data)
+
+
+def test_file_extension_ignores_compression_suffix():
+    assert get_file_extension("lecturas.FASTQ.gz") == ".fastq"
+    assert get_file_extension("genoma.fa.bgz") == ".fa"
+    assert get_file_extension("genoma.fna.zst") == ".fna"
+    assert get_file_extension("archivo.gz") == ""
+
+
+def test_nx_statistics_from_sorted_cumulative_sums():
+    values, counts = length_distribution(np.array([20, 100, 40, 80, 60]))
+    assert nx_statistics(values, counts, fractions=(0.5, 0.9)) == {"N50": 80, "L50": 2, "N90": 40, "L90": 4}
+
+    # Distribución ponderada: 10 lecturas de 150 y 1 de 1000 (total 2500)
+    stats = nx_statistics(np.array([150, 1000]), np.array([10, 1]))
+    assert stats == {"N50": 150, "L50": 3}
+
+
+def test_fasta_profile_matches_individual_tasks():
+    scanner = scan_fasta(iter_chunks(io.BytesIO(FASTA_SAMPLE), 7))
+    counter = count_fasta(iter_chunks(io.BytesIO(FASTA_SAMPLE)))
+
+    profile = fasta_profile_results(scanner, ["count", "gc_content", "lengths"])
+
+    assert profile["count"] == {
+        "sequence_count": counter.sequence_count,
+        "total_bytes": counter.bytes_read,
+        "total_residues": counter.total_residues,
+    }
+    assert profile["gc_content"] == gc_content_results(scanner)
+    assert profile["lengths"]["total_length"] == counter.total_residues
+    assert sum(profile["lengths"]["length_histogram"]["counts"]) == counter.sequence_count
+
+
+def test_fastq_profile_length_counts():
+    lengths = [0, 35, 150, 150, 151, 3000]
+    data = b"".join(b"@r\n%s\n+\n%s\n" % (b"A" * n, b"I" * n) for n in lengths)
+
+    profile = fastq_profile_results(scan_fastq(iter_chunks(io.BytesIO(data), 11)), ["stats", "lengths"])
+
+    expected = length_summary(*length_distribution(np.array(lengths)))
+    assert profile["lengths"] == expected
+    assert profile["lengths"]["N50"] == 3000
+    assert profile["stats"]["max_length"] == 3000
+
+
+def test_assembly_stats_contiguity():
+    lengths = [100, 80, 60, 40, 20]
+    data = b"".join(b">ctg%d\n%s\n" % (i, b"GC" * (n // 4) + b"AT" * (n // 4)) for i, n in enumerate(lengths))
+    data += b">gap\n" + b"A" * 600 + b"N" * 400 + b"\n"
+
+    stats = assembly_stats(scan_fasta(iter_chunks(io.BytesIO(data), 64)), genome_size=4000)
+
+    assert stats["contig_count"] == 6
+    assert stats["total_length"] == 1300
+    assert (stats["N50"], stats["L50"]) == (1000, 1)
+    assert (stats["N90"], stats["L90"]) == (80, 3)
+    assert (stats["NG50"], stats["LG50"]) == (None, None)  # 1300 < 2000
+    assert stats["auN"] == round(sum(n * n for n in lengths + [1000]) / 1300, 2)
+    assert stats["n_count"] == 400
+    assert stats["gc_by_length_bin"] == [
+        {"length_bin": "0-499", "contig_count": 5, "total_length": 300, "gc_content": 50.0},
+        {"length_bin": "1000-4999", "contig_count": 1, "total_length": 1000, "gc_content": 0.0},
+    ]
+
+
+def test_fastq_position_profile_matches_per_read_loop():
+    rng = np.random.default_rng(5)
+    reads = []
+    for length in rng.integers(0, 60, 300):
+        seq = rng.choice(np.frombuffer(b"ACGTNacgt", dtype=np.uint8), length).tobytes()
+        qual = rng.integers(33, 75, length, dtype=np.uint8).tobytes()
+        reads.append((seq, qual))
+    data = b"".join(b"@r\n%s\n+\n%s\n" % read for read in reads)
+
+    profile = scan_fastq(iter_chunks(io.BytesIO(data), 997), positional=True).position_profile.results()
+
+    max_len = max(len(seq) for seq, _ in reads)
+    assert profile["max_read_length"] == max_len and profile["bin_width"] == 1
+    for position in (0, 17, max_len - 1):
+        column = [qual[position] - 33 for _, qual in reads if len(qual) > position]
+        bases = [chr(seq[position]).upper() for seq, _ in reads if len(seq) > position]
+        assert profile["base_count"][position] == len(column)
+        assert profile["mean"][position] == round(float(np.mean(column)), 2)
+        assert profile["median"][position] == int(np.percentile(column, 50, method="inverted_cdf"))
+        assert profile["q25"][position] == int(np.percentile(column, 25, method="inverted_cdf"))
+        assert profile["base_composition"]["N"][position] == round(bases.count("N") / len(bases) * 100, 2)
+
+
+def test_fastq_position_profile_bins_long_reads():
+    data = b"@long\n%s\n+\n%s\n@short\n%s\n+\n%s\n" % (b"A" * 30000, b"5" * 30000, b"C" * 150, b"I" * 150)
+
+    position_profile = scan_fastq(iter_chunks(io.BytesIO(data)), positional=True).position_profile
+    profile = position_profile.results()
+
+    # Las posiciones se cuentan en filas de 16 (2048 filas como máximo) y
+    # el resultado agrupa 10 filas por intervalo
+    assert position_profile.quality_counts.shape[0] <= MAX_TRACKED_POSITIONS
+    assert profile["bin_width"] == 160
+    assert len(profile["mean"]) == 188
+    assert profile["position_end"][-1] == 30000
+    assert profile["base_count"][0] == 310
+    assert profile["mean"][0] == round((20 * 160 + 40 * 150) / 310, 2)
+    assert profile["base_composition"]["C"][0] == round(150 / 310 * 100, 2)
+
+    # Un perfil de lecturas cortas se ensancha al fusionarlo con uno de lecturas largas
+    short = scan_fastq(iter_chunks(io.BytesIO(data[data.index(b"@short"):])), positional=True).position_profile
+    long = scan_fastq(iter_chunks(io.BytesIO(data[:data.index(b"@short")])), positional=True).position_profile
+    short.merge(long)
+    assert short.results() == profile
+
+
+def _brute_force_kmer_histogram(sequences, k):
+    complement = str.maketrans("ACGT", "TGCA")
+    counts = Counter()
+    for seq in sequences:
+        seq = seq.upper()
+        for i in range(len(seq) - k + 1):
+            kmer = seq[i:i + k]
+            if set(kmer) <= set("ACGT"):
+                counts[min(kmer, kmer.translate(complement)[::-1])] += 1
+    return sorted(Counter(counts.values()).items()), sum(counts.values())
+
+
+@pytest.mark.parametrize("k", [1, 4, 21, 31])
+def test_kmer_spectrum_matches_brute_force(k):
+    records = list(SeqIO.parse(io.TextIOWrapper(io.BytesIO(FASTA_SAMPLE), encoding='utf-8'), "fasta"))
+    histogram, total = _brute_force_kmer_histogram([str(r.seq) for r in records], k)
+
+    for chunk_size, budget in ((3, 16), (1 << 20, 1 << 30)):
+        # Un presupuesto de 16 bytes obliga a volcar la tabla a disco
+        spectrum = kmer_spectrum(iter_chunks(io.BytesIO(FASTA_SAMPLE), chunk_size), "fasta", k, budget)
+        assert [tuple(row) for row in spectrum["histogram"]] == histogram
+        assert spectrum["total_kmers"] == total
+
+
+def test_kmer_spectrum_fastq_estimates_genome_size():
+    rng = np.random.default_rng(6)
+    genome = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), 20_000)
+    starts = rng.integers(0, genome.size - 100, 20_000 * 60 // 100)  # cobertura 60x
+    reads = genome[starts[:, None] + np.arange(100)]
+    data = b"".join(b"@r\n%s\n+\n%s\n" % (read.tobytes(), b"I" * 100) for read in reads)
+
+    spectrum = kmer_spectrum(iter_chunks(io.BytesIO(data), 4096), "fastq", 21)
+
+    assert spectrum["sequence_count"] == len(reads)
+    assert spectrum["peak_coverage"] is not None
+    assert abs(spectrum["estimated_genome_size"] - 20_000) < 2_000
+
+
+def test_minhash_sketch_keeps_smallest_hashes_across_chunks():
+    rng = np.random.default_rng(7)
+    genome = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), 30_000).tobytes()
+    data = b">a\n" + genome[:12_000] + b"\n>b\n" + genome[12_000:]
+
+    whole = sketch_fasta([data], k=15, sketch_size=200).hashes()
+    chunked = sketch_fasta(iter_chunks(io.BytesIO(data), 1000), k=15, sketch_size=200).hashes()
+    assert np.array_equal(whole, chunked)
+    assert whole.size == 200 and np.all(np.diff(whole.astype(np.float64)) > 0)
+
+    # Coinciden con los 200 hashes menores de todos los k-meros canónicos
+    complement = bytes.maketrans(b"ACGT", b"TGCA")
+    codes = {ord("A"): 0, ord("C"): 1, ord("G"): 2, ord("T"): 3}
+    kmers = set()
+    for seq in (genome[:12_000], genome[12_000:]):
+        for i in range(len(seq) - 14):
+            kmer = min(seq[i:i + 15], seq[i:i + 15].translate(complement)[::-1])
+            kmers.add(sum(codes[b] << (2 * (14 - n)) for n, b in enumerate(kmer)))
+    expected = np.sort(hash_kmers(np.array(sorted(kmers), dtype=np.uint64)))[:200]
+    assert np.array_equal(whole, expected)
+
+
+def test_sketch_index_matches_pairwise_jaccard():
+    rng = np.random.default_rng(8)
+    base = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), 50_000)
+    sketches = []
+    for rate in (0.0, 0.002, 0.01, 0.05, 0.3):
+        genome = base.copy()
+        mutated = rng.random(genome.size) < rate
+        genome[mutated] = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), mutated.sum())
+        sketches.append(sketch_fasta([b">s\n" + genome.tobytes()], k=21, sketch_size=500).hashes())
+    # Un sketch incompleto (secuencia corta)
+    sketches.append(sketch_fasta([b">c\n" + base[:300].tobytes()], k=21, sketch_size=500).hashes())
+
+    index = SketchIndex(k=21, sketch_size=500)
+    for row, hashes in enumerate(sketches):
+        index.add([row + 1], [row + 10], [row // 2], [hashes])
+
+    rows, jaccard, _ = index.jaccard(sketches[1])
+    for row, value in zip(rows, jaccard):
+        assert value == pytest.approx(jaccard_estimate(sketches[1], sketches[row], 500))
+    assert {0, 1, 2, 3} <= set(rows.tolist())
+
+    hits = index.search(sketches[0], limit=10, exclude_strain_id=0)
+    assert [hit["strain_id"] for hit in hits][:2] == [1, 2]
+    assert hits[0]["analysis_id"] == 12
+
+    # Los sketches retirados no aparecen en las búsquedas
+    index.retain([1, 2, 4, 5, 6])
+    assert index.live_count == 5
+    assert 12 not in [hit["analysis_id"] for hit in index.search(sketches[0], limit=10, exclude_strain_id=0)]
+
+    # Las posiciones se guardan como uint16
+    with pytest.raises(ValueError):
+        SketchIndex(k=21, sketch_size=70_000)
+
+
+class _RecordingTask:
+    """Sustituto de la tarea de Celery que guarda los estados publicados."""
+
+    def __init__(self):
+        self.states = []
+
+    def update_state(self, state, meta):
+        self.states.append((state, meta))
+
+
+def test_approximate_scan_estimates_with_confidence_intervals(monkeypatch):
+    from app.core.config import settings
+    from app.tasks import approximate_scan, apply_estimates
+
+    rng = np.random.default_rng(10)
+    lengths = rng.integers(50, 151, 40_000)
+    records = []
+    for i, length in enumerate(lengths):
+        seq = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), length).tobytes()
+        qual = rng.integers(53, 74, length).astype(np.uint8).tobytes()
+        records.append(b"@read%d\n%s\n+\n%s\n" % (i, seq, qual))
+    data = b"".join(records)
+    monkeypatch.setattr(settings, "APPROXIMATE_SAMPLE_MB", 1)
+    monkeypatch.setattr(settings, "APPROXIMATE_SAMPLE_RANGES", 16)
+    exact = fastq_stats_results(scan_stream("fastq_stats", [data]))
+
+    task = _RecordingTask()
+    scanner, summary = approximate_scan(task, _RangeS3Client(data), "bucket", "lecturas.fq", "fastq_stats")
+    results = apply_estimates(fastq_stats_results(scanner), summary)
+
+    assert len(task.states) == 16
+    assert all(state == "PROGRESS" and "partial_result" in meta for state, meta in task.states)
+    assert task.states[-1][1]["progress"] == 100.0
+    assert summary["sampling"] == "ranges" and summary["clusters"] == 16
+    assert results["approximate"] is True
+    assert abs(results["sequence_count"] - exact["sequence_count"]) < 0.05 * exact["sequence_count"]
+    assert abs(results["avg_sequence_length"] - exact["avg_sequence_length"]) < 2
+    low, high = summary["estimates"]["overall_avg_quality"]["ci95"]
+    assert low < results["overall_avg_quality"] < high
+    assert abs(results["overall_avg_quality"] - exact["overall_avg_quality"]) < 0.5
+
+    # Los objetos comprimidos se muestrean por el prefijo descomprimido
+    task = _RecordingTask()
+    scanner, summary = approximate_scan(task, _RangeS3Client(gzip.compress(data)), "bucket", "lecturas.fq.gz", "fastq_stats")
+    assert summary["sampling"] == "prefix"
+    assert summary["estimates"]["avg_sequence_length"]["ci95"] is not None
+    assert "sequence_count" not in summary["estimates"]
+    # Sin el tamaño descomprimido no se guarda el recuento de la muestra
+    results = apply_estimates(fastq_stats_results(scanner), summary)
+    assert results["sequence_count"] is None
+    assert results["sampling"]["sequence_count_unknown"] is True
+
+    # Un objeto más pequeño que la muestra se analiza completo
+    assert approximate_scan(_RecordingTask(), _RangeS3Client(data[:1000]), "bucket", "lecturas.fq", "fastq_stats") is None
+
+
+def test_progress_reporter_throttles_by_time():
+    from app.core.progress import ProgressReporter, ProgressStream
+
+    now = [0.0]
+    published = []
+    reporter = ProgressReporter(published.append, total_bytes=1000, interval=2.0, clock=lambda: now[0])
+    reporter.count_records = lambda: reporter.bytes_done // 10
+    stream = ProgressStream(io.BytesIO(b"x" * 1000), reporter)
+
+    stream.read(100)  # la primera lectura publica de inmediato
+    now[0] = 1.0
+    stream.read(100)  # dentro del intervalo: no publica
+    now[0] = 2.0
+    stream.read(300)
+    assert stream.read(0) == b""
+
+    assert len(published) == 2
+    last = published[-1]
+    assert last["progress"] == 50.0
+    assert last["bytes_processed"] == 500
+    assert last["records_processed"] == 50
+    assert last["records_per_second"] == 25.0
+    assert last["eta_seconds"] == 2.0
+
+
+def test_scan_sequence_object_publishes_progress(monkeypatch):
+    from app.core.config import settings
+    from app.tasks import scan_sequence_object
+
+    monkeypatch.setattr(settings, "PROGRESS_UPDATE_INTERVAL_S", 0.0)
+    data = b"".join(b">r%d\n%s\n" % (i, b"ACGT" * 100) for i in range(20_000))
+    task = _RecordingTask()
+
+    scanner = scan_sequence_object(_RangeS3Client(data), "bucket", "genoma.fa", "fasta_count", task=task)
+
+    assert scanner.sequence_count == 20_000
+    assert all(state == "PROGRESS" for state, _ in task.states)
+    last = task.states[-1][1]
+    assert last["total_bytes"] == len(data) and last["bytes_processed"] == len(data)
+    assert last["progress"] == 100.0
+    assert 0 < last["records_processed"] <= 20_000
+
+
+class _MemoryS3Client:
+    """Cliente S3 mínimo en memoria con put_object y GET con Range 'a-b'."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            first, last = Range[len("bytes="):].split("-")
+            data = data[int(first):int(last) + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+
+def test_gc_record_columns_round_trip_through_sidecar(monkeypatch):
+    from app.core.config import settings
+    from app.core.sidecar import read_record_columns
+    from app.tasks import gc_content_analysis_results
+
+    rng = np.random.default_rng(11)
+    lengths = rng.integers(1, 300, 5000)
+    data = b"".join(
+        b">c%d\n%s\n" % (i, rng.choice(np.frombuffer(b"ACGTN", dtype=np.uint8), n).tobytes())
+        for i, n in enumerate(lengths)
+    )
+    scanner = scan_stream("fasta_gc_content", [data])
+    inline = gc_content_results(scanner)
+    client = _MemoryS3Client()
+
+    monkeypatch.setattr(settings, "SIDECAR_MIN_RECORDS", 10_000)
+    assert gc_content_analysis_results(client, "bucket", scanner) == inline
+    assert not client.objects
+
+    monkeypatch.setattr(settings, "SIDECAR_MIN_RECORDS", 1000)
+    results = gc_content_analysis_results(client, "bucket", scanner)
+    assert "individual_gc_contents" not in results
+    assert results["average_gc_content"] == inline["average_gc_content"]
+    pointer = results["record_columns"]
+    assert pointer["record_count"] == 5000
+    assert pointer["columns"]["gc_content"]["dtype"] == "<u2"
+
+    page = read_record_columns(client, pointer, 4990, 100)
+    assert page["gc_content"] == inline["individual_gc_contents"][4990:]
+    assert page["length"] == lengths[4990:].tolist()
+    full = read_record_columns(client, pointer, 0, 5000)
+    assert full["gc_content"] == inline["individual_gc_contents"]
+
+
+def test_genbank_record_table_round_trips_through_sidecar(monkeypatch):
+    from app.core.config import settings
+    from app.core.sidecar import read_record_columns
+    from app.tasks import genbank_analysis_results
+
+    columns = {
+        "record_id": [f"contig{i}" for i in range(1500)],
+        "sequence_length": list(range(1500)),
+        "feature_count": [i % 7 for i in range(1500)],
+        "molecule_type": ["DNA"] * 1500,
+        "topology": ["circular" if i % 2 else "linear" for i in range(1500)],
+    }
+    summary = {"sequence_count": 1500, "total_length": sum(range(1500))}
+    client = _MemoryS3Client()
+
+    monkeypatch.setattr(settings, "SIDECAR_MIN_RECORDS", 10_000)
+    inline = genbank_analysis_results(client, "bucket", summary, columns)
+    assert len(inline["records"]) == 1500 and not client.objects
+
+    monkeypatch.setattr(settings, "SIDECAR_MIN_RECORDS", 1000)
+    results = genbank_analysis_results(client, "bucket", summary, columns)
+    assert "records" not in results
+    pointer = results["record_columns"]
+    assert pointer["record_count"] == 1500
+    assert pointer["columns"]["record_id"]["dtype"] == "|S10"
+
+    page = read_record_columns(client, pointer, 1495, 100)
+    assert page == {name: values[1495:] for name, values in columns.items()}
+
+
+
+def test_upload_validator_streams_size_format_and_hash():
+    import hashlib
+    from fastapi import HTTPException
+    from app.core.validators import validate_upload_stream
+
+    data = b">seq1\nACGT\n" * 300_000  # varios bloques
+    validator = validate_upload_stream(io.BytesIO(data), "fasta", len(data))
+    assert validator.hexdigest() == hashlib.sha256(data).hexdigest()
+    assert validator.bytes_read == len(data)
+    assert validator.detected_format == "fasta"
+
+    # El formato se reconoce también dentro de un gzip
+    assert validate_upload_stream(io.BytesIO(gzip.compress(b"@r1\nACGT\n+\nIIII\n")), "fastq").detected_format == "fastq"
+
+    # Un gzip muy comprimido sólo se descomprime hasta HEAD_SIZE bytes
+    from app.core.compression import HEAD_SIZE, decompress_head
+    bomb = gzip.compress(b">seq1\n" + b"A" * (64 * 1024 * 1024))
+    assert len(decompress_head(bomb)) == HEAD_SIZE
+
+    for stream, expected_format, max_size, code in (
+        (io.BytesIO(data), "fasta", len(data) - 1, 413),
+        (io.BytesIO(b""), "fasta", 100, 400),
+        (io.BytesIO(b"@r1\nACGT\n+\nIIII\n"), "fasta", 100, 400),
+    ):
+        with pytest.raises(HTTPException) as error:
+            validate_upload_stream(stream, expected_format, max_size)
+        assert error.value.status_code == code
+
+
+def test_upload_file_uses_multipart_settings(monkeypatch):
+    from app.core.config import settings
+    from app.core.transfers import upload_file, upload_stats, MB
+
+    monkeypatch.setattr(settings, "UPLOAD_MULTIPART_THRESHOLD_MB", 8)
+    monkeypatch.setattr(settings, "UPLOAD_PART_SIZE_MB", 8)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_CONCURRENCY", 4)
+    calls = []
+
+    class _Client:
+        def upload_fileobj(self, fileobj, bucket, key, Config=None):
+            calls.append(Config)
+
+    uploads = upload_stats.snapshot()["uploads"]
+    metrics = upload_file(_Client(), io.BytesIO(), "bucket", "key", 20 * MB)
+    assert calls[0].multipart_chunksize == 8 * MB and calls[0].max_concurrency == 4
+    assert calls[0].max_in_memory_upload_chunks == 4  # a lo sumo 4 partes de 8 MB en memoria
+    assert metrics["parts"] == 3 and metrics["bytes"] == 20 * MB
+    assert upload_stats.snapshot()["uploads"] == uploads + 1
+
+
+def test_shared_s3_client_is_built_once_per_process(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.core import s3_clients
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "S3_MAX_POOL_CONNECTIONS", 4)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_CONCURRENCY", 16)
+    s3_clients._reset_after_fork()
+    with ThreadPoolExecutor(8) as pool:
+        clients = list(pool.map(lambda _: s3_clients.shared_s3_client(), range(32)))
+    assert all(client is clients[0] for client in clients)
+    assert clients[0].meta.config.max_pool_connections == 16
+    assert s3_clients.shared_presign_client() is not clients[0]
+
+    # Un hijo de fork no reutiliza el cliente (ni los sockets) del padre
+    s3_clients._reset_after_fork()
+    assert s3_clients.shared_s3_client() is not clients[0]
+
+
+def test_workers_that_cannot_fork_scan_sequentially(monkeypatch):
+    from app import tasks
+    from app.core.config import settings
+
+    data = b">a\nACGT\n>b\nGG\n"
+    monkeypatch.setattr(settings, "PARALLEL_SCAN_MIN_SIZE_MB", 0)
+    monkeypatch.setattr(tasks, "can_spawn_processes", lambda: False)
+    monkeypatch.setattr(tasks, "parallel_scan", lambda *args, **kwargs: pytest.fail("parallel_scan in a daemon worker"))
+
+    counter = tasks.scan_sequence_object(_RangeS3Client(data), "bucket", "key", "fasta_count")
+    assert counter.sequence_count == 2